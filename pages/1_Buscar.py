@@ -150,7 +150,7 @@ if nombre_buscar:
             
             # Recuperar datos del jugador seleccionado
             row_origen = df_search[df_search['label'] == seleccion_label].iloc[0]
-            id_origen = str(row_origen['player_id'])
+            id_origen = int(row_origen['player_id'])
             temp_origen = int(row_origen['temporada_anio'])
             
             # Mostrar badge de proyección en sidebar
@@ -168,7 +168,7 @@ if nombre_buscar:
             
             # Obtener percentiles del molde
             percentiles_molde = obtener_percentiles_molde(
-                player_id=int(id_origen),
+                player_id=id_origen,
                 temporada=temp_origen,
                 _client=client
             )
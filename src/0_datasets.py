@@ -1,6 +1,8 @@
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 
+from backend import crear_backend
+
 # --- CONFIGURACIÓN ---
 PROJECT_ID = "proyecto-scouting-futbol"
 # Elige la ubicación. Debe ser la misma que tu bucket.
@@ -30,13 +32,19 @@ def create_bigquery_dataset(client, project_id, dataset_name, location):
 
 
 if __name__ == '__main__':
-    # Inicializamos el cliente de BigQuery
-    client = bigquery.Client(project=PROJECT_ID)
+    # Backend configurado (SCOUTING_BACKEND): BigQuery o Parquet local
+    backend = crear_backend()
 
-    print(f"Iniciando la configuración de datasets para el proyecto '{PROJECT_ID}'...")
-    
-    # Iteramos sobre la lista y llamamos a la función para cada dataset
-    for name in DATASETS_TO_CREATE:
-        create_bigquery_dataset(client, PROJECT_ID, name, LOCATION)
+    if backend.nombre == 'local':
+        print(f"Iniciando la configuración de datasets locales en '{backend.directorio}'...")
+        for name in DATASETS_TO_CREATE:
+            backend.crear_dataset(name)
+            print(f"✓ Dataset local '{name}' listo.")
+    else:
+        print(f"Iniciando la configuración de datasets para el proyecto '{PROJECT_ID}'...")
+        
+        # Iteramos sobre la lista y llamamos a la función para cada dataset
+        for name in DATASETS_TO_CREATE:
+            create_bigquery_dataset(backend.client, PROJECT_ID, name, LOCATION)
         
     print("\nConfiguración de datasets finalizada.")
\ No newline at end of file
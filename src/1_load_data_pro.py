@@ -34,15 +34,51 @@ def crear_cliente_bigquery():
 
 from google.cloud import bigquery
 from google.cloud import storage
-from datetime import datetime, timedelta
+from google.cloud.exceptions import NotFound
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import pandas as pd
+import argparse
+import fnmatch
+import tempfile
+import time
 import sys
 import os
 
+from backend import crear_backend
+from manifiesto_carga import (
+    huella_blob_gcs,
+    huella_desde_blob,
+    leer_manifiesto,
+    guardar_manifiesto,
+    fuente_sin_cambios,
+    registrar_carga,
+    encolar_fechas,
+)
+
 # --- CONFIGURACIÓN ---
 PROJECT_ID = "proyecto-scouting-futbol"
 BUCKET_NAME = "bucket-scouting-futbol-raw-data"
 RAW_DATASET = "raw_scouting"
 
+# Ingesta columnar: el CSV se convierte a Parquet tipado antes de cargar
+PARQUET_PREFIX = "data/parquet"
+DELTA_PREFIX = "data/parquet/delta"
+CUARENTENA_PREFIX = "data/cuarentena"
+
+# Ingesta por shards (liga/temporada): jobs de carga concurrentes
+SHARDS_MAX_WORKERS = 4
+
+# Manifiesto: si la fuente no cambió desde la última carga, no se hace nada
+MANIFIESTO_URI = f"gs://{BUCKET_NAME}/data/_manifiesto_carga.json"
+PARQUET_COMPRESSION = "zstd"
+CSV_BLOCK_SIZE = 16 * 1024 * 1024  # 16 MB por bloque: acota la memoria de la validación
+
 # Forzar autenticación explícita si estamos en Cloud Shell
 os.environ['GOOGLE_CLOUD_PROJECT'] = PROJECT_ID
 
@@ -176,6 +212,306 @@ SCHEMA_COMPLETO = [
     bigquery.SchemaField("posiciones_detalle", "STRING"),
 ]
 
+# Mapeo de tipos BigQuery -> Arrow (SCHEMA_COMPLETO es la fuente de verdad)
+TIPOS_ARROW = {
+    "STRING": pa.string(),
+    "INTEGER": pa.int64(),
+    "FLOAT": pa.float64(),
+    "DATE": pa.date32(),
+    "BOOL": pa.bool_(),
+}
+
+# --- VALIDACIÓN PRE-CARGA ---
+# Reemplaza el max_bad_records=100 ciego: cada fila se valida y las malas
+# quedan en cuarentena con el motivo.
+COLUMNAS_NO_NULAS = ['game_id', 'player_id', 'fecha']
+
+RANGOS_VALIDOS = {
+    'minutes_played': (0, 130),
+    'rating': (0, 10),
+    'age_at_match': (14, 50),
+    'shot_acc_pct': (0, 100),
+    'pass_acc_pct': (0, 100),
+    'long_balls_acc_pct': (0, 100),
+    'cross_acc_pct': (0, 100),
+    'opp_half_acc_pct': (0, 100),
+    'own_half_acc_pct': (0, 100),
+    'dribble_success_pct': (0, 100),
+    'tackle_success_pct': (0, 100),
+    'duel_success_pct': (0, 100),
+    'aerial_success_pct': (0, 100),
+    'gk_sweeper_acc_pct': (0, 100),
+}
+
+VALORES_BOOL = {'true': True, 'false': False, '1': True, '0': False}
+
+# --- MERGE ---
+COLUMNAS_CLAVE = ['game_id', 'player_id', 'fecha']
+COLUMNA_FINGERPRINT = "row_fingerprint"
+
+
+def schema_a_arrow(schema):
+    """
+    Traduce una lista de SchemaField de BigQuery a un schema de Arrow.
+    """
+    return pa.schema([pa.field(f.name, TIPOS_ARROW[f.field_type]) for f in schema])
+
+
+def _validar_bloque(df, schema):
+    """
+    Valida un bloque de filas crudas (todas como texto) de forma vectorizada.
+    
+    Returns:
+        (DataFrame tipado, Serie con motivos de rechazo; "" = fila válida)
+    """
+    tipado = pd.DataFrame(index=df.index)
+    motivos = pd.Series("", index=df.index, dtype=object)
+
+    def marcar(mask, motivo):
+        nonlocal motivos
+        motivos = motivos.where(~mask, motivos + motivo + ";")
+
+    # 1. Tipos (un valor presente que no parsea al tipo del schema)
+    for field in schema:
+        col = df[field.name]
+        presente = col.notna()
+
+        if field.field_type == "INTEGER":
+            valor = pd.to_numeric(col, errors='coerce')
+            invalido = presente & (valor.isna() | (valor % 1 != 0))
+            tipado[field.name] = valor.where(~invalido).astype("Int64")
+        elif field.field_type == "FLOAT":
+            valor = pd.to_numeric(col, errors='coerce')
+            invalido = presente & valor.isna()
+            tipado[field.name] = valor.astype("float64")
+        elif field.field_type == "DATE":
+            valor = pd.to_datetime(col, format="%Y-%m-%d", errors='coerce')
+            invalido = presente & valor.isna()
+            tipado[field.name] = valor.dt.date
+        elif field.field_type == "BOOL":
+            normalizado = col.str.strip().str.lower()
+            invalido = presente & ~normalizado.isin(VALORES_BOOL)
+            tipado[field.name] = normalizado.map(VALORES_BOOL).astype("boolean")
+        else:
+            invalido = pd.Series(False, index=df.index)
+            tipado[field.name] = col
+
+        marcar(invalido, f"tipo:{field.name}")
+
+    # 2. Claves obligatorias
+    for col in COLUMNAS_NO_NULAS:
+        marcar(tipado[col].isna(), f"nulo:{col}")
+
+    # 3. Rangos de negocio
+    for col, (minimo, maximo) in RANGOS_VALIDOS.items():
+        valor = tipado[col]
+        marcar(valor.notna() & ((valor < minimo) | (valor > maximo)), f"rango:{col}")
+
+    return tipado, motivos
+
+
+def convertir_csv_a_parquet(csv_path, parquet_path, schema, fecha_desde=None, cuarentena_path=None):
+    """
+    Convierte el CSV crudo a Parquet tipado y comprimido, leyendo por bloques.
+    Funciona sobre rutas locales (no requiere GCS ni BigQuery).
+    
+    Cada bloque se valida contra el schema (tipos, claves no nulas y rangos).
+    Las filas inválidas van a cuarentena_path con sus motivos; la memoria
+    queda acotada al tamaño de un bloque sin importar el tamaño del archivo.
+    
+    Si se indica fecha_desde, solo se escriben las filas con fecha > fecha_desde
+    (extracción del delta) y se devuelven las fechas tocadas.
+    """
+    arrow_schema = schema_a_arrow(schema)
+    cuarentena_schema = pa.schema(
+        [pa.field(name, pa.string()) for name in arrow_schema.names]
+        + [pa.field('fila_origen', pa.int64()), pa.field('motivos', pa.string())]
+    )
+    inicio = time.time()
+
+    # Se lee todo como texto: el tipado lo hace la validación, así una fila
+    # mala no aborta el archivo completo.
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in arrow_schema.names},
+            include_columns=arrow_schema.names,
+            strings_can_be_null=True,
+        ),
+    )
+
+    filas = 0
+    filas_leidas = 0
+    filas_cuarentena = 0
+    conteo_motivos = {}
+    fechas = set()
+    cuarentena_writer = None
+
+    try:
+        with pq.ParquetWriter(parquet_path, arrow_schema, compression=PARQUET_COMPRESSION) as writer:
+            for batch in reader:
+                df = batch.to_pandas()
+                df.index = pd.RangeIndex(filas_leidas, filas_leidas + len(df))
+                filas_leidas += len(df)
+
+                # El delta se corta antes de validar: filas viejas no se revisan
+                if fecha_desde is not None:
+                    fecha = pd.to_datetime(df['fecha'], format="%Y-%m-%d", errors='coerce').dt.date
+                    df = df[fecha.isna() | (fecha > fecha_desde)]
+                if df.empty:
+                    continue
+
+                tipado, motivos = _validar_bloque(df, schema)
+                es_valida = motivos == ""
+
+                validas = tipado[es_valida]
+                if not validas.empty:
+                    writer.write_table(pa.Table.from_pandas(validas, schema=arrow_schema, preserve_index=False))
+                    filas += len(validas)
+                    fechas.update(validas['fecha'].unique())
+
+                if (~es_valida).any():
+                    rechazadas = df[~es_valida].copy()
+                    rechazadas['fila_origen'] = rechazadas.index
+                    rechazadas['motivos'] = motivos[~es_valida].str.rstrip(";")
+                    filas_cuarentena += len(rechazadas)
+                    for motivo in rechazadas['motivos'].str.split(";").explode():
+                        conteo_motivos[motivo] = conteo_motivos.get(motivo, 0) + 1
+
+                    if cuarentena_path:
+                        if cuarentena_writer is None:
+                            cuarentena_writer = pq.ParquetWriter(
+                                cuarentena_path, cuarentena_schema, compression=PARQUET_COMPRESSION
+                            )
+                        cuarentena_writer.write_table(
+                            pa.Table.from_pandas(rechazadas, schema=cuarentena_schema, preserve_index=False)
+                        )
+    finally:
+        if cuarentena_writer is not None:
+            cuarentena_writer.close()
+
+    return {
+        'filas': filas,
+        'filas_cuarentena': filas_cuarentena,
+        'motivos': dict(sorted(conteo_motivos.items(), key=lambda x: -x[1])),
+        'fechas': sorted(fechas),
+        'bytes_csv': os.path.getsize(csv_path),
+        'bytes_parquet': os.path.getsize(parquet_path),
+        'segundos': time.time() - inicio,
+    }
+
+
+def imprimir_resumen_cuarentena(stats, destino):
+    """
+    Resume las filas rechazadas por la validación y sus motivos principales.
+    """
+    print(f"   ⚠️ {stats['filas_cuarentena']:,} filas en cuarentena → {destino}")
+    for motivo, cantidad in list(stats['motivos'].items())[:5]:
+        print(f"      • {motivo}: {cantidad:,}")
+
+
+def preparar_parquet_en_gcs(bucket_name, blob_name, schema, fecha_desde=None):
+    """
+    Descarga el CSV de GCS, lo convierte a Parquet y sube el resultado.
+    Con fecha_desde solo se sube el delta (fecha > fecha_desde).
+    
+    Returns:
+        (URI gs:// del Parquet, estadísticas de la conversión).
+        La URI es None si el delta no tiene filas.
+    """
+    print(f"\n🗜️ Convirtiendo CSV a Parquet ({PARQUET_COMPRESSION})...")
+    if fecha_desde:
+        print(f"   Extrayendo delta: fecha > {fecha_desde}")
+
+    storage_client = storage.Client(project=PROJECT_ID)
+    bucket = storage_client.bucket(bucket_name)
+    if fecha_desde:
+        parquet_blob_name = f"{DELTA_PREFIX}/{Path(blob_name).stem}_desde_{fecha_desde}.parquet"
+    else:
+        parquet_blob_name = f"{PARQUET_PREFIX}/{Path(blob_name).stem}.parquet"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_local = os.path.join(tmp_dir, Path(blob_name).name)
+        parquet_local = os.path.join(tmp_dir, f"{Path(blob_name).stem}.parquet")
+        cuarentena_local = os.path.join(tmp_dir, f"{Path(blob_name).stem}_cuarentena.parquet")
+
+        bucket.blob(blob_name).download_to_filename(csv_local)
+        stats = convertir_csv_a_parquet(csv_local, parquet_local, schema, fecha_desde, cuarentena_local)
+
+        print(f"   ✓ {stats['filas']:,} filas válidas convertidas en {stats['segundos']:.1f}s")
+        if stats['filas_cuarentena']:
+            cuarentena_blob_name = (
+                f"{CUARENTENA_PREFIX}/{Path(blob_name).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.parquet"
+            )
+            bucket.blob(cuarentena_blob_name).upload_from_filename(cuarentena_local)
+            imprimir_resumen_cuarentena(stats, f"gs://{bucket_name}/{cuarentena_blob_name}")
+
+        if stats['filas'] == 0:
+            print(f"   ℹ️ Sin filas nuevas - no se sube nada")
+            return None, stats
+
+        bucket.blob(parquet_blob_name).upload_from_filename(parquet_local)
+
+    ratio = stats['bytes_csv'] / max(stats['bytes_parquet'], 1)
+    print(f"   ✓ CSV {stats['bytes_csv'] / (1024*1024):.1f} MB → "
+          f"Parquet {stats['bytes_parquet'] / (1024*1024):.1f} MB ({ratio:.1f}x)")
+    if fecha_desde:
+        print(f"   ✓ Delta: {len(stats['fechas'])} fechas ({stats['fechas'][0]} a {stats['fechas'][-1]})")
+
+    return f"gs://{bucket_name}/{parquet_blob_name}", stats
+
+
+def benchmark_conversion_local(directorio, schema):
+    """
+    Convierte todos los CSV de un directorio local a Parquet y reporta
+    tiempos y tamaños. Sirve para medir la conversión sin tocar la nube.
+    """
+    origen = Path(directorio)
+    destino = origen / "parquet"
+    destino.mkdir(exist_ok=True)
+
+    archivos = sorted(origen.glob("*.csv"))
+    print(f"\n⏱️ Benchmark de conversión local: {len(archivos)} archivo(s) en {origen}")
+
+    for csv_path in archivos:
+        parquet_path = destino / f"{csv_path.stem}.parquet"
+        cuarentena_path = destino / f"{csv_path.stem}_cuarentena.parquet"
+        stats = convertir_csv_a_parquet(str(csv_path), str(parquet_path), schema, cuarentena_path=str(cuarentena_path))
+        mb_csv = stats['bytes_csv'] / (1024*1024)
+        mb_parquet = stats['bytes_parquet'] / (1024*1024)
+        print(f"   • {csv_path.name}")
+        print(f"      {stats['filas']:,} filas | {stats['segundos']:.2f}s | "
+              f"{mb_csv / max(stats['segundos'], 1e-9):.1f} MB/s")
+        print(f"      CSV {mb_csv:.1f} MB → Parquet {mb_parquet:.1f} MB")
+        if stats['filas_cuarentena']:
+            imprimir_resumen_cuarentena(stats, cuarentena_path)
+
+
+def construir_job_config(schema, formato='parquet'):
+    """
+    Configuración del job de carga según el formato de origen.
+    Parquet es autodescriptivo: el schema viaja en el archivo, y como ya
+    pasó por la validación pre-carga no se tolera ninguna fila mala.
+    """
+    if formato == 'parquet':
+        return bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition='WRITE_TRUNCATE',
+        )
+
+    return bigquery.LoadJobConfig(
+        schema=schema,
+        source_format=bigquery.SourceFormat.CSV,
+        skip_leading_rows=1,
+        write_disposition='WRITE_TRUNCATE',
+        max_bad_records=100,
+        encoding='UTF-8',
+        autodetect=False,
+        allow_quoted_newlines=True,
+    )
+
 
 def obtener_ultima_fecha_cargada(client, table_id):
     """
@@ -211,32 +547,157 @@ def obtener_ultima_fecha_cargada(client, table_id):
 
 def validar_csv_en_gcs(bucket_name, blob_name):
     """
-    Verifica que el archivo existe en GCS antes de intentar cargarlo.
+    Verifica que el archivo existe en GCS y devuelve su huella
+    (tamaño, generación, hash) para compararla con el manifiesto.
     """
     print(f"\n🔍 Validando archivo en GCS...")
     print(f"   URI: gs://{bucket_name}/{blob_name}")
     
-    # Simplemente verificar con gsutil, sin parsear output
-    import subprocess
-    result = subprocess.run(
-        ['gsutil', 'stat', f'gs://{bucket_name}/{blob_name}'],
-        capture_output=True,
-        text=True
-    )
+    huella = huella_blob_gcs(f"gs://{bucket_name}/{blob_name}", PROJECT_ID)
     
-    if result.returncode == 0:
-        print(f"   ✓ Archivo encontrado y accesible")
-        return True
+    if huella:
+        print(f"   ✓ Archivo encontrado ({huella['size'] / (1024*1024):.1f} MB, "
+              f"generación {huella['generation']})")
     else:
-        print(f"   ⚠️ No se pudo verificar el archivo")
-        print(f"   ℹ️ Continuando de todas formas (BigQuery lo validará)...")
-        return True  # No bloqueamos la ejecución
+        print(f"   ❌ El archivo no existe en GCS")
+    
+    return huella
+
 
+def asegurar_columna_fingerprint(client, table_id):
+    """
+    Agrega la columna row_fingerprint a la tabla final si no existe.
+    Las filas previas quedan en NULL y se completan la primera vez que
+    vuelven a llegar en un re-scrape.
+    """
+    client.query(
+        f"ALTER TABLE `{table_id}` ADD COLUMN IF NOT EXISTS {COLUMNA_FINGERPRINT} INT64"
+    ).result()
+
+
+def sql_fingerprint(schema):
+    """
+    Expresión SQL de la huella de una fila: hash de todas las columnas no clave.
+    """
+    columnas = [f.name for f in schema if f.name not in COLUMNAS_CLAVE]
+    return f"FARM_FINGERPRINT(TO_JSON_STRING(STRUCT({', '.join(columnas)})))"
 
-def cargar_incremental(client, gcs_uri, table_id, schema, fecha_desde=None):
+
+def ejecutar_merge(client, temp_table_id, table_id, schema, where_clause="", rango_fechas=None):
+    """
+    MERGE de la tabla temporal sobre la tabla final por (game_id, player_id, fecha).
+    
+    Antes del MERGE el origen se deduplica por la clave y se le calcula
+    row_fingerprint: las filas ya existentes solo se reescriben si su
+    huella cambió (un re-scrape idéntico no genera bytes de DML).
+    
+    rango_fechas (min, max) acota el MERGE a las particiones del delta.
+    
+    Returns:
+        (filas insertadas, filas actualizadas)
+    """
+    print(f"\n🔀 Paso 2: Ejecutando MERGE...")
+    
+    asegurar_columna_fingerprint(client, table_id)
+    
+    # Duplicados en el staging (filas scrapeadas dos veces)
+    claves = ", ".join(COLUMNAS_CLAVE)
+    conteo = list(client.query(f"""
+        SELECT COUNT(*) AS filas, COUNT(DISTINCT TO_JSON_STRING(STRUCT({claves}))) AS claves
+        FROM `{temp_table_id}`
+        {where_clause}
+    """).result())[0]
+    if conteo.filas > conteo.claves:
+        print(f"   ⚠️ {conteo.filas - conteo.claves:,} filas duplicadas en staging - se deduplican")
+    
+    # Poda de particiones del destino: el delta solo toca estas fechas
+    poda_destino = ""
+    if rango_fechas:
+        poda_destino = f"AND T.fecha BETWEEN '{rango_fechas[0]}' AND '{rango_fechas[1]}'"
+    
+    # Generar lista de columnas para UPDATE
+    columnas_update = []
+    for field in schema:
+        col = field.name
+        # No actualizar claves primarias
+        if col not in COLUMNAS_CLAVE:
+            columnas_update.append(f"T.{col} = S.{col}")
+    columnas_update.append(f"T.{COLUMNA_FINGERPRINT} = S.{COLUMNA_FINGERPRINT}")
+    
+    update_set = ",\n        ".join(columnas_update)
+    
+    # Generar lista de columnas para INSERT
+    columnas = [field.name for field in schema] + [COLUMNA_FINGERPRINT]
+    columnas_str = ", ".join(columnas)
+    valores_str = ", ".join([f"S.{col}" for col in columnas])
+    
+    merge_query = f"""
+    MERGE `{table_id}` T
+    USING (
+        -- Dedup por clave: ante duplicados gana la fila con más minutos
+        SELECT * EXCEPT(rn)
+        FROM (
+            SELECT
+                *,
+                ROW_NUMBER() OVER (
+                    PARTITION BY {claves}
+                    ORDER BY minutes_played DESC, {COLUMNA_FINGERPRINT}
+                ) AS rn
+            FROM (
+                SELECT *, {sql_fingerprint(schema)} AS {COLUMNA_FINGERPRINT}
+                FROM `{temp_table_id}`
+                {where_clause}
+            )
+        )
+        WHERE rn = 1
+    ) S
+    ON T.game_id = S.game_id 
+       AND T.player_id = S.player_id 
+       AND T.fecha = S.fecha
+       {poda_destino}
+    WHEN MATCHED AND (
+        T.{COLUMNA_FINGERPRINT} IS NULL
+        OR T.{COLUMNA_FINGERPRINT} != S.{COLUMNA_FINGERPRINT}
+    ) THEN
+        UPDATE SET
+            {update_set}
+    WHEN NOT MATCHED THEN
+        INSERT ({columnas_str})
+        VALUES ({valores_str})
+    """
+    
+    # Ejecutar MERGE
+    merge_job = client.query(merge_query)
+    merge_job.result()
+    
+    # Obtener estadísticas del MERGE
+    stats = merge_job._properties.get('statistics', {}).get('dml_stats', {})
+    filas_insertadas = int(stats.get('inserted_row_count', 0))
+    filas_actualizadas = int(stats.get('updated_row_count', 0))
+    
+    print(f"   ✓ MERGE completado:")
+    print(f"      • Insertadas: {filas_insertadas:,} filas nuevas")
+    print(f"      • Actualizadas: {filas_actualizadas:,} filas con cambios (huella distinta)")
+    
+    return filas_insertadas, filas_actualizadas
+
+
+def particionamiento_raw():
+    """Particionamiento diario por fecha de la tabla cruda."""
+    return bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY,
+        field="fecha",
+    )
+
+
+def cargar_incremental(client, gcs_uri, table_id, schema, fecha_desde=None, formato='parquet',
+                       rango_fechas=None):
     """
     Carga incremental usando tabla temporal + MERGE.
     Solo procesa registros nuevos desde fecha_desde.
+    
+    rango_fechas (min, max) acota el MERGE a las particiones del delta
+    cuando el origen ya viene filtrado (modo Parquet).
     """
     print(f"\n🔄 CARGA INCREMENTAL")
     print(f"   Desde fecha: {fecha_desde or 'INICIO'}")
@@ -246,19 +707,10 @@ def cargar_incremental(client, gcs_uri, table_id, schema, fecha_desde=None):
     print(f"\n📥 Paso 1: Cargando a tabla temporal...")
     print(f"   Tabla temp: {temp_table_id}")
     
-    job_config = bigquery.LoadJobConfig(
-        schema=schema,
-        source_format=bigquery.SourceFormat.CSV,
-        skip_leading_rows=1,
-        write_disposition='WRITE_TRUNCATE',
-        max_bad_records=100,
-        encoding='UTF-8',
-        autodetect=False,
-        allow_quoted_newlines=True,
-    )
+    job_config = construir_job_config(schema, formato)
     
     try:
-        # Cargar CSV a tabla temporal
+        # Cargar origen (Parquet o CSV) a tabla temporal
         load_job = client.load_table_from_uri(gcs_uri, temp_table_id, job_config=job_config)
         print(f"   ⏳ Cargando datos temporales...")
         load_job.result()
@@ -267,58 +719,9 @@ def cargar_incremental(client, gcs_uri, table_id, schema, fecha_desde=None):
         filas_temp = temp_table.num_rows
         print(f"   ✓ Cargadas {filas_temp:,} filas a tabla temporal")
         
-        # 2. Construir query MERGE
-        print(f"\n🔀 Paso 2: Ejecutando MERGE...")
-        
-        # Filtro de fecha si existe
-        where_clause = ""
-        if fecha_desde:
-            where_clause = f"WHERE fecha > '{fecha_desde}'"
-        
-        # Generar lista de columnas para UPDATE
-        columnas_update = []
-        for field in schema:
-            col = field.name
-            # No actualizar claves primarias
-            if col not in ['game_id', 'player_id', 'fecha']:
-                columnas_update.append(f"T.{col} = S.{col}")
-        
-        update_set = ",\n        ".join(columnas_update)
-        
-        # Generar lista de columnas para INSERT
-        columnas = [field.name for field in schema]
-        columnas_str = ", ".join(columnas)
-        valores_str = ", ".join([f"S.{col}" for col in columnas])
-        
-        merge_query = f"""
-        MERGE `{table_id}` T
-        USING (
-            SELECT * FROM `{temp_table_id}`
-            {where_clause}
-        ) S
-        ON T.game_id = S.game_id 
-           AND T.player_id = S.player_id 
-           AND T.fecha = S.fecha
-        WHEN MATCHED THEN
-            UPDATE SET
-                {update_set}
-        WHEN NOT MATCHED THEN
-            INSERT ({columnas_str})
-            VALUES ({valores_str})
-        """
-        
-        # Ejecutar MERGE
-        merge_job = client.query(merge_query)
-        merge_result = merge_job.result()
-        
-        # Obtener estadísticas del MERGE
-        stats = merge_job._properties.get('statistics', {}).get('dml_stats', {})
-        filas_insertadas = stats.get('inserted_row_count', 0)
-        filas_actualizadas = stats.get('updated_row_count', 0)
-        
-        print(f"   ✓ MERGE completado:")
-        print(f"      • Insertadas: {filas_insertadas:,} filas nuevas")
-        print(f"      • Actualizadas: {filas_actualizadas:,} filas existentes")
+        # 2. MERGE sobre la tabla final
+        where_clause = f"WHERE fecha > '{fecha_desde}'" if fecha_desde else ""
+        ejecutar_merge(client, temp_table_id, table_id, schema, where_clause, rango_fechas)
         
         # 3. Limpiar tabla temporal
         print(f"\n🧹 Paso 3: Limpiando tabla temporal...")
@@ -347,7 +750,7 @@ def cargar_incremental(client, gcs_uri, table_id, schema, fecha_desde=None):
         return False
 
 
-def cargar_completo(client, gcs_uri, table_id, schema):
+def cargar_completo(client, gcs_uri, table_id, schema, formato='parquet'):
     """
     Carga completa (WRITE_TRUNCATE) - solo para primera vez.
     """
@@ -355,16 +758,15 @@ def cargar_completo(client, gcs_uri, table_id, schema):
     print(f"   Origen: {gcs_uri}")
     print(f"   Destino: {table_id}")
     
-    job_config = bigquery.LoadJobConfig(
-        schema=schema,
-        source_format=bigquery.SourceFormat.CSV,
-        skip_leading_rows=1,
-        write_disposition='WRITE_TRUNCATE',
-        max_bad_records=100,
-        encoding='UTF-8',
-        autodetect=False,
-        allow_quoted_newlines=True,
-    )
+    job_config = construir_job_config(schema, formato)
+    
+    # Particionar por fecha al crear la tabla: los MERGE incrementales
+    # solo tocan las particiones del delta. Si la tabla ya existe se
+    # respeta su especificación actual.
+    try:
+        client.get_table(table_id)
+    except NotFound:
+        job_config.time_partitioning = particionamiento_raw()
     
     try:
         load_job = client.load_table_from_uri(gcs_uri, table_id, job_config=job_config)
@@ -385,6 +787,145 @@ def cargar_completo(client, gcs_uri, table_id, schema):
         return False
 
 
+def listar_shards(fuente):
+    """
+    Lista los shards (liga/temporada) de una fuente en GCS.
+    Acepta un directorio (gs://bucket/data/shards/) o un glob
+    (gs://bucket/data/shards/*_2025.csv).
+    
+    Returns:
+        Lista de huellas de los blobs (metadata de list_blobs, sin requests extra)
+    """
+    bucket_name, _, patron = fuente[len("gs://"):].partition("/")
+    if not any(c in patron for c in "*?["):
+        patron = patron.rstrip("/") + "/*.csv"
+    
+    prefijo = patron
+    for comodin in "*?[":
+        prefijo = prefijo.split(comodin)[0]
+    
+    storage_client = storage.Client(project=PROJECT_ID)
+    blobs = storage_client.list_blobs(bucket_name, prefix=prefijo)
+    
+    return sorted(
+        (huella_desde_blob(b) for b in blobs if fnmatch.fnmatch(b.name, patron)),
+        key=lambda h: h['uri']
+    )
+
+
+def stagear_shard(client, huella, temp_table_id, schema, fecha_desde=None):
+    """
+    Convierte un shard a Parquet (validado, solo el delta) y lo agrega
+    a la tabla temporal compartida con un job WRITE_APPEND.
+    """
+    inicio = time.time()
+    bucket_name, _, blob_name = huella['uri'][len("gs://"):].partition("/")
+    
+    gcs_uri, stats = preparar_parquet_en_gcs(bucket_name, blob_name, schema, fecha_desde)
+    
+    filas = 0
+    if gcs_uri is not None:
+        job_config = construir_job_config(schema, 'parquet')
+        job_config.write_disposition = 'WRITE_APPEND'
+        load_job = client.load_table_from_uri(gcs_uri, temp_table_id, job_config=job_config)
+        load_job.result()
+        filas = load_job.output_rows or 0
+    
+    return {
+        'huella': huella,
+        'filas': filas,
+        'filas_cuarentena': stats['filas_cuarentena'],
+        'fechas': stats['fechas'],
+        'mb_origen': huella['size'] / (1024*1024),
+        'segundos': time.time() - inicio,
+    }
+
+
+def imprimir_throughput_shards(resultados):
+    """
+    Reporte por shard: filas, cuarentena, tiempo y throughput.
+    """
+    print(f"\n📈 THROUGHPUT POR SHARD:")
+    print(f"   {'Shard':<45} {'Filas':>10} {'Cuarent.':>9} {'Seg':>7} {'Filas/s':>10} {'MB/s':>7}")
+    for r in sorted(resultados, key=lambda r: r['huella']['uri']):
+        nombre = Path(r['huella']['uri']).name
+        segundos = max(r['segundos'], 1e-9)
+        print(f"   {nombre:<45} {r['filas']:>10,} {r['filas_cuarentena']:>9,} "
+              f"{r['segundos']:>7.1f} {r['filas'] / segundos:>10,.0f} {r['mb_origen'] / segundos:>7.1f}")
+
+
+def cargar_shards(client, huellas, table_id, schema, manifiesto, max_workers=SHARDS_MAX_WORKERS,
+                  forzar=False):
+    """
+    Ingesta paralela de shards: cada shard se convierte y se carga en
+    paralelo (pool acotado de jobs) a una única tabla temporal, y luego
+    se hace un solo MERGE sobre la tabla final.
+    
+    El delta de cada shard se corta con la última fecha registrada para
+    ese shard en el manifiesto (no con MAX(fecha) global: una liga nueva
+    trae fechas anteriores a las ya cargadas de otras ligas).
+    
+    Returns:
+        Lista de resultados por shard, o None si hubo errores.
+    """
+    print(f"\n🧩 CARGA POR SHARDS ({len(huellas)} shards, {max_workers} en paralelo)")
+    
+    # La tabla final debe existir para el MERGE
+    try:
+        client.get_table(table_id)
+    except NotFound:
+        tabla = bigquery.Table(table_id, schema=schema)
+        tabla.time_partitioning = particionamiento_raw()
+        client.create_table(tabla)
+        print(f"   ✓ Tabla destino creada (particionada por fecha)")
+    
+    temp_table_id = f"{table_id}_temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    client.create_table(bigquery.Table(temp_table_id, schema=schema))
+    print(f"   Tabla temp: {temp_table_id}")
+    
+    try:
+        resultados = []
+        errores = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futuros = {}
+            for huella in huellas:
+                registro = manifiesto.get('fuentes', {}).get(huella['uri']) or {}
+                fecha_desde = None
+                if registro.get('ultima_fecha') and not forzar:
+                    fecha_desde = date.fromisoformat(registro['ultima_fecha'])
+                futuro = pool.submit(stagear_shard, client, huella, temp_table_id, schema, fecha_desde)
+                futuros[futuro] = huella
+            
+            for futuro in as_completed(futuros):
+                try:
+                    resultados.append(futuro.result())
+                except Exception as e:
+                    errores.append(futuros[futuro]['uri'])
+                    print(f"   ❌ Shard {futuros[futuro]['uri']}: {e}")
+        
+        if errores:
+            print(f"\n❌ {len(errores)} shard(s) con errores - no se ejecuta el MERGE")
+            client.delete_table(temp_table_id, not_found_ok=True)
+            return None
+        
+        imprimir_throughput_shards(resultados)
+        
+        fechas = sorted(f for r in resultados for f in r['fechas'])
+        if fechas:
+            ejecutar_merge(client, temp_table_id, table_id, schema, rango_fechas=(fechas[0], fechas[-1]))
+        else:
+            print(f"\n   ℹ️ Ningún shard trae filas nuevas")
+        
+        client.delete_table(temp_table_id, not_found_ok=True)
+        return resultados
+    
+    except Exception as e:
+        print(f"\n❌ ERROR en carga por shards:")
+        print(f"   {str(e)}")
+        client.delete_table(temp_table_id, not_found_ok=True)
+        return None
+
+
 def mostrar_resumen_datos(client, table_id):
     """
     Muestra resumen de datos cargados.
@@ -430,10 +971,151 @@ def mostrar_resumen_datos(client, table_id):
         print(f"      {row.partidos} partidos | {row.goles_total} goles | xG: {row.xG_promedio}")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga de datos crudos a BigQuery")
+    parser.add_argument(
+        '--formato', choices=['parquet', 'csv'], default='parquet',
+        help="parquet: convierte el CSV a Parquet tipado antes de cargar (default). "
+             "csv: carga directa del CSV (modo legado)."
+    )
+    parser.add_argument(
+        '--fuente', metavar='GS_URI',
+        help="Directorio o glob de shards liga/temporada en GCS "
+             "(p.ej. gs://bucket/data/shards/ o gs://bucket/data/shards/*.csv)."
+    )
+    parser.add_argument(
+        '--workers', type=int, default=SHARDS_MAX_WORKERS,
+        help="Máximo de shards cargándose en paralelo."
+    )
+    parser.add_argument(
+        '--manifiesto', default=MANIFIESTO_URI,
+        help="Ruta del manifiesto de carga (gs://... o archivo local)."
+    )
+    parser.add_argument(
+        '--forzar', action='store_true',
+        help="Carga aunque el manifiesto indique que la fuente no cambió."
+    )
+    parser.add_argument(
+        '--local', metavar='CSV',
+        help="Carga el CSV validado al backend local (Parquet + DuckDB en SCOUTING_LOCAL_DIR), sin GCP."
+    )
+    parser.add_argument(
+        '--benchmark-local', metavar='DIR',
+        help="Solo convierte los CSV de DIR a Parquet y reporta tiempos (sin GCP)."
+    )
+    return parser.parse_args()
+
+
+def cargar_local(csv_path):
+    """
+    Carga completa al backend local: valida el CSV, escribe la tabla cruda
+    como Parquet y deja las filas rechazadas en <dir>/cuarentena/.
+    """
+    backend = crear_backend('local')
+    table_id = f"{RAW_DATASET}.jugadores_stats_raw"
+    
+    print("="*70)
+    print("  CARGA LOCAL - PARQUET + DUCKDB")
+    print("="*70)
+    print(f"\n📂 Archivo a cargar: {csv_path}")
+    print(f"📊 Destino: {backend.directorio}/{RAW_DATASET}/jugadores_stats_raw.parquet")
+    
+    cuarentena_dir = backend.directorio / "cuarentena"
+    cuarentena_dir.mkdir(exist_ok=True)
+    cuarentena_path = cuarentena_dir / f"{Path(csv_path).stem}.parquet"
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parquet_path = os.path.join(tmp_dir, f"{Path(csv_path).stem}.parquet")
+        stats = convertir_csv_a_parquet(csv_path, parquet_path, SCHEMA_COMPLETO, cuarentena_path=str(cuarentena_path))
+        print(f"\n   ✓ {stats['filas']:,} filas válidas convertidas en {stats['segundos']:.1f}s")
+        if stats['filas_cuarentena']:
+            imprimir_resumen_cuarentena(stats, cuarentena_path)
+        backend.cargar_parquet(parquet_path, table_id)
+    
+    mostrar_resumen_datos(backend, table_id)
+
+
+def main_shards(args):
+    """
+    Flujo de carga para múltiples shards liga/temporada.
+    """
+    print("="*70)
+    print("  CARGA A BIGQUERY - SHARDS MULTI-LIGA")
+    print("="*70)
+    
+    table_id = f"{PROJECT_ID}.{RAW_DATASET}.jugadores_stats_raw"
+    print(f"\n📂 Fuente: {args.fuente}")
+    print(f"📊 Destino: {table_id}")
+    
+    # 1. Listar shards y descartar los que no cambiaron (manifiesto)
+    huellas = listar_shards(args.fuente)
+    if not huellas:
+        print(f"\n❌ No se encontraron shards en {args.fuente}")
+        sys.exit(1)
+    
+    manifiesto = leer_manifiesto(args.manifiesto, PROJECT_ID)
+    if not args.forzar:
+        huellas_cambiadas = [h for h in huellas if not fuente_sin_cambios(manifiesto, h)]
+    else:
+        huellas_cambiadas = huellas
+    
+    print(f"   ✓ {len(huellas)} shards encontrados, {len(huellas_cambiadas)} con cambios")
+    if not huellas_cambiadas:
+        print(f"\n✅ Ningún shard cambió desde la última carga - nada que cargar")
+        return
+    
+    # 2. Stage concurrente + MERGE único
+    client = crear_cliente_bigquery()
+    resultados = cargar_shards(
+        client, huellas_cambiadas, table_id, SCHEMA_COMPLETO, manifiesto, args.workers, args.forzar
+    )
+    
+    if resultados is None:
+        print(f"\n{'='*70}")
+        print(f"  ⚠️ PROCESO FINALIZADO CON ERRORES")
+        print(f"{'='*70}")
+        sys.exit(1)
+    
+    # 3. Registrar cada shard con su propia última fecha
+    for r in resultados:
+        registro = manifiesto.get('fuentes', {}).get(r['huella']['uri']) or {}
+        ultima_fecha = max(
+            [str(f) for f in r['fechas']] + ([registro['ultima_fecha']] if registro.get('ultima_fecha') else []),
+            default=None
+        )
+        registrar_carga(manifiesto, r['huella'], ultima_fecha)
+    
+    # Las fechas tocadas guían la reconstrucción incremental del DWH
+    encolar_fechas(manifiesto, 'dwh', {f for r in resultados for f in r['fechas']})
+    guardar_manifiesto(args.manifiesto, manifiesto, PROJECT_ID)
+    print(f"   ✓ Manifiesto actualizado: {args.manifiesto}")
+    
+    mostrar_resumen_datos(client, table_id)
+    
+    print(f"\n{'='*70}")
+    print(f"  🎉 PROCESO COMPLETADO EXITOSAMENTE")
+    print(f"{'='*70}")
+
+
 def main():
+    args = parse_args()
+    
+    if args.benchmark_local:
+        benchmark_conversion_local(args.benchmark_local, SCHEMA_COMPLETO)
+        return
+    
+    if args.local:
+        cargar_local(args.local)
+        return
+    
+    if args.fuente:
+        main_shards(args)
+        return
+    
     print("="*70)
     print("  CARGA A BIGQUERY - FÚTBOL ARGENTINO 2021-2025")
     print("  Modo: CARGA INCREMENTAL INTELIGENTE")
+    print(f"  Formato de ingesta: {args.formato.upper()}")
     print("="*70)
     
     # Configuración
@@ -444,8 +1126,17 @@ def main():
     print(f"\n📂 Archivo a cargar: {gcs_uri}")
     print(f"📊 Destino: {table_id}")
     
-    # 1. Validar archivo en GCS (no bloqueante)
-    validar_csv_en_gcs(BUCKET_NAME, blob_path)
+    # 1. Validar archivo en GCS y comparar su huella con el manifiesto
+    huella = validar_csv_en_gcs(BUCKET_NAME, blob_path)
+    if huella is None:
+        sys.exit(1)
+    
+    manifiesto = leer_manifiesto(args.manifiesto, PROJECT_ID)
+    if fuente_sin_cambios(manifiesto, huella) and not args.forzar:
+        registro = manifiesto['fuentes'][huella['uri']]
+        print(f"\n✅ Fuente sin cambios desde {registro['cargado_en']} "
+              f"(última fecha: {registro['ultima_fecha']}) - nada que cargar")
+        return
     
     # 2. Inicializar cliente BigQuery con método robusto
     client = crear_cliente_bigquery()
@@ -453,21 +1144,48 @@ def main():
     # 3. Determinar tipo de carga (incremental vs completa)
     ultima_fecha = obtener_ultima_fecha_cargada(client, table_id)
     
+    # 3b. Convertir a Parquet tipado (SCHEMA_COMPLETO como fuente de verdad).
+    # En modo incremental solo se extrae y sube el delta (fecha > ultima_fecha).
+    rango_fechas = None
+    if args.formato == 'parquet':
+        gcs_uri, stats = preparar_parquet_en_gcs(BUCKET_NAME, blob_path, SCHEMA_COMPLETO, ultima_fecha)
+        if gcs_uri is None:
+            registrar_carga(manifiesto, huella, ultima_fecha)
+            guardar_manifiesto(args.manifiesto, manifiesto, PROJECT_ID)
+            print(f"\n✅ Sin datos nuevos desde {ultima_fecha} - nada que cargar")
+            return
+        if ultima_fecha:
+            rango_fechas = (stats['fechas'][0], stats['fechas'][-1])
+    
     print(f"\n{'='*70}")
     
     if ultima_fecha:
         # CARGA INCREMENTAL
         print(f"  Modo: INCREMENTAL (desde {ultima_fecha})")
-        exito = cargar_incremental(client, gcs_uri, table_id, SCHEMA_COMPLETO, ultima_fecha)
+        exito = cargar_incremental(
+            client, gcs_uri, table_id, SCHEMA_COMPLETO, ultima_fecha, args.formato, rango_fechas
+        )
     else:
         # CARGA COMPLETA (primera vez)
         print(f"  Modo: COMPLETA (primera carga)")
-        exito = cargar_completo(client, gcs_uri, table_id, SCHEMA_COMPLETO)
+        exito = cargar_completo(client, gcs_uri, table_id, SCHEMA_COMPLETO, args.formato)
     
     print(f"{'='*70}")
     
     # 4. Mostrar resumen si fue exitoso
     if exito:
+        ultima_fecha_cargada = obtener_ultima_fecha_cargada(client, table_id)
+        registrar_carga(manifiesto, huella, ultima_fecha_cargada)
+        
+        # Las fechas tocadas guían la reconstrucción incremental del DWH.
+        # Sin delta conocido (carga completa o CSV legado) se pide rebuild completo.
+        if rango_fechas:
+            encolar_fechas(manifiesto, 'dwh', stats['fechas'])
+        else:
+            encolar_fechas(manifiesto, 'dwh', [], completo=True)
+        guardar_manifiesto(args.manifiesto, manifiesto, PROJECT_ID)
+        print(f"   ✓ Manifiesto actualizado: {args.manifiesto}")
+        
         mostrar_resumen_datos(client, table_id)
         
         print(f"\n{'='*70}")
@@ -1,127 +1,218 @@
 from google.cloud import bigquery
+import argparse
+import sys
+
+from backend import crear_backend
+from manifiesto_carga import (
+    leer_manifiesto,
+    guardar_manifiesto,
+    fechas_pendientes,
+    encolar_fechas,
+    vaciar_pendientes,
+)
 
 # --- CONFIGURACIÓN ---
 PROJECT_ID = "proyecto-scouting-futbol"
 RAW_DATASET = "raw_scouting"
 DWH_DATASET = "dwh_scouting"
+BUCKET_NAME = "bucket-scouting-futbol-raw-data"
+MANIFIESTO_URI = f"gs://{BUCKET_NAME}/data/_manifiesto_carga.json"
 
-def create_dwh_table(client, sql, target_table_id):
-    job_config = bigquery.QueryJobConfig(
-        destination=target_table_id,
-        write_disposition='WRITE_TRUNCATE',
+def sql_partidos_procesados(filtro=""):
+    """
+    SELECT del DWH sobre la tabla cruda. filtro es un AND adicional
+    (p.ej. para limitar a las fechas que recibió la última carga).
+    """
+    return f"""
+    SELECT
+        -- 1. CONTEXTO
+        liga,
+        CAST(REGEXP_EXTRACT(temporada, r'[0-9]{{4}}') AS INT64) AS temporada_anio,
+        temporada as temporada_original,
+        game_id,
+        fecha, 
+        
+        TRIM(REPLACE(team, 'Club Atlético', '')) AS team,
+        player_name as player,
+        player_id,
+
+        -- 2. PERFIL JUGADOR
+        CASE
+            WHEN position = 'G' THEN 'Arquero'
+            WHEN position = 'D' THEN 'Defensor'
+            WHEN position = 'M' THEN 'Mediocampista'
+            WHEN position = 'F' THEN 'Delantero'
+            ELSE 'Desconocido'
+        END AS posicion_agrupada,
+        position as posicion_original,
+        is_substitute,
         
-        # 🔹 PARTICIONAMIENTO: Divide tabla por fecha
-        time_partitioning=bigquery.TimePartitioning(
-            type_=bigquery.TimePartitioningType.DAY,
-            field="fecha",
-            expiration_ms=None
-        ),
+        -- Datos Físicos y Económicos
+        country AS nacionalidad,
+        height_cm as altura,
+        age_at_match as edad_al_partido,
+        market_value_euro as valor_mercado,
+        contrato_vence,
+        pie_preferido,
+
+        -- 3. MÉTRICAS DE RENDIMIENTO
+        minutes_played,
+        rating,
         
-        # 🔹 CLUSTERING: Ordena datos dentro de cada partición
-        clustering_fields=["posicion_agrupada", "team"]
-    )
-    
+        -- Ataque
+        COALESCE(goals, 0) AS goals,
+        COALESCE(assists, 0) AS assists,
+        COALESCE(xG, 0) AS xG,
+        COALESCE(xA, 0) AS xA,
+        COALESCE(shots_total, 0) AS shots_total,
+        COALESCE(shots_on_target, 0) AS shots_on_target,
+        COALESCE(big_chances_created, 0) AS big_chances_created,
+        COALESCE(dribbles_completed, 0) AS dribbles_completed,
+        
+        -- Construcción
+        COALESCE(passes_acc, 0) AS passes_acc,
+        COALESCE(key_passes, 0) AS key_passes,
+        COALESCE(long_balls_acc, 0) AS long_balls_acc,
+        COALESCE(crosses_acc, 0) AS crosses_acc,
+        COALESCE(opp_half_passes_acc, 0) AS pases_progresivos,
+        
+        -- Defensa
+        COALESCE(tackles_won, 0) AS tackles_won,
+        COALESCE(interceptions, 0) AS interceptions,
+        COALESCE(ball_recoveries, 0) as recuperaciones,
+        COALESCE(clearances_total, 0) as clearances,
+        COALESCE(blocked_shots, 0) as blocked_shots,
+        
+        -- Duelos
+        COALESCE(duels_won, 0) AS duels_won,
+        COALESCE(duels_total, 0) AS duels_total,
+        COALESCE(aerial_won, 0) AS aerial_won,
+        COALESCE(aerial_total, 0) AS aerial_total,
+        
+        -- Negativas
+        COALESCE(possession_lost, 0) as perdidas_balon,
+        COALESCE(fouls_committed, 0) as faltas_cometidas,
+        COALESCE(errors_leading_to_shot, 0) as errors_leading_to_shot,
+        
+        -- ARQUEROS (AGREGADO)
+        COALESCE(gk_saves, 0) as gk_saves,
+        COALESCE(gk_saves_inside_box, 0) as gk_saves_inside_box,
+        COALESCE(gk_high_claims, 0) as gk_high_claims,
+        COALESCE(gk_crosses_not_claimed, 0) as gk_crosses_not_claimed,
+        COALESCE(gk_punches, 0) as gk_punches,
+        COALESCE(gk_sweeper_accurate, 0) as gk_sweeper_accurate,
+        COALESCE(gk_sweeper_total, 0) as gk_sweeper_total,
+        COALESCE(gk_penalty_save, 0) as gk_penalty_save
+
+    FROM `{PROJECT_ID}.{RAW_DATASET}.jugadores_stats_raw`
+    WHERE minutes_played > 0
+      {filtro}
+"""
+
+def create_dwh_table(backend, sql, target_table_id):
     try:
-        query_job = client.query(sql, job_config=job_config)
-        query_job.result()
-        table = client.get_table(target_table_id)
+        # 🔹 PARTICIONAMIENTO por fecha + CLUSTERING posicion_agrupada/team (table_specs.py)
+        backend.crear_tabla_desde_query(sql, target_table_id)
         print(f"✓ Tabla DWH '{target_table_id}' creada.")
-        print(f"  - Filas: {table.num_rows:,}")
+        print(f"  - Filas: {backend.num_filas(target_table_id):,}")
         print(f"  - Particionada por: fecha")
         print(f"  - Clustering: posicion_agrupada, team")
+        return True
     except Exception as e:
         print(f"❌ Error creando '{target_table_id}': {e}")
+        return False
+
+
+def actualizar_particiones_dwh(client, target_table_id, fechas):
+    """
+    Reescribe solo las particiones (fechas) que recibieron filas nuevas
+    en la tabla cruda. DELETE + INSERT en una transacción: el costo escala
+    con los partidos nuevos, no con todo el histórico.
+    """
+    script = f"""
+        BEGIN TRANSACTION;
+
+        DELETE FROM `{target_table_id}`
+        WHERE fecha IN UNNEST(@fechas);
+
+        INSERT INTO `{target_table_id}`
+        {sql_partidos_procesados("AND fecha IN UNNEST(@fechas)")};
+
+        COMMIT TRANSACTION;
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("fechas", "DATE", fechas)]
+    )
+
+    try:
+        query_job = client.query(script, job_config=job_config)
+        query_job.result()
+        print(f"✓ Tabla DWH '{target_table_id}' actualizada (incremental).")
+        print(f"  - Particiones reescritas: {len(fechas)} ({fechas[0]} a {fechas[-1]})")
+        print(f"  - Bytes procesados: {(query_job.total_bytes_processed or 0) / (1024*1024):.1f} MB")
+        return True
+    except Exception as e:
+        print(f"❌ Error actualizando '{target_table_id}': {e}")
+        return False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Construcción del DWH partidos_procesados_pro")
+    parser.add_argument(
+        '--modo', choices=['auto', 'completo', 'incremental'], default='auto',
+        help="auto: incremental con las fechas que dejó el loader, completo si no hay base (default). "
+             "completo: WRITE_TRUNCATE sobre todo el histórico."
+    )
+    parser.add_argument(
+        '--manifiesto', default=MANIFIESTO_URI,
+        help="Manifiesto de carga con las fechas pendientes (gs://... o archivo local)."
+    )
+    return parser.parse_args()
+
 
 if __name__ == '__main__':
-    client = bigquery.Client(project=PROJECT_ID)
+    args = parse_args()
+    backend = crear_backend()
     dwh_table_id = f"{PROJECT_ID}.{DWH_DATASET}.partidos_procesados_pro"
 
-    sql_partidos_procesados = f"""
-        SELECT
-            -- 1. CONTEXTO
-            liga,
-            CAST(REGEXP_EXTRACT(temporada, r'[0-9]{{4}}') AS INT64) AS temporada_anio,
-            temporada as temporada_original,
-            game_id,
-            fecha, 
-            
-            TRIM(REPLACE(team, 'Club Atlético', '')) AS team,
-            player_name as player,
-            player_id,
-
-            -- 2. PERFIL JUGADOR
-            CASE
-                WHEN position = 'G' THEN 'Arquero'
-                WHEN position = 'D' THEN 'Defensor'
-                WHEN position = 'M' THEN 'Mediocampista'
-                WHEN position = 'F' THEN 'Delantero'
-                ELSE 'Desconocido'
-            END AS posicion_agrupada,
-            position as posicion_original,
-            is_substitute,
-            
-            -- Datos Físicos y Económicos
-            country AS nacionalidad,
-            height_cm as altura,
-            age_at_match as edad_al_partido,
-            market_value_euro as valor_mercado,
-            contrato_vence,
-            pie_preferido,
-
-            -- 3. MÉTRICAS DE RENDIMIENTO
-            minutes_played,
-            rating,
-            
-            -- Ataque
-            COALESCE(goals, 0) AS goals,
-            COALESCE(assists, 0) AS assists,
-            COALESCE(xG, 0) AS xG,
-            COALESCE(xA, 0) AS xA,
-            COALESCE(shots_total, 0) AS shots_total,
-            COALESCE(shots_on_target, 0) AS shots_on_target,
-            COALESCE(big_chances_created, 0) AS big_chances_created,
-            COALESCE(dribbles_completed, 0) AS dribbles_completed,
-            
-            -- Construcción
-            COALESCE(passes_acc, 0) AS passes_acc,
-            COALESCE(key_passes, 0) AS key_passes,
-            COALESCE(long_balls_acc, 0) AS long_balls_acc,
-            COALESCE(crosses_acc, 0) AS crosses_acc,
-            COALESCE(opp_half_passes_acc, 0) AS pases_progresivos,
-            
-            -- Defensa
-            COALESCE(tackles_won, 0) AS tackles_won,
-            COALESCE(interceptions, 0) AS interceptions,
-            COALESCE(ball_recoveries, 0) as recuperaciones,
-            COALESCE(clearances_total, 0) as clearances,
-            COALESCE(blocked_shots, 0) as blocked_shots,
-            
-            -- Duelos
-            COALESCE(duels_won, 0) AS duels_won,
-            COALESCE(duels_total, 0) AS duels_total,
-            COALESCE(aerial_won, 0) AS aerial_won,
-            COALESCE(aerial_total, 0) AS aerial_total,
-            
-            -- Negativas
-            COALESCE(possession_lost, 0) as perdidas_balon,
-            COALESCE(fouls_committed, 0) as faltas_cometidas,
-            COALESCE(errors_leading_to_shot, 0) as errors_leading_to_shot,
-            
-            -- ARQUEROS (AGREGADO)
-            COALESCE(gk_saves, 0) as gk_saves,
-            COALESCE(gk_saves_inside_box, 0) as gk_saves_inside_box,
-            COALESCE(gk_high_claims, 0) as gk_high_claims,
-            COALESCE(gk_crosses_not_claimed, 0) as gk_crosses_not_claimed,
-            COALESCE(gk_punches, 0) as gk_punches,
-            COALESCE(gk_sweeper_accurate, 0) as gk_sweeper_accurate,
-            COALESCE(gk_sweeper_total, 0) as gk_sweeper_total,
-            COALESCE(gk_penalty_save, 0) as gk_penalty_save
-
-        FROM `{PROJECT_ID}.{RAW_DATASET}.jugadores_stats_raw`
-        WHERE minutes_played > 0
-    """
+    # En local no hay manifiesto ni particiones: siempre rebuild completo
+    es_local = backend.nombre == 'local'
+    manifiesto = {} if es_local else leer_manifiesto(args.manifiesto, PROJECT_ID)
+    fechas, pide_completo = fechas_pendientes(manifiesto, 'dwh')
+
+    modo = 'completo' if es_local else args.modo
+    if modo == 'auto':
+        modo = 'completo' if pide_completo or not backend.existe(dwh_table_id) else 'incremental'
+        # Un layout viejo no admite DELETE/INSERT por partición: se recrea completo
+        if modo == 'incremental' and backend.layout_desactualizado(dwh_table_id):
+            modo = 'completo'
+
+    if modo == 'completo':
+        print(f"Iniciando transformación completa hacia: {dwh_table_id}")
+        print(f"  • Incluye métricas de arqueros")
+        print(f"  • Incluye stats negativas")
+        actualizado = create_dwh_table(backend, sql_partidos_procesados(), dwh_table_id)
+        fallo = not actualizado
+        if actualizado:
+            encolar_fechas(manifiesto, 'datamart', [], completo=True)
+    elif not fechas:
+        print(f"✓ Sin fechas pendientes para '{dwh_table_id}' - nada que reconstruir")
+        print(f"  (usar --modo completo para forzar un rebuild total)")
+        actualizado = False
+        fallo = False
+    else:
+        print(f"Iniciando transformación incremental hacia: {dwh_table_id}")
+        print(f"  • {len(fechas)} fechas tocadas por la última carga")
+        actualizado = actualizar_particiones_dwh(backend.client, dwh_table_id, fechas)
+        fallo = not actualizado
+        if actualizado:
+            encolar_fechas(manifiesto, 'datamart', fechas)
+
+    # Las fechas pasan a la cola del datamart solo si el DWH quedó actualizado
+    if actualizado and not es_local:
+        vaciar_pendientes(manifiesto, 'dwh')
+        guardar_manifiesto(args.manifiesto, manifiesto, PROJECT_ID)
 
-    print(f"Iniciando transformación completa hacia: {dwh_table_id}")
-    print(f"  • Incluye métricas de arqueros")
-    print(f"  • Incluye stats negativas")
-    create_dwh_table(client, sql_partidos_procesados, dwh_table_id)
\ No newline at end of file
+    # El DAG (pipeline.py) marca la etapa como ok solo con exit code 0
+    if fallo:
+        sys.exit(1)
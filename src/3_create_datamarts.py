@@ -1,27 +1,46 @@
 from google.cloud import bigquery
+import argparse
+import sys
+import time
+
+from backend import crear_backend
+from percentiles import (
+    SPEC_PERCENTILES,
+    SPEC_PERCENTILES_FORMA,
+    VENTANAS_FORMA,
+    agregar_percentiles,
+    sql_percentiles,
+)
+from manifiesto_carga import (
+    leer_manifiesto,
+    guardar_manifiesto,
+    fechas_pendientes,
+    vaciar_pendientes,
+)
 
 PROJECT_ID = "proyecto-scouting-futbol"
 DWH_DATASET = "dwh_scouting"
 DM_DATASET = "dm_scouting"
+BUCKET_NAME = "bucket-scouting-futbol-raw-data"
+MANIFIESTO_URI = f"gs://{BUCKET_NAME}/data/_manifiesto_carga.json"
+
+# Forma reciente: sumas por ventana de últimos N partidos -> P90 (alias, columna DWH)
+METRICAS_FORMA = [
+    ('goals', 'goals'), ('assists', 'assists'), ('xG', 'xG'), ('xA', 'xA'),
+    ('key_passes', 'key_passes'), ('prog_passes', 'pases_progresivos'),
+    ('dribbles', 'dribbles_completed'), ('tackles', 'tackles_won'),
+    ('interceptions', 'interceptions'), ('recoveries', 'recuperaciones'),
+    ('saves', 'gk_saves'),
+]
 
-def create_datamart_table(client, sql, target_table_id):
-    job_config = bigquery.QueryJobConfig(
-        destination=target_table_id,
-        write_disposition='WRITE_TRUNCATE'
-    )
-    try:
-        query_job = client.query(sql, job_config=job_config)
-        query_job.result()
-        table = client.get_table(target_table_id)
-        print(f"✓ Datamart PRO Generado. Filas: {table.num_rows}")
-    except Exception as e:
-        print(f"❌ Error: {e}")
 
-if __name__ == '__main__':
-    client = bigquery.Client(project=PROJECT_ID)
-    target_table = f"{PROJECT_ID}.{DM_DATASET}.stats_jugador_temporada_pro"
 
-    sql_datamart = f"""
+def sql_metricas(filtro=""):
+    """
+    Agregados por jugador-temporada + métricas P90 (sin percentiles).
+    filtro se aplica sobre partidos_procesados_pro (alias d).
+    """
+    return f"""
     WITH StatsBase AS (
         SELECT
             player_id,
@@ -29,7 +48,7 @@ if __name__ == '__main__':
             temporada_anio,
             game_id,
             fecha,
-            
+        
             -- Dimensiones
             posicion_agrupada,
             team,
@@ -39,25 +58,25 @@ if __name__ == '__main__':
             valor_mercado,
             contrato_vence,
             edad_al_partido,
-            
+        
             -- Métricas por partido
             minutes_played,
             rating,
-            
+        
             -- OFENSIVAS
             goals, assists, xG, xA,
             shots_on_target, key_passes, dribbles_completed,
-            
+        
             -- CONSTRUCCIÓN
             pases_progresivos, passes_acc, long_balls_acc, crosses_acc,
-            
+        
             -- DEFENSIVAS
             tackles_won, interceptions, recuperaciones, clearances,
             blocked_shots, duels_won, aerial_won,
-            
+        
             -- NEGATIVAS
             errors_leading_to_shot, perdidas_balon,
-            
+        
             -- ARQUEROS
             COALESCE(gk_saves, 0) as gk_saves,
             COALESCE(gk_saves_inside_box, 0) as gk_saves_inside_box,
@@ -67,19 +86,20 @@ if __name__ == '__main__':
             COALESCE(gk_sweeper_accurate, 0) as gk_sweeper_accurate,
             COALESCE(gk_sweeper_total, 0) as gk_sweeper_total,
             COALESCE(gk_penalty_save, 0) as gk_penalty_save,
-            
+        
             -- Para clean sheets
             CASE WHEN goals = 0 THEN 1 ELSE 0 END as clean_sheet,
-            
+        
             -- Contadores
             ROW_NUMBER() OVER (
                 PARTITION BY player_id, temporada_anio, team 
                 ORDER BY fecha DESC
             ) as rn_equipo
-            
-        FROM `{PROJECT_ID}.{DWH_DATASET}.partidos_procesados_pro`
+        
+        FROM `{PROJECT_ID}.{DWH_DATASET}.partidos_procesados_pro` d
+        {filtro}
     ),
-    
+
     EquipoPrincipal AS (
         SELECT
             player_id,
@@ -88,29 +108,29 @@ if __name__ == '__main__':
         FROM StatsBase
         WHERE rn_equipo = 1
     ),
-    
+
     StatsAgregadas AS (
         SELECT
             s.player_id,
             s.player,
             s.temporada_anio,
-            
+        
             -- Dimensiones
             ANY_VALUE(s.posicion_agrupada) as posicion,
             ANY_VALUE(s.nacionalidad) as nacionalidad,
             ANY_VALUE(s.altura) as altura,
             ANY_VALUE(s.pie_preferido) as pie,
-            
+        
             MAX(ep.equipo_principal) as equipo_principal,
             MAX(s.valor_mercado) as valor_mercado,
             MAX(s.contrato_vence) as contrato_vence,
             AVG(s.edad_al_partido) as edad_promedio,
-            
+        
             -- Totales generales
             SUM(s.minutes_played) as total_minutos,
             COUNT(DISTINCT s.game_id) as partidos_jugados,
             AVG(s.rating) as rating_promedio,
-            
+        
             -- ARQUEROS - Totales
             SUM(s.gk_saves) as sum_gk_saves,
             SUM(s.gk_saves_inside_box) as sum_gk_saves_inside_box,
@@ -123,7 +143,7 @@ if __name__ == '__main__':
             SUM(s.clean_sheet) as sum_clean_sheets,
             SUM(s.passes_acc) as sum_passes,
             SUM(s.long_balls_acc) as sum_long_balls,
-            
+        
             -- OFENSIVAS - Totales
             SUM(s.goals) as sum_goals,
             SUM(s.assists) as sum_assists,
@@ -132,10 +152,10 @@ if __name__ == '__main__':
             SUM(s.shots_on_target) as sum_shots_target,
             SUM(s.key_passes) as sum_key_passes,
             SUM(s.dribbles_completed) as sum_dribbles,
-            
+        
             -- CONSTRUCCIÓN - Totales
             SUM(s.pases_progresivos) as sum_prog_passes,
-            
+        
             -- DEFENSIVAS - Totales
             SUM(s.tackles_won) as sum_tackles,
             SUM(s.interceptions) as sum_interceptions,
@@ -144,11 +164,11 @@ if __name__ == '__main__':
             SUM(s.aerial_won) as sum_aerial_won,
             SUM(s.clearances) as sum_clearances,
             SUM(s.blocked_shots) as sum_blocks,
-            
+        
             -- NEGATIVAS - Totales
             SUM(s.errors_leading_to_shot) as sum_errors,
             SUM(s.perdidas_balon) as sum_dispossessed
-            
+        
         FROM StatsBase s
         LEFT JOIN EquipoPrincipal ep 
             ON s.player_id = ep.player_id 
@@ -160,11 +180,11 @@ if __name__ == '__main__':
     MetricsP90 AS (
         SELECT
             *,
-            
+        
             -- ============================================
             -- MÉTRICAS PER 90 MINUTOS
             -- ============================================
-            
+        
             -- OFENSIVAS
             SAFE_DIVIDE(sum_goals * 90, total_minutos) as goals_p90,
             SAFE_DIVIDE(sum_assists * 90, total_minutos) as assists_p90,
@@ -173,12 +193,12 @@ if __name__ == '__main__':
             SAFE_DIVIDE(sum_key_passes * 90, total_minutos) as key_passes_p90,
             SAFE_DIVIDE(sum_dribbles * 90, total_minutos) as dribbles_p90,
             SAFE_DIVIDE(sum_shots_target * 90, total_minutos) as shots_target_p90,
-            
+        
             -- CONSTRUCCIÓN
             SAFE_DIVIDE(sum_prog_passes * 90, total_minutos) as prog_passes_p90,
             SAFE_DIVIDE(sum_passes * 90, total_minutos) as passes_p90,
             SAFE_DIVIDE(sum_long_balls * 90, total_minutos) as long_balls_p90,
-            
+        
             -- DEFENSIVAS
             SAFE_DIVIDE(sum_tackles * 90, total_minutos) as tackles_p90,
             SAFE_DIVIDE(sum_interceptions * 90, total_minutos) as interceptions_p90,
@@ -186,11 +206,11 @@ if __name__ == '__main__':
             SAFE_DIVIDE(sum_aerial_won * 90, total_minutos) as aerial_won_p90,
             SAFE_DIVIDE(sum_clearances * 90, total_minutos) as clearances_p90,
             SAFE_DIVIDE(sum_blocks * 90, total_minutos) as blocks_p90,
-            
+        
             -- NEGATIVAS
             SAFE_DIVIDE(sum_errors * 90, total_minutos) as errors_p90,
             SAFE_DIVIDE(sum_dispossessed * 90, total_minutos) as dispossessed_p90,
-            
+        
             -- ============================================
             -- ARQUEROS - Per 90 (NOMBRES COMPATIBLES ML)
             -- ============================================
@@ -198,31 +218,31 @@ if __name__ == '__main__':
             SAFE_DIVIDE(sum_gk_high_claims * 90, total_minutos) as claims_p90,
             SAFE_DIVIDE(sum_gk_punches * 90, total_minutos) as punches_p90,
             SAFE_DIVIDE(sum_gk_sweeper_total * 90, total_minutos) as sweeper_p90,
-            
+        
             -- ============================================
             -- ARQUEROS - Porcentajes
             -- ============================================
-            
+        
             -- Save % (paradas / paradas + goles recibidos)
             SAFE_DIVIDE(
                 sum_gk_saves, 
                 NULLIF(sum_gk_saves + sum_goals, 0)
             ) * 100 as saves_pct,
-            
+        
             -- Clean Sheets %
             SAFE_DIVIDE(sum_clean_sheets, NULLIF(partidos_jugados, 0)) * 100 as clean_sheets_pct,
-            
+        
             -- Sweeper Accuracy %
             SAFE_DIVIDE(
                 sum_gk_sweeper_accurate, 
                 NULLIF(sum_gk_sweeper_total, 0)
             ) * 100 as sweeper_acc_pct,
-            
+        
             -- ============================================
             -- RATIOS ADICIONALES
             -- ============================================
             SAFE_DIVIDE(sum_shots_target, NULLIF(sum_goals, 0)) as shots_per_goal
-            
+        
         FROM StatsAgregadas
     )
 
@@ -239,12 +259,12 @@ if __name__ == '__main__':
         valor_mercado,
         contrato_vence,
         edad_promedio,
-        
+    
         -- Totales
         total_minutos,
         partidos_jugados,
         rating_promedio,
-        
+    
         -- Sumas
         sum_goals,
         sum_assists,
@@ -262,7 +282,7 @@ if __name__ == '__main__':
         sum_blocks,
         sum_errors,
         sum_dispossessed,
-        
+    
         -- Per 90
         goals_p90,
         assists_p90,
@@ -282,7 +302,7 @@ if __name__ == '__main__':
         blocks_p90,
         errors_p90,
         dispossessed_p90,
-        
+    
         -- Arqueros (nombres compatibles con ML)
         saves_p90,
         saves_pct,
@@ -291,114 +311,268 @@ if __name__ == '__main__':
         sweeper_acc_pct,
         claims_p90,
         punches_p90,
-        
+    
         -- Ratios
-        shots_per_goal,
-        
-        -- ============================================
-        -- PERCENTILES POR POSICIÓN
-        -- ============================================
-        
-        -- GENERALES (todas las posiciones)
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY rating_promedio
-        ) as pct_rating,
-        
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY xA_p90
-        ) as pct_xA,
-        
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY prog_passes_p90
-        ) as pct_prog_passes,
-        
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY dribbles_p90
-        ) as pct_dribbles,
-        
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY recoveries_p90
-        ) as pct_recoveries,
-        
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY aerial_won_p90
-        ) as pct_aerial,
-        
-        -- OFENSIVOS (excluir arqueros - puede ser NULL)
-        CASE WHEN posicion != 'Arquero' 
-            THEN PERCENT_RANK() OVER (
-                PARTITION BY temporada_anio, posicion 
-                ORDER BY xG_p90
-            ) 
-        END as pct_xG,
-        
-        -- ============================================
-        -- ✅ DEFENSIVOS AGREGADOS (todas las posiciones)
-        -- ============================================
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY tackles_p90
-        ) as pct_tackles,
-        
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY interceptions_p90
-        ) as pct_interceptions,
-        
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY clearances_p90
-        ) as pct_clearances,
-        
-        PERCENT_RANK() OVER (
-            PARTITION BY temporada_anio, posicion 
-            ORDER BY blocks_p90
-        ) as pct_blocks,
-        
-        -- ============================================
-        -- ARQUEROS (solo posicion = 'Arquero')
-        -- ============================================
-        CASE WHEN posicion = 'Arquero'
-            THEN PERCENT_RANK() OVER (
-                PARTITION BY temporada_anio, posicion 
-                ORDER BY saves_p90
-            )
-        END as pct_saves,
-        
-        CASE WHEN posicion = 'Arquero'
-            THEN PERCENT_RANK() OVER (
-                PARTITION BY temporada_anio, posicion 
-                ORDER BY saves_pct
-            )
-        END as pct_saves_pct,
-        
-        CASE WHEN posicion = 'Arquero'
-            THEN PERCENT_RANK() OVER (
-                PARTITION BY temporada_anio, posicion 
-                ORDER BY clean_sheets_pct
-            )
-        END as pct_clean_sheets,
-        
-        CASE WHEN posicion = 'Arquero'
-            THEN PERCENT_RANK() OVER (
-                PARTITION BY temporada_anio, posicion 
-                ORDER BY sweeper_p90
-            )
-        END as pct_sweeper
+        shots_per_goal
 
     FROM MetricsP90
     """
 
-    print("="*70)
-    print("Generando Datamart PRO - VERSION COMPLETA")
-    print("="*70)
-    create_datamart_table(client, sql_datamart, target_table)
+
+def sql_forma(filtro=""):
+    """
+    Forma reciente por jugador-temporada: partidos, minutos, rating y P90 de
+    los últimos 5 y 10 partidos (ventanas que terminan en su último partido).
+    filtro se aplica sobre partidos_procesados_pro (alias d).
+    """
+    columnas = []
+    for n in VENTANAS_FORMA:
+        en_ventana = f"n_reciente <= {n}"
+        minutos = f"SUM(CASE WHEN {en_ventana} THEN minutes_played ELSE 0 END)"
+        columnas += [
+            f"SUM(CASE WHEN {en_ventana} THEN 1 ELSE 0 END) as forma{n}_partidos",
+            f"{minutos} as forma{n}_minutos",
+            f"AVG(CASE WHEN {en_ventana} THEN rating END) as forma{n}_rating",
+        ]
+        columnas += [
+            f"SAFE_DIVIDE(SUM(CASE WHEN {en_ventana} THEN {columna} ELSE 0 END) * 90, {minutos}) as forma{n}_{alias}_p90"
+            for alias, columna in METRICAS_FORMA
+        ]
+    separador = ",\n        "
+
+    return f"""
+    WITH Partidos AS (
+        SELECT
+            d.*,
+            ROW_NUMBER() OVER (
+                PARTITION BY player_id, temporada_anio
+                ORDER BY fecha DESC, game_id DESC
+            ) as n_reciente
+        FROM `{PROJECT_ID}.{DWH_DATASET}.partidos_procesados_pro` d
+        {filtro}
+    )
+
+    SELECT
+        player_id,
+        ANY_VALUE(player) as player,
+        temporada_anio,
+        ANY_VALUE(posicion_agrupada) as posicion,
+        MAX(fecha) as ultimo_partido,
+        {separador.join(columnas)}
+    FROM Partidos
+    WHERE n_reciente <= {max(VENTANAS_FORMA)}
+    GROUP BY player_id, temporada_anio
+    """
+
+
+# Tablas que mantiene este script: (nombre, SELECT de filas, spec de percentiles)
+DATAMARTS = [
+    ('stats_jugador_temporada_pro', sql_metricas, SPEC_PERCENTILES),
+    ('forma_jugador_pro', sql_forma, SPEC_PERCENTILES_FORMA),
+]
+
+
+def sql_completo(sql_filas, spec):
+    """SELECT completo: filas + percentiles por temporada/posición."""
+    return f"""
+    SELECT
+        m.*,
+        {sql_percentiles(spec=spec)}
+    FROM (
+        {sql_filas()}
+    ) m
+    """
+
+
+def sql_datamart_completo():
+    """Datamart completo: métricas + percentiles por temporada/posición."""
+    return sql_completo(sql_metricas, SPEC_PERCENTILES)
+
+
+def create_datamart_table(backend, sql, target_table_id):
+    try:
+        backend.crear_tabla_desde_query(sql, target_table_id)
+        print(f"✓ '{target_table_id.split('.')[-1]}' generada. Filas: {backend.num_filas(target_table_id)}")
+        print(f"  - Particionada por: temporada_anio | Clustering: posicion, player_id")
+        return True
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+
+
+def create_datamart_local(backend, target_table_id, sql_filas=sql_metricas, spec=SPEC_PERCENTILES):
+    """
+    Backend local: métricas en SQL y los percentiles con el motor NumPy
+    (un argsort por bloque temporada/posición en vez de una ventana por métrica).
+    """
+    try:
+        df = backend.query_df(sql_filas())
+        inicio = time.perf_counter()
+        df = agregar_percentiles(df, spec=spec)
+        segundos = time.perf_counter() - inicio
+        backend.cargar_dataframe(df, target_table_id)
+        print(f"✓ '{target_table_id.split('.')[-1]}' generada. Filas: {len(df)}")
+        print(f"  - Percentiles (NumPy): {segundos:.2f}s")
+        return True
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+
+
+def actualizar_datamart_incremental(client, target_table_id, fechas, sql_filas=sql_metricas, spec=SPEC_PERCENTILES):
+    """
+    Mantenimiento incremental de un datamart a partir de las fechas nuevas del DWH
+    (sql_filas/spec: stats de temporada o forma reciente):
+    
+    1. Pares (player_id, temporada_anio) con partidos en esas fechas.
+    2. Agregados y P90 recalculados solo para esos pares.
+    3. Percentiles recalculados solo para los bloques (temporada, posición)
+       donde están esos jugadores (antes o después del cambio).
+    4. DELETE + INSERT de esos bloques en una transacción.
+    """
+    dwh_table = f"{PROJECT_ID}.{DWH_DATASET}.partidos_procesados_pro"
+    filtro_pares = """
+    WHERE EXISTS (
+        SELECT 1 FROM pares p
+        WHERE p.player_id = d.player_id AND p.temporada_anio = d.temporada_anio
+    )"""
+
+    script = f"""
+        CREATE TEMP TABLE pares AS
+        SELECT DISTINCT player_id, temporada_anio
+        FROM `{dwh_table}`
+        WHERE fecha IN UNNEST(@fechas);
+
+        CREATE TEMP TABLE nuevas AS
+        {sql_filas(filtro_pares)};
+
+        CREATE TEMP TABLE bloques AS
+        SELECT DISTINCT temporada_anio, posicion FROM nuevas
+        UNION DISTINCT
+        SELECT DISTINCT dm.temporada_anio, dm.posicion
+        FROM `{target_table_id}` dm
+        JOIN pares p USING (player_id, temporada_anio);
+
+        CREATE TEMP TABLE recalculo AS
+        SELECT
+            base.*,
+            {sql_percentiles(spec=spec)}
+        FROM (
+            SELECT dm.* EXCEPT({", ".join(columna for columna, _, _ in spec)})
+            FROM `{target_table_id}` dm
+            JOIN bloques b USING (temporada_anio, posicion)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM pares p
+                WHERE p.player_id = dm.player_id AND p.temporada_anio = dm.temporada_anio
+            )
+            UNION ALL
+            SELECT * FROM nuevas
+        ) base;
+
+        BEGIN TRANSACTION;
+
+        DELETE FROM `{target_table_id}` t
+        WHERE EXISTS (
+            SELECT 1 FROM bloques b
+            WHERE b.temporada_anio = t.temporada_anio AND b.posicion = t.posicion
+        );
+
+        INSERT INTO `{target_table_id}`
+        SELECT * FROM recalculo;
+
+        COMMIT TRANSACTION;
+
+        SELECT
+            (SELECT COUNT(*) FROM pares) AS pares,
+            (SELECT COUNT(*) FROM bloques) AS bloques,
+            (SELECT COUNT(*) FROM recalculo) AS filas;
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("fechas", "DATE", fechas)]
+    )
+
+    try:
+        query_job = client.query(script, job_config=job_config)
+        resumen = list(query_job.result())[0]
+        print(f"✓ '{target_table_id.split('.')[-1]}' actualizada (incremental).")
+        print(f"  - Jugador-temporadas recalculados: {resumen.pares:,}")
+        print(f"  - Bloques temporada/posición con percentiles nuevos: {resumen.bloques}")
+        print(f"  - Filas reescritas: {resumen.filas:,}")
+        return True
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+
+
+def elegir_modo(backend, table_id, modo, pide_completo):
+    """auto -> completo si se pidió rebuild, si la tabla no existe o tiene layout viejo."""
+    if modo != 'auto':
+        return modo
+    if pide_completo or not backend.existe(table_id):
+        return 'completo'
+    # Tabla con layout anterior a table_specs: se recrea particionada/clusterizada
+    if backend.layout_desactualizado(table_id):
+        return 'completo'
+    return 'incremental'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Datamarts stats_jugador_temporada_pro y forma_jugador_pro")
+    parser.add_argument(
+        '--modo', choices=['auto', 'completo', 'incremental'], default='auto',
+        help="auto: incremental con las fechas que dejó el DWH, completo si no hay base (default). "
+             "completo: recalcula todo el datamart."
+    )
+    parser.add_argument(
+        '--manifiesto', default=MANIFIESTO_URI,
+        help="Manifiesto de carga con las fechas pendientes (gs://... o archivo local)."
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    backend = crear_backend()
+
+    # En local no hay manifiesto: siempre recálculo completo
+    es_local = backend.nombre == 'local'
+    manifiesto = {} if es_local else leer_manifiesto(args.manifiesto, PROJECT_ID)
+    fechas, pide_completo = fechas_pendientes(manifiesto, 'datamart')
+
+    # Ambas tablas consumen la misma cola de fechas: se vacía solo si ninguna falló
+    resultados = []
+    for nombre, sql_filas, spec in DATAMARTS:
+        target_table = f"{PROJECT_ID}.{DM_DATASET}.{nombre}"
+        modo = 'completo' if es_local else elegir_modo(backend, target_table, args.modo, pide_completo)
+
+        print("="*70)
+        if modo == 'completo':
+            print(f"Generando {nombre} - VERSION COMPLETA")
+            print("="*70)
+            if es_local:
+                ok = create_datamart_local(backend, target_table, sql_filas, spec)
+            else:
+                ok = create_datamart_table(backend, sql_completo(sql_filas, spec), target_table)
+            resultados.append(ok)
+        elif not fechas:
+            print(f"{nombre} - sin fechas pendientes, nada que recalcular")
+            print("  (usar --modo completo para forzar un recálculo total)")
+            print("="*70)
+        else:
+            print(f"Actualizando {nombre} - INCREMENTAL ({len(fechas)} fechas nuevas)")
+            print("="*70)
+            resultados.append(
+                actualizar_datamart_incremental(backend.client, target_table, fechas, sql_filas, spec)
+            )
+
+    if resultados and all(resultados) and not es_local:
+        vaciar_pendientes(manifiesto, 'datamart')
+        guardar_manifiesto(args.manifiesto, manifiesto, PROJECT_ID)
+    
+    # El DAG (pipeline.py) marca la etapa como ok solo con exit code 0
+    if not all(resultados):
+        print(f"\n❌ {resultados.count(False)} datamart(s) fallaron")
+        sys.exit(1)
     
     print(f"\n✅ Datamart compatible con modelo ML")
     print(f"\n📊 Features P90 por posición:")
@@ -2,17 +2,38 @@
 MODELO ML COMPLETO - SCOUTING INTELIGENTE CON ARQUEROS
 Unifica: Similitud KNN + Proyección Valor + Clustering Arquetipos
 ✅ ACTUALIZADO: Incluye percentiles defensivos en features
+
+Los tres modelos comparten un único snapshot del datamart (una consulta, o
+un Parquet con --snapshot para correrlos offline).
+
+La similitud corre en modo incremental cuando hay estado de la corrida
+anterior: solo se recalculan los jugadores cambiados y los top-5 que pueden
+haberlos incorporado, y el parche se aplica con MERGE.
+
+Los scalers, índices KNN, el GradientBoosting y los KMeans de cada corrida
+quedan versionados en el registro de modelos (registro_modelos.py).
 """
 
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from google.cloud import bigquery
 from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import NearestNeighbors
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.cluster import KMeans
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, r2_score, silhouette_score
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.model_selection import train_test_split
 from typing import Dict, List
+import joblib
+
+from ann_index import INDICES, crear_indice, recall_muestra
+from backend import crear_backend
+from manifiesto_carga import leer_manifiesto, guardar_manifiesto
+from registro_modelos import cargar_artefactos, guardar_artefactos, hash_dataframe, nueva_version
 
 # --- CONFIGURACIÓN ---
 PROJECT_ID = "proyecto-scouting-futbol"
@@ -22,6 +43,36 @@ SOURCE_TABLE = f"{PROJECT_ID}.{DM_DATASET}.stats_jugador_temporada_pro"
 DEST_SIMILITUD = f"{PROJECT_ID}.{DM_DATASET}.scouting_similitud_pro_v2"
 DEST_ARQUETIPOS = f"{PROJECT_ID}.{DM_DATASET}.arquetipos_jugadores"
 DEST_PROYECCIONES = f"{PROJECT_ID}.{DM_DATASET}.proyecciones_valor"
+# Tabla temporal con el parche del modo incremental (se borra después del MERGE)
+STAGING_SIMILITUD = f"{DEST_SIMILITUD}_parche"
+
+BUCKET_NAME = "bucket-scouting-futbol-raw-data"
+# Scaler y huellas por posición de la última corrida de similitud (modo incremental)
+ESTADO_SIMILITUD_URI = f"gs://{BUCKET_NAME}/data/_estado_similitud.json"
+# Registro versionado de los objetos entrenados (ver registro_modelos.py)
+REGISTRO_URI = f"gs://{BUCKET_NAME}/modelos"
+# Aumento relativo máximo de la inercia por jugador antes de reajustar los arquetipos
+UMBRAL_DRIFT_ARQUETIPOS = 0.15
+# k candidatos de arquetipos por posición (se elige por silhouette sobre una muestra).
+# Los clusters con el mismo perfil se numeran en nombrar_arquetipos
+RANGO_K_ARQUETIPOS = range(3, 7)
+MUESTRA_SILHOUETTE = 5000
+# Desde cuántos jugadores por posición se usa MiniBatchKMeans en lugar de KMeans(n_init=20)
+UMBRAL_MINIBATCH = 10_000
+# Deriva máxima del scaler (Δmedia en desvíos o Δdesvío relativo) antes de reentrenarlo
+UMBRAL_DRIFT_SCALER = 0.05
+
+MODELOS = ['similitud', 'valor', 'arquetipos']
+
+# Procesos para las tareas por posición/modelo (--workers)
+MAX_WORKERS_MODELOS = os.cpu_count() or 1
+
+# Índice KNN del modelo de similitud: 'exacto' (ball_tree) | 'ivf' | 'lsh' (ver ann_index.py)
+INDICE_SIMILITUD = 'exacto'
+
+# Regresor del modelo de valor: 'gbr' (200 árboles) | 'hist' (histogramas + early stopping)
+REGRESORES_VALOR = ['gbr', 'hist']
+REGRESOR_VALOR = 'gbr'
 
 # ============================================================================
 # CONFIGURACIÓN FEATURES POR POSICIÓN
@@ -104,107 +155,462 @@ FEATURE_SETS = {
     }
 }
 
+# ============================================================================
+# SNAPSHOT DEL DATAMART
+# Una sola lectura columnar de stats_jugador_temporada_pro alimenta los tres
+# modelos: los subconjuntos por posición, los pares t→t+1 y la temporada
+# actual se derivan en memoria (antes eran hasta 10 consultas).
+# ============================================================================
+
+COLUMNAS_BASE = [
+    'player_id', 'player', 'temporada_anio', 'posicion',
+    'equipo_principal', 'nacionalidad', 'edad_promedio',
+    'valor_mercado', 'total_minutos', 'partidos_jugados', 'rating_promedio',
+]
+
+
+def columnas_snapshot() -> List[str]:
+    """Columnas que necesitan los tres modelos (sin repetir)."""
+    features = [f for config in FEATURE_SETS.values() for f in config['primary']]
+    return list(dict.fromkeys(COLUMNAS_BASE + FEATURES_VALOR + features))
+
+
+class SnapshotDatamart:
+    """
+    Snapshot del datamart ordenado por (posicion, temporada_anio): cada
+    posición es un bloque contiguo y se obtiene con un slice sin copia.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.sort_values(['posicion', 'temporada_anio'], kind='stable', ignore_index=True)
+        self.temporada_actual = self.df['temporada_anio'].max()
+        self._bloques = {
+            posicion: slice(filas[0], filas[-1] + 1)
+            for posicion, filas in self.df.groupby('posicion', sort=False).indices.items()
+        }
+
+    def posicion(self, posicion: str) -> pd.DataFrame:
+        """Filas de una posición (vista sobre el snapshot)."""
+        return self.df.iloc[self._bloques.get(posicion, slice(0, 0))]
+
+
+def cargar_snapshot(backend, ruta: str = None) -> SnapshotDatamart:
+    """Lee el datamart una vez (o un Parquet exportado con --guardar-snapshot)."""
+    if ruta:
+        return SnapshotDatamart(pd.read_parquet(ruta, columns=columnas_snapshot()))
+    query = f"SELECT {', '.join(columnas_snapshot())} FROM `{SOURCE_TABLE}`"
+    return SnapshotDatamart(backend.query_df(query))
+
+
+def filtrar(df: pd.DataFrame, *condiciones) -> pd.DataFrame:
+    """Filas que cumplen todas las condiciones (NULL cuenta como falso, igual que en SQL)."""
+    mascara = np.logical_and.reduce([np.asarray(c.fillna(False), dtype=bool) for c in condiciones])
+    return df[mascara].reset_index(drop=True)
+
+
+def sin_nulos(df: pd.DataFrame, features: List[str]) -> pd.Series:
+    """Condición 'feature IS NOT NULL' para todas las features."""
+    return df[features].notna().all(axis=1)
+
+# ============================================================================
+# EJECUCIÓN EN PARALELO
+# KNN por posición, KMeans por posición y el modelo de valor no dependen
+# entre sí: cada uno es una tarea (función, args) que corre en un pool de
+# procesos. Las tareas no imprimen; devuelven sus líneas de log y se
+# muestran en orden al ensamblar cada modelo.
+# ============================================================================
+
+def _inicializar_worker(hilos: int):
+    """Limita los hilos BLAS/OpenMP de cada proceso para no sobre-suscribir la CPU."""
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(hilos)
+
+
+def _cronometrar(funcion, args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def ejecutar_tareas(tareas: dict, workers: int = MAX_WORKERS_MODELOS) -> dict:
+    """
+    Corre {nombre: (función, args)} en un pool de procesos (en serie si
+    workers <= 1) e imprime el tiempo de cada tarea.
+    
+    Returns:
+        {nombre: resultado}
+    """
+    if not tareas:
+        return {}
+    
+    workers = max(1, min(workers, len(tareas)))
+    inicio = time.perf_counter()
+    if workers == 1:
+        salidas = {nombre: _cronometrar(funcion, args) for nombre, (funcion, args) in tareas.items()}
+    else:
+        hilos = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker, initargs=(hilos,)) as pool:
+            futuros = {nombre: pool.submit(_cronometrar, funcion, args) for nombre, (funcion, args) in tareas.items()}
+            salidas = {nombre: futuro.result() for nombre, futuro in futuros.items()}
+    wall = time.perf_counter() - inicio
+    
+    suma = sum(segundos for _, segundos in salidas.values())
+    print(f"\n⏱️  {len(tareas)} tareas en {workers} proceso(s):")
+    for nombre, (_, segundos) in sorted(salidas.items(), key=lambda item: -item[1][1]):
+        print(f"   {nombre:<26} {segundos:>7.2f}s")
+    print(f"   Wall {wall:.2f}s | suma {suma:.2f}s | {suma / wall if wall else 1:.2f}x")
+    
+    return {nombre: resultado for nombre, (resultado, _) in salidas.items()}
+
 # ============================================================================
 # MODELO 1: SIMILITUD CON ARQUEROS
 # ============================================================================
 
-def calcular_similitudes_por_posicion(client: bigquery.Client) -> pd.DataFrame:
-    """MODELO 1 MEJORADO: Similitud POR POSICIÓN con features específicas"""
+def relaciones_similitud(df_pos: pd.DataFrame, posicion: str,
+                         distances: np.ndarray, indices: np.ndarray, filas=None) -> pd.DataFrame:
+    """
+    Tabla de relaciones (columnas de schema_similitud) armada directamente
+    desde la salida de kneighbors: vecinos 1..5 de cada fila (el 0 es el
+    propio jugador), con decay temporal 0.95^|Δtemporada| y score ajustado.
+    filas: posiciones en df_pos de las consultas (default: todas, en orden).
+    """
+    k = min(6, indices.shape[1])
+    filas = np.arange(len(df_pos)) if filas is None else np.asarray(filas)
+    origen = np.repeat(filas, k - 1)
+    similar = indices[:, 1:k].ravel()
+    dist = distances[:, 1:k].ravel()
+    
+    ids = df_pos['player_id'].to_numpy(dtype=np.int64)
+    temporadas = df_pos['temporada_anio'].to_numpy(dtype=np.int64)
+    nombres = df_pos['player'].to_numpy()
+    
+    decay_factor = 0.95 ** np.abs(temporadas[origen] - temporadas[similar])
+    similarity_adjusted = (1 / (1 + dist)) * 100 * decay_factor
+    
+    return pd.DataFrame({
+        'jugador_origen': nombres[origen],
+        'jugador_origen_id': ids[origen],
+        'temporada_origen': temporadas[origen],
+        'jugador_similar': nombres[similar],
+        'jugador_similar_id': ids[similar],
+        'temporada_similar': temporadas[similar],
+        'posicion': posicion,
+        'rank_similitud': np.tile(np.arange(1, k), len(filas)),
+        'score_similitud': np.round(similarity_adjusted, 2),
+        'distancia_euclidiana': np.round(dist, 4),
+        'decay_temporal': np.round(decay_factor, 3),
+        'valor_mercado_similar': df_pos['valor_mercado'].to_numpy(dtype=np.float64, na_value=np.nan)[similar],
+        'edad_similar': df_pos['edad_promedio'].to_numpy(dtype=np.float64, na_value=np.nan)[similar],
+        'equipo_similar': df_pos['equipo_principal'].to_numpy()[similar],
+    })
+
+
+def subconjunto_similitud(snapshot: SnapshotDatamart, posicion: str, config: dict) -> pd.DataFrame:
+    """Jugadores de la posición que entran al modelo de similitud."""
+    df_pos = snapshot.posicion(posicion)
+    return filtrar(
+        df_pos,
+        df_pos['total_minutos'] > 400,
+        df_pos['rating_promedio'] > 6.0,
+        sin_nulos(df_pos, config['primary']),
+    )
+
+
+def features_ponderadas(df_pos: pd.DataFrame, config: dict) -> np.ndarray:
+    """Features de la posición multiplicadas por su peso (antes de normalizar)."""
+    pesos = np.array([config['weights'].get(f, 1.0) for f in config['primary']])
+    return df_pos[config['primary']].astype(float).fillna(0).to_numpy() * pesos
+
+
+def buscar_vecinos(X_scaled: np.ndarray, indice: str, consultas=None):
+    """
+    Ajusta el índice sobre X_scaled y busca los vecinos de las consultas
+    (default: todas las filas). Devuelve además el índice ajustado y la
+    línea de log con los tiempos y, si el índice es aproximado, el recall@5.
+    """
+    n_neighbors = min(11, len(X_scaled))
+    consultas = X_scaled if consultas is None else consultas
+    
+    inicio = time.perf_counter()
+    knn = crear_indice(indice).fit(X_scaled)
+    build_s = time.perf_counter() - inicio
+    
+    inicio = time.perf_counter()
+    distances, indices = knn.kneighbors(consultas, n_neighbors)
+    query_s = time.perf_counter() - inicio
+    
+    linea = f"   ⏱️  Índice {indice}: build {build_s:.2f}s | query {query_s:.2f}s ({len(consultas):,} consultas)"
+    if indice != 'exacto' and len(consultas) == len(X_scaled):
+        linea += f" | recall@5 {recall_muestra(X_scaled, indices):.3f} (muestra)"
+    return distances, indices, knn, linea
+
+
+def claves_jugador(df: pd.DataFrame, id_col='player_id', temporada_col='temporada_anio') -> np.ndarray:
+    """Clave 'player_id|temporada' de cada fila."""
+    return (df[id_col].astype('int64').astype(str) + '|' + df[temporada_col].astype('int64').astype(str)).to_numpy()
+
+
+def huellas_filas(df_pos: pd.DataFrame, W: np.ndarray) -> np.ndarray:
+    """
+    Huella de cada fila: features ponderadas + columnas que se copian a la
+    relación (nombre, valor, edad, equipo). Si cambia, la fila se recalcula.
+    """
+    datos = pd.DataFrame(W).assign(
+        player=df_pos['player'].to_numpy(),
+        valor_mercado=df_pos['valor_mercado'].to_numpy(dtype=np.float64, na_value=np.nan),
+        edad_promedio=df_pos['edad_promedio'].to_numpy(dtype=np.float64, na_value=np.nan),
+        equipo_principal=df_pos['equipo_principal'].to_numpy(),
+    )
+    return pd.util.hash_pandas_object(datos, index=False).astype(str).to_numpy()
+
+
+def estado_posicion(config: dict, scaler: StandardScaler, claves, huellas) -> dict:
+    """Lo que el modo incremental necesita recordar de una posición."""
+    return {
+        'features': list(config['primary']),
+        'media': scaler.mean_.tolist(),
+        'escala': scaler.scale_.tolist(),
+        'huellas': dict(zip(claves, huellas)),
+    }
+
+
+def drift_scaler(estado_pos: dict, scaler: StandardScaler) -> float:
+    """Deriva del scaler reentrenado respecto al guardado (en desvíos del guardado)."""
+    media, escala = np.array(estado_pos['media']), np.array(estado_pos['escala'])
+    return float(max(
+        np.max(np.abs(scaler.mean_ - media) / escala),
+        np.max(np.abs(scaler.scale_ / escala - 1)),
+    ))
+
+
+def artefactos_similitud(config: dict, scaler: StandardScaler, knn, claves, distances) -> dict:
+    """Objetos de una posición para el registro: scaler, índice y la clave de cada fila."""
+    return {
+        'scaler': scaler,
+        'indice': knn,
+        'claves': claves,
+        'features': list(config['primary']),
+        'pesos': [config['weights'].get(f, 1.0) for f in config['primary']],
+        'distancia_media_top5': float(distances[:, 1:6].mean()) if distances.shape[1] > 1 else None,
+    }
+
+
+def tarea_similitud(posicion: str, df_pos: pd.DataFrame, indice: str) -> dict:
+    """Tarea (un proceso): KNN completo de una posición con scaler nuevo."""
+    config = FEATURE_SETS[posicion]
+    log = [f"\n📍 Procesando: {posicion}"]
+    
+    if len(df_pos) < 10:
+        log.append(f"   ⚠️ Pocos datos ({len(df_pos)}), saltando...")
+        return {'log': log, 'relaciones': None, 'estado': None, 'artefactos': None}
+    
+    log.append(f"   ✓ {len(df_pos)} jugadores cargados")
+    
+    # Aplicar pesos específicos y normalizar
+    W = features_ponderadas(df_pos, config)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(W)
+    
+    # KNN
+    distances, indices, knn, linea = buscar_vecinos(X_scaled, indice)
+    log.append(linea)
+    
+    # Generar relaciones
+    relaciones = relaciones_similitud(df_pos, posicion, distances, indices)
+    log.append(f"   ✓ {len(relaciones)} relaciones generadas")
+    
+    claves = claves_jugador(df_pos)
+    return {
+        'log': log,
+        'relaciones': relaciones,
+        'estado': estado_posicion(config, scaler, claves, huellas_filas(df_pos, W)),
+        'artefactos': artefactos_similitud(config, scaler, knn, claves, distances),
+    }
+
+
+def tareas_similitud(snapshot: SnapshotDatamart, indice: str) -> dict:
+    """Una tarea por posición (incluyendo arqueros)."""
+    return {
+        f"similitud/{posicion}": (tarea_similitud, (posicion, subconjunto_similitud(snapshot, posicion, config), indice))
+        for posicion, config in FEATURE_SETS.items()
+    }
+
+
+def ensamblar_similitudes(resultados: dict, estado: dict = None) -> pd.DataFrame:
+    """Junta las relaciones de las tareas de similitud (y el estado por posición)."""
     print("\n" + "="*70)
     print("🧠 MODELO 1: SIMILITUD POR POSICIÓN (KNN ADAPTATIVO + ARQUEROS)")
     print("="*70)
     
     all_results = []
+    for posicion in FEATURE_SETS:
+        resultado = resultados[f"similitud/{posicion}"]
+        print("\n".join(resultado['log']))
+        if resultado['relaciones'] is not None:
+            all_results.append(resultado['relaciones'])
+            if estado is not None:
+                estado[posicion] = resultado['estado']
     
-    # ITERAR POR CADA POSICIÓN (incluyendo arqueros)
-    for posicion, config in FEATURE_SETS.items():
-        print(f"\n📍 Procesando: {posicion}")
-        
-        # Query específica por posición
-        features_str = ", ".join(config['primary'])
-        
-        # WHERE dinámico para features no nulos
-        where_conditions = [f"{feat} IS NOT NULL" for feat in config['primary']]
-        where_clause = " AND ".join(where_conditions)
-        
-        query = f"""
-            SELECT 
-                player_id, player, temporada_anio, posicion,
-                equipo_principal, nacionalidad, edad_promedio, 
-                valor_mercado, total_minutos, partidos_jugados,
-                {features_str}
-            FROM `{SOURCE_TABLE}`
-            WHERE posicion = '{posicion}'
-              AND total_minutos > 400
-              AND rating_promedio > 6.0
-              AND {where_clause}
-        """
-        
-        df_pos = client.query(query).to_dataframe()
-        
-        if len(df_pos) < 10:
-            print(f"   ⚠️ Pocos datos ({len(df_pos)}), saltando...")
-            continue
-        
-        print(f"   ✓ {len(df_pos)} jugadores cargados")
-        
-        # Aplicar pesos específicos
-        df_weighted = df_pos.copy()
-        for feature in config['primary']:
-            weight = config['weights'].get(feature, 1.0)
-            df_weighted[feature] = df_weighted[feature].astype(float) * weight
-        
-        # Normalizar
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(df_weighted[config['primary']].fillna(0))
-        
-        # KNN
-        n_neighbors = min(11, len(df_pos))
-        knn = NearestNeighbors(n_neighbors=n_neighbors, algorithm='ball_tree')
-        knn.fit(X_scaled)
+    df_similitudes = pd.concat(all_results, ignore_index=True) if all_results else pd.DataFrame()
+    
+    print(f"\n✅ TOTAL: {len(df_similitudes):,} relaciones de similitud")
+    conteos = {r['posicion'].iat[0]: len(r) for r in all_results}
+    for posicion in FEATURE_SETS.keys():
+        print(f"   {posicion}: {conteos.get(posicion, 0):,}")
+    
+    return df_similitudes
+
+
+def calcular_similitudes_por_posicion(snapshot: SnapshotDatamart, indice: str = INDICE_SIMILITUD,
+                                      estado: dict = None, workers: int = 1) -> pd.DataFrame:
+    """
+    MODELO 1 MEJORADO: Similitud POR POSICIÓN con features específicas.
+    indice: 'exacto' o un índice aproximado ('ivf' | 'lsh') para muchas ligas.
+    estado: si se pasa, se completa con el scaler y las huellas por posición.
+    workers: procesos para repartir las posiciones.
+    """
+    return ensamblar_similitudes(ejecutar_tareas(tareas_similitud(snapshot, indice), workers), estado)
+
+
+def tarea_similitud_incremental(posicion: str, df_pos: pd.DataFrame, previas: pd.DataFrame,
+                                estado_pos: dict, indice: str) -> dict:
+    """
+    Tarea (un proceso): modo incremental de una posición.
+      - reentrena el scaler solo si la deriva supera UMBRAL_DRIFT_SCALER
+        (en ese caso recalcula la posición completa);
+      - busca vecinos solo para las filas nuevas o con huella distinta;
+      - re-parchea las filas cuyo top-5 incluye un jugador cambiado o
+        eliminado, o cuyo 5º vecino está más lejos que algún jugador cambiado.
+    previas: relaciones vigentes de la posición.
+    """
+    config = FEATURE_SETS[posicion]
+    log = [f"\n📍 Procesando: {posicion}"]
+    claves = claves_jugador(df_pos)
+    
+    # Orígenes que ya no entran al modelo: se borran sus relaciones
+    origenes_previos = np.unique(claves_jugador(previas, 'jugador_origen_id', 'temporada_origen'))
+    eliminadas = np.setdiff1d(origenes_previos, claves)
+    
+    if len(df_pos) < 10:
+        log.append(f"   ⚠️ Pocos datos ({len(df_pos)}), saltando...")
+        return {'log': log, 'relaciones': None, 'reemplazar': eliminadas, 'estado': None, 'artefactos': None}
+    
+    W = features_ponderadas(df_pos, config)
+    huellas = huellas_filas(df_pos, W)
+    scaler = StandardScaler().fit(W)
+    
+    if estado_pos is None or estado_pos['features'] != list(config['primary']):
+        motivo = "sin estado previo"
+    elif (drift := drift_scaler(estado_pos, scaler)) > UMBRAL_DRIFT_SCALER:
+        motivo = f"deriva del scaler {drift:.3f} > {UMBRAL_DRIFT_SCALER}"
+    else:
+        motivo = None
+    
+    if motivo:
+        # Recalculo completo de la posición con el scaler nuevo
+        log.append(f"   🔄 Recalculo completo ({motivo})")
+        X_scaled = scaler.transform(W)
+        filas = np.arange(len(df_pos))
+    else:
+        # Se conserva el scaler guardado: las distancias vigentes siguen siendo comparables
+        log.append(f"   ✓ Scaler vigente (deriva {drift:.3f})")
+        scaler.mean_, scaler.scale_ = np.array(estado_pos['media']), np.array(estado_pos['escala'])
+        X_scaled = scaler.transform(W)
         
-        distances, indices = knn.kneighbors(X_scaled)
+        anteriores = estado_pos['huellas']
+        cambiadas = np.array([anteriores.get(c) != h for c, h in zip(claves, huellas)], dtype=bool)
+        tocadas = set(claves[cambiadas]) | set(eliminadas)
         
-        # Generar relaciones
-        for i in range(len(df_pos)):
-            source_row = df_pos.iloc[i]
-            
-            for j in range(1, min(6, n_neighbors)):
-                neighbor_idx = indices[i][j]
-                neighbor_row = df_pos.iloc[neighbor_idx]
-                
-                dist = distances[i][j]
-                tiempo_diff = abs(source_row['temporada_anio'] - neighbor_row['temporada_anio'])
-                decay_factor = 0.95 ** tiempo_diff
-                similarity_adjusted = (1 / (1 + dist)) * 100 * decay_factor
-                
-                all_results.append({
-                    'jugador_origen': source_row['player'],
-                    'jugador_origen_id': str(source_row['player_id']),
-                    'temporada_origen': int(source_row['temporada_anio']),
-                    'jugador_similar': neighbor_row['player'],
-                    'jugador_similar_id': str(neighbor_row['player_id']),
-                    'temporada_similar': int(neighbor_row['temporada_anio']),
-                    'posicion': posicion,
-                    'rank_similitud': j,
-                    'score_similitud': round(similarity_adjusted, 2),
-                    'distancia_euclidiana': round(dist, 4),
-                    'decay_temporal': round(decay_factor, 3),
-                    'valor_mercado_similar': neighbor_row['valor_mercado'],
-                    'edad_similar': neighbor_row['edad_promedio'],
-                    'equipo_similar': neighbor_row['equipo_principal']
-                })
+        # Top-5 vigente de cada fila: ¿referencia a un jugador tocado? ¿qué tan lejos está el 5º?
+        previas = previas.assign(
+            _origen=claves_jugador(previas, 'jugador_origen_id', 'temporada_origen'),
+            _similar=claves_jugador(previas, 'jugador_similar_id', 'temporada_similar'),
+        )
+        previas = previas.assign(_tocada=previas['_similar'].isin(tocadas))
+        por_origen = previas.groupby('_origen').agg(
+            radio=('distancia_euclidiana', 'max'), tocada=('_tocada', 'any')
+        ).reindex(claves)
         
-        print(f"   ✓ {len([r for r in all_results if r['posicion'] == posicion])} relaciones generadas")
+        afectadas = np.array(por_origen['tocada'].fillna(True), dtype=bool)
+        if cambiadas.any() and (~cambiadas).any():
+            # Un jugador cambiado entra al top-5 si queda más cerca que el 5º vecino
+            # (la distancia guardada está redondeada a 4 decimales)
+            d_cambiada, _ = crear_indice('exacto').fit(X_scaled[cambiadas]).kneighbors(X_scaled[~cambiadas], 1)
+            radio = por_origen['radio'].to_numpy(dtype=np.float64, na_value=np.inf)[~cambiadas]
+            afectadas[~cambiadas] |= d_cambiada[:, 0] <= radio + 1e-4
+        filas = np.flatnonzero(cambiadas | afectadas)
+        log.append(f"   ✓ {cambiadas.sum():,} filas nuevas/cambiadas, {len(eliminadas):,} eliminadas "
+                   f"→ {len(filas):,} de {len(df_pos):,} a recalcular")
     
-    df_similitudes = pd.DataFrame(all_results)
+    estado_nuevo = estado_posicion(config, scaler, claves, huellas)
+    if len(filas) == 0:
+        # Sin índice nuevo: el registro conserva los artefactos de la versión anterior
+        return {'log': log, 'relaciones': None, 'reemplazar': eliminadas, 'estado': estado_nuevo, 'artefactos': None}
     
-    print(f"\n✅ TOTAL: {len(df_similitudes):,} relaciones de similitud")
-    for posicion in FEATURE_SETS.keys():
-        count = len(df_similitudes[df_similitudes['posicion'] == posicion])
-        print(f"   {posicion}: {count:,}")
+    distances, indices, knn, linea = buscar_vecinos(X_scaled, indice, X_scaled[filas])
+    log.append(linea)
+    return {
+        'log': log,
+        'relaciones': relaciones_similitud(df_pos, posicion, distances, indices, filas),
+        'reemplazar': np.concatenate([eliminadas, claves[filas]]),
+        'estado': estado_nuevo,
+        'artefactos': artefactos_similitud(config, scaler, knn, claves, distances),
+    }
+
+
+def tareas_similitud_incremental(snapshot: SnapshotDatamart, actuales: pd.DataFrame,
+                                 estado: dict, indice: str) -> dict:
+    """Una tarea incremental por posición con sus relaciones vigentes y su estado."""
+    return {
+        f"similitud/{posicion}": (tarea_similitud_incremental, (
+            posicion,
+            subconjunto_similitud(snapshot, posicion, config),
+            actuales[actuales['posicion'] == posicion],
+            estado.get(posicion),
+            indice,
+        ))
+        for posicion, config in FEATURE_SETS.items()
+    }
+
+
+def ensamblar_similitudes_incremental(resultados: dict, estado: dict) -> tuple:
+    """
+    Junta los parches por posición y actualiza estado en el lugar.
     
-    return df_similitudes
+    Returns:
+        (relaciones nuevas, claves 'id|temporada' de los orígenes a reemplazar)
+    """
+    print("\n" + "="*70)
+    print("🧠 MODELO 1: SIMILITUD POR POSICIÓN - INCREMENTAL")
+    print("="*70)
+    
+    parches, reemplazar = [], []
+    for posicion in FEATURE_SETS:
+        resultado = resultados[f"similitud/{posicion}"]
+        print("\n".join(resultado['log']))
+        reemplazar.append(resultado['reemplazar'])
+        if resultado['estado'] is None:
+            estado.pop(posicion, None)
+        else:
+            estado[posicion] = resultado['estado']
+        if resultado['relaciones'] is not None:
+            parches.append(resultado['relaciones'])
+    
+    df_parche = pd.concat(parches, ignore_index=True) if parches else pd.DataFrame()
+    claves_reemplazo = np.unique(np.concatenate(reemplazar)) if reemplazar else np.array([], dtype=str)
+    print(f"\n✅ Parche: {len(df_parche):,} relaciones para {len(claves_reemplazo):,} jugadores-temporada")
+    return df_parche, claves_reemplazo
+
+
+def calcular_similitudes_incremental(snapshot: SnapshotDatamart, actuales: pd.DataFrame,
+                                     estado: dict, indice: str = INDICE_SIMILITUD, workers: int = 1) -> tuple:
+    """
+    Modo incremental del MODELO 1 (ver tarea_similitud_incremental).
+    actuales: relaciones vigentes (scouting_similitud_pro_v2).
+    estado: scaler y huellas de la corrida anterior (se actualiza en el lugar).
+    """
+    tareas = tareas_similitud_incremental(snapshot, actuales, estado, indice)
+    return ensamblar_similitudes_incremental(ejecutar_tareas(tareas, workers), estado)
 
 # ============================================================================
 # MODELO 2: PROYECCIÓN DE VALOR
@@ -218,45 +624,66 @@ FEATURES_VALOR = [
     'pct_tackles', 'pct_interceptions', 'pct_aerial'
 ]
 
-def entrenar_modelo_valor(client: bigquery.Client) -> tuple:
-    """MODELO 2: Proyección de Valor de Mercado"""
-    print("\n" + "="*70)
-    print("💰 MODELO 2: PROYECCIÓN DE VALOR DE MERCADO")
-    print("="*70)
+def pares_temporada(snapshot: SnapshotDatamart) -> pd.DataFrame:
+    """
+    Pares (t, t+1) del mismo jugador con valor de mercado en ambas temporadas
+    y delta_valor_pct como target (self-join en memoria).
+    """
+    df = snapshot.df
+    con_valor = filtrar(
+        df,
+        df['valor_mercado'].notna(),
+        df['valor_mercado'] > 0,
+        df['total_minutos'] >= 500,
+    )
+    t1 = filtrar(con_valor, con_valor['edad_promedio'] <= 30, con_valor['valor_mercado'] >= 500000)
+    t1 = t1.rename(columns={'temporada_anio': 'temp_t1', 'valor_mercado': 'valor_t1'})
+    t1['temp_t2'] = t1['temp_t1'] + 1
     
-    # Query con features adicionales
-    query = f"""
-        WITH ValoresPorTemporada AS (
-            SELECT
-                player_id, temporada_anio, player, posicion,
-                edad_promedio, valor_mercado, rating_promedio,
-                total_minutos, partidos_jugados, pct_rating,
-                pct_tackles, pct_interceptions, pct_aerial
-            FROM `{SOURCE_TABLE}`
-            WHERE valor_mercado IS NOT NULL
-              AND valor_mercado > 0
-              AND total_minutos >= 500
+    t2 = con_valor[['player_id', 'temporada_anio', 'valor_mercado']].rename(
+        columns={'temporada_anio': 'temp_t2', 'valor_mercado': 'valor_t2'}
+    )
+    pares = t1.merge(t2, on=['player_id', 'temp_t2'], how='inner')
+    pares['delta_valor_pct'] = ((pares['valor_t2'] - pares['valor_t1']) / pares['valor_t1']) * 100
+    return pares
+
+
+def actuales_valor(snapshot: SnapshotDatamart) -> pd.DataFrame:
+    """Jugadores de la temporada actual a proyectar."""
+    df = snapshot.df
+    return filtrar(
+        df,
+        df['temporada_anio'] == snapshot.temporada_actual,
+        df['edad_promedio'] <= 30,
+        df['total_minutos'] >= 900,
+        df['valor_mercado'].notna(),
+    )
+
+
+def crear_regresor_valor(tipo: str = REGRESOR_VALOR):
+    """
+    gbr: GradientBoosting con 200 árboles completos (costo lineal en filas).
+    hist: HistGradientBoosting; discretiza los features en 255 bins y corta
+    cuando el R² de un 10% de validación del train no mejora en 20 iteraciones.
+    """
+    if tipo == 'gbr':
+        return GradientBoostingRegressor(n_estimators=200, learning_rate=0.05, max_depth=5, random_state=42)
+    if tipo == 'hist':
+        return HistGradientBoostingRegressor(
+            max_iter=500, learning_rate=0.05, max_depth=5,
+            early_stopping=True, validation_fraction=0.1, n_iter_no_change=20, scoring='r2',
+            random_state=42,
         )
-        SELECT
-            t1.player_id, t1.player, t1.posicion,
-            t1.temporada_anio as temp_t1,
-            t2.temporada_anio as temp_t2,
-            t1.edad_promedio, t1.valor_mercado as valor_t1,
-            t1.rating_promedio, t1.total_minutos, t1.partidos_jugados,
-            t1.pct_rating, t1.pct_tackles, t1.pct_interceptions, t1.pct_aerial,
-            t2.valor_mercado as valor_t2,
-            ((t2.valor_mercado - t1.valor_mercado) / t1.valor_mercado) * 100 as delta_valor_pct
-        FROM ValoresPorTemporada t1
-        INNER JOIN ValoresPorTemporada t2
-            ON t1.player_id = t2.player_id
-            AND t2.temporada_anio = t1.temporada_anio + 1
-        WHERE t1.edad_promedio <= 30
-          AND t1.valor_mercado >= 500000
-    """
-    
-    df = client.query(query).to_dataframe()
-    print(f"✓ {len(df)} casos de evolución encontrados")
+    raise ValueError(f"Regresor desconocido: {tipo!r} (usar {', '.join(REGRESORES_VALOR)})")
+
+
+def entrenar_regresor_valor(df: pd.DataFrame, tipo: str = REGRESOR_VALOR) -> dict:
+    """
+    Split 80/20 fijo, scaler y ajuste del regresor sobre los pares t→t+1.
     
+    Returns:
+        dict con modelo, scaler, filas y métricas (R², MAE, segundos, iteraciones)
+    """
     # Entrenar modelo (con fillna para features opcionales)
     X = df[FEATURES_VALOR].fillna(0)
     y = df['delta_valor_pct']
@@ -267,40 +694,48 @@ def entrenar_modelo_valor(client: bigquery.Client) -> tuple:
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
-    model = GradientBoostingRegressor(n_estimators=200, learning_rate=0.05, max_depth=5, random_state=42)
+    model = crear_regresor_valor(tipo)
+    inicio = time.perf_counter()
     model.fit(X_train_scaled, y_train)
+    segundos = time.perf_counter() - inicio
     
-    train_score = model.score(X_train_scaled, y_train)
-    test_score = model.score(X_test_scaled, y_test)
+    return {
+        'modelo': model,
+        'scaler': scaler,
+        'filas': {'train': len(X_train), 'test': len(X_test)},
+        'metricas': {
+            'r2_train': float(model.score(X_train_scaled, y_train)),
+            'r2_test': float(model.score(X_test_scaled, y_test)),
+            'mae_test': float(mean_absolute_error(y_test, model.predict(X_test_scaled))),
+            'segundos_fit': segundos,
+            'iteraciones': int(getattr(model, 'n_iter_', None) or model.n_estimators_),
+        },
+    }
+
+
+def tarea_valor(df: pd.DataFrame, df_actual: pd.DataFrame, tipo: str = REGRESOR_VALOR) -> dict:
+    """Tarea (un proceso): entrena con los pares t→t+1 y proyecta la temporada actual."""
+    log = [f"✓ {len(df)} casos de evolución encontrados"]
     
-    print(f"✓ Modelo entrenado | R² Train: {train_score:.3f} | R² Test: {test_score:.3f}")
+    entrenado = entrenar_regresor_valor(df, tipo)
+    model, scaler, metricas = entrenado['modelo'], entrenado['scaler'], entrenado['metricas']
     
-    # Feature importance
-    feature_importance = pd.DataFrame({
-        'feature': FEATURES_VALOR,
-        'importance': model.feature_importances_
-    }).sort_values('importance', ascending=False)
+    log.append(f"✓ Modelo {tipo} entrenado en {metricas['segundos_fit']:.2f}s ({metricas['iteraciones']} iteraciones) "
+               f"| R² Train: {metricas['r2_train']:.3f} | R² Test: {metricas['r2_test']:.3f}")
     
-    print(f"\n📊 Top 5 Features más importantes:")
-    for idx, row in feature_importance.head(5).iterrows():
-        print(f"   {row['feature']}: {row['importance']:.3f}")
+    # Feature importance (HistGradientBoosting no la expone)
+    if hasattr(model, 'feature_importances_'):
+        feature_importance = pd.DataFrame({
+            'feature': FEATURES_VALOR,
+            'importance': model.feature_importances_
+        }).sort_values('importance', ascending=False)
+        
+        log.append(f"\n📊 Top 5 Features más importantes:")
+        for idx, row in feature_importance.head(5).iterrows():
+            log.append(f"   {row['feature']}: {row['importance']:.3f}")
     
     # Proyecciones actuales
-    query_actual = f"""
-        SELECT
-            player_id, player, posicion, temporada_anio,
-            equipo_principal, edad_promedio, valor_mercado,
-            rating_promedio, total_minutos, partidos_jugados, pct_rating,
-            pct_tackles, pct_interceptions, pct_aerial
-        FROM `{SOURCE_TABLE}`
-        WHERE temporada_anio = (SELECT MAX(temporada_anio) FROM `{SOURCE_TABLE}`)
-          AND edad_promedio <= 30
-          AND total_minutos >= 900
-          AND valor_mercado IS NOT NULL
-    """
-    
-    df_actual = client.query(query_actual).to_dataframe()
-    
+    df_actual = df_actual.copy()
     X_actual = df_actual[FEATURES_VALOR].fillna(0)
     X_actual_scaled = scaler.transform(X_actual)
     
@@ -313,158 +748,597 @@ def entrenar_modelo_valor(client: bigquery.Client) -> tuple:
         'valor_mercado', 'valor_proyectado_1y', 'delta_proyectado_pct'
     ]].copy()
     
-    df_proyecciones['player_id'] = df_proyecciones['player_id'].astype(str)
+    df_proyecciones['player_id'] = df_proyecciones['player_id'].astype('int64')
     
-    print(f"✓ {len(df_proyecciones)} proyecciones generadas (incluyendo arqueros)")
+    log.append(f"✓ {len(df_proyecciones)} proyecciones generadas (incluyendo arqueros)")
     
-    return df_proyecciones, model, scaler
+    return {
+        'log': log,
+        'proyecciones': df_proyecciones,
+        'modelo': model,
+        'scaler': scaler,
+        'regresor': tipo,
+        'filas': entrenado['filas'],
+        'metricas': metricas,
+    }
+
+
+def tareas_valor(snapshot: SnapshotDatamart, tipo: str = REGRESOR_VALOR) -> dict:
+    return {'valor': (tarea_valor, (pares_temporada(snapshot), actuales_valor(snapshot), tipo))}
+
+
+def ensamblar_valor(resultados: dict) -> tuple:
+    print("\n" + "="*70)
+    print("💰 MODELO 2: PROYECCIÓN DE VALOR DE MERCADO")
+    print("="*70)
+    resultado = resultados['valor']
+    print("\n".join(resultado['log']))
+    return resultado['proyecciones'], resultado['modelo'], resultado['scaler']
+
+
+def entrenar_modelo_valor(snapshot: SnapshotDatamart, tipo: str = REGRESOR_VALOR) -> tuple:
+    """MODELO 2: Proyección de Valor de Mercado"""
+    return ensamblar_valor(ejecutar_tareas(tareas_valor(snapshot, tipo), workers=1))
+
+
+def comparar_regresores_valor(snapshot: SnapshotDatamart, tipos=REGRESORES_VALOR, repeticiones: int = 3) -> pd.DataFrame:
+    """
+    Reporte gbr vs hist sobre el mismo split: tiempo de entrenamiento
+    (mediana de repeticiones, en serie para no competir por CPU), R² y MAE.
+    """
+    pares = pares_temporada(snapshot)
+    print("\n" + "="*70)
+    print(f"⚖️  COMPARACIÓN DE REGRESORES DE VALOR ({len(pares):,} pares t→t+1)")
+    print("="*70)
+    
+    filas = []
+    for tipo in tipos:
+        corridas = [entrenar_regresor_valor(pares, tipo)['metricas'] for _ in range(repeticiones)]
+        filas.append({
+            'regresor': tipo,
+            **corridas[0],
+            'segundos_fit': float(np.median([c['segundos_fit'] for c in corridas])),
+        })
+    reporte = pd.DataFrame(filas).set_index('regresor')
+    
+    print(f"\n{'regresor':<10}{'iter':>6}{'fit (s)':>10}{'R² train':>10}{'R² test':>10}{'MAE test':>10}")
+    for tipo, fila in reporte.iterrows():
+        print(f"{tipo:<10}{fila['iteraciones']:>6.0f}{fila['segundos_fit']:>10.3f}"
+              f"{fila['r2_train']:>10.3f}{fila['r2_test']:>10.3f}{fila['mae_test']:>10.2f}")
+    
+    if {'gbr', 'hist'} <= set(reporte.index):
+        gbr, hist = reporte.loc['gbr'], reporte.loc['hist']
+        print(f"\n⏱️  hist vs gbr: {gbr['segundos_fit'] / hist['segundos_fit']:.1f}x más rápido | "
+              f"ΔR² test {hist['r2_test'] - gbr['r2_test']:+.3f} | ΔMAE {hist['mae_test'] - gbr['mae_test']:+.2f}")
+    return reporte
 
 # ============================================================================
-# MODELO 3: CLUSTERING POR POSICIÓN
-# ✅ SIN CAMBIOS (ya usa las features correctas)
+# BACKTEST POR TEMPORADA DEL MODELO DE VALOR
+# Para cada temporada t: entrena con los pares cuyo valor t+1 ya se conocía
+# en t (temp_t2 <= t) y proyecta los jugadores de t (temp_t2 = t+1). La
+# matriz de features se arma una sola vez y cada fold la abre con mmap.
 # ============================================================================
 
-def generar_arquetipos_por_posicion(client: bigquery.Client) -> pd.DataFrame:
-    """MODELO 3: Clustering de Arquetipos POR POSICIÓN"""
+def matriz_backtest(pares: pd.DataFrame, ruta: str) -> List[int]:
+    """
+    Cachea en ruta (joblib sin comprimir, apto para mmap) la matriz de
+    features, el target, temporadas y posición de los pares t→t+1.
+    
+    Returns:
+        Temporadas t con pares para entrenar y para evaluar.
+    """
+    joblib.dump({
+        'X': pares[FEATURES_VALOR].fillna(0).to_numpy(dtype=np.float64),
+        'y': pares['delta_valor_pct'].to_numpy(dtype=np.float64),
+        'temp_t1': pares['temp_t1'].to_numpy(dtype=np.int64),
+        'temp_t2': pares['temp_t2'].to_numpy(dtype=np.int64),
+        'posicion': pares['posicion'].to_numpy(dtype=object),
+    }, ruta)
+    temporadas = np.unique(pares['temp_t1'])
+    return [int(t) for t in temporadas if (pares['temp_t2'] <= t).any()]
+
+
+def tarea_backtest(ruta: str, temporada: int, tipo: str) -> pd.DataFrame:
+    """Tarea (un proceso): fold de la temporada; devuelve real vs proyectado por par."""
+    m = joblib.load(ruta, mmap_mode='r')
+    train = m['temp_t2'] <= temporada
+    test = m['temp_t1'] == temporada
+    
+    scaler = StandardScaler()
+    model = crear_regresor_valor(tipo)
+    model.fit(scaler.fit_transform(m['X'][train]), m['y'][train])
+    
+    return pd.DataFrame({
+        'temporada': temporada + 1,
+        'posicion': m['posicion'][test],
+        'filas_train': int(train.sum()),
+        'real': m['y'][test],
+        'proyectado': model.predict(scaler.transform(m['X'][test])),
+    })
+
+
+def metricas_backtest(df: pd.DataFrame) -> pd.Series:
+    return pd.Series({
+        'pares': len(df),
+        'filas_train': df['filas_train'].iat[0],
+        'mae': mean_absolute_error(df['real'], df['proyectado']),
+        # R² no está definido con menos de 2 pares
+        'r2': r2_score(df['real'], df['proyectado']) if len(df) > 1 else np.nan,
+    })
+
+
+def backtest_valor(snapshot: SnapshotDatamart, tipo: str = REGRESOR_VALOR,
+                   workers: int = MAX_WORKERS_MODELOS) -> pd.DataFrame:
+    """
+    Backtest walk-forward del MODELO 2 con los folds en paralelo.
+    
+    Returns:
+        MAE y R² por temporada evaluada (t+1) y posición ('Todas' = el fold completo)
+    """
+    pares = pares_temporada(snapshot)
     print("\n" + "="*70)
-    print("🎨 MODELO 3: CLUSTERING DE ARQUETIPOS POR POSICIÓN")
+    print(f"🔁 BACKTEST POR TEMPORADA - REGRESOR {tipo} ({len(pares):,} pares t→t+1)")
     print("="*70)
     
-    all_arquetipos = []
-    cluster_global_id = 0
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'matriz_backtest.joblib')
+        temporadas = matriz_backtest(pares, ruta)
+        if not temporadas:
+            print("⚠️  Se necesitan al menos tres temporadas consecutivas para un fold")
+            return pd.DataFrame()
+        tareas = {f"backtest/{t}→{t + 1}": (tarea_backtest, (ruta, t, tipo)) for t in temporadas}
+        predicciones = pd.concat(ejecutar_tareas(tareas, workers).values(), ignore_index=True)
+    
+    reporte = pd.concat([
+        predicciones.groupby(['temporada', 'posicion']).apply(metricas_backtest),
+        predicciones.assign(posicion='Todas').groupby(['temporada', 'posicion']).apply(metricas_backtest),
+    ]).sort_index().astype({'pares': int, 'filas_train': int})
+    
+    print(f"\n{'temporada':<11}{'posicion':<15}{'pares':>7}{'train':>7}{'MAE':>10}{'R²':>8}")
+    for (temporada, posicion), fila in reporte.iterrows():
+        print(f"{temporada:<11}{posicion:<15}{fila['pares']:>7.0f}{fila['filas_train']:>7.0f}"
+              f"{fila['mae']:>10.2f}{fila['r2']:>8.3f}")
     
-    for posicion, config in FEATURE_SETS.items():
-        print(f"\n📍 Clustering para: {posicion}")
+    total = metricas_backtest(predicciones.assign(filas_train=len(predicciones)))
+    print(f"\n✅ {len(temporadas)} folds | MAE global {total['mae']:.2f} | R² global {total['r2']:.3f}")
+    return reporte
+
+# ============================================================================
+# MODELO 3: CLUSTERING POR POSICIÓN
+# El KMeans (k elegido por silhouette, MiniBatch en cohortes grandes) se
+# ajusta con los titulares de la temporada actual y sus centroides
+# (registro de modelos) asignan arquetipo a todas las temporadas con
+# predict. Solo se reajusta si la inercia por jugador de la temporada
+# actual se degrada más de UMBRAL_DRIFT_ARQUETIPOS.
+# ============================================================================
+
+def subconjunto_arquetipos(snapshot: SnapshotDatamart, posicion: str, config: dict,
+                           todas_las_temporadas: bool = False) -> pd.DataFrame:
+    """Titulares de la posición con features no nulos (default: solo la temporada actual)."""
+    df_pos = snapshot.posicion(posicion)
+    condiciones = [
+        df_pos['total_minutos'] >= 900,
+        df_pos['rating_promedio'] >= 6.5,
+        sin_nulos(df_pos, config['primary']),
+    ]
+    if not todas_las_temporadas:
+        condiciones.append(df_pos['temporada_anio'] == snapshot.temporada_actual)
+    return filtrar(df_pos, *condiciones)
+
+
+def nombrar_arquetipos(posicion: str, df_pos: pd.DataFrame, config: dict) -> dict:
+    """Nombre de cada cluster según las medias de sus jugadores: {cluster: nombre}."""
+    nombres = {}
+    for cluster_id in sorted(df_pos['cluster_local'].unique()):
+        mask = df_pos['cluster_local'] == cluster_id
+        stats = df_pos.loc[mask, config['primary']].mean()
+        
+        # Lógica de nombres por posición
+        if posicion == 'Arquero':
+            if stats['saves_pct'] > 70:
+                nombre = "🧤 Muro Infranqueable"
+            elif stats['sweeper_p90'] > 1.5:
+                nombre = "🏃 Arquero Líbero"
+            else:
+                nombre = "✋ Guardameta Sólido"
         
-        features_str = ", ".join(config['primary'])
-        where_conditions = [f"{feat} IS NOT NULL" for feat in config['primary']]
-        where_clause = " AND ".join(where_conditions)
+        elif posicion == 'Defensor':
+            # ✅ Lógica mejorada con nuevas features
+            if stats['aerial_won_p90'] > 3.0 and stats['clearances_p90'] > 4.0:
+                nombre = "🗼 Coloso Aéreo"
+            elif stats['tackles_p90'] > 3.0 and stats['interceptions_p90'] > 2.0:
+                nombre = "🔒 Marcador Férreo"
+            elif stats['blocks_p90'] > 1.5:
+                nombre = "🛡️ Muro Defensivo"
+            else:
+                nombre = "🧱 Defensor Completo"
         
-        query = f"""
-            SELECT
-                player_id, player, posicion, equipo_principal,
-                edad_promedio, valor_mercado, nacionalidad,
-                total_minutos, partidos_jugados, rating_promedio,
-                {features_str}
-            FROM `{SOURCE_TABLE}`
-            WHERE temporada_anio = (SELECT MAX(temporada_anio) FROM `{SOURCE_TABLE}`)
-              AND posicion = '{posicion}'
-              AND total_minutos >= 900
-              AND rating_promedio >= 6.5
-              AND {where_clause}
-        """
+        elif posicion == 'Mediocampista':
+            if stats['key_passes_p90'] > 2.0:
+                nombre = "🎨 Creador Puro"
+            elif stats['recoveries_p90'] > 7.0 and stats['tackles_p90'] > 2.5:
+                nombre = "🎩 Pivote Recuperador"
+            else:
+                nombre = "🔄 Box-to-Box"
         
-        df_pos = client.query(query).to_dataframe()
+        else:  # Delantero
+            if stats['xG_p90'] > 0.6:
+                nombre = "🎯 Goleador Nato"
+            elif stats['dribbles_p90'] > 3.0:
+                nombre = "⚡ Extremo Eléctrico"
+            else:
+                nombre = "🦅 Ariete Completo"
         
+        # Dos clusters con el mismo perfil: se numeran para no fusionarlos en el dashboard
+        repetidos = sum(1 for n in nombres.values() if n == nombre or n.startswith(f"{nombre} "))
+        nombres[int(cluster_id)] = f"{nombre} {repetidos + 1}" if repetidos else nombre
+    return nombres
+
+
+def drift_arquetipos(artefactos: dict, df_pos: pd.DataFrame) -> float:
+    """
+    Deriva de calidad de los clusters: aumento relativo de la inercia por
+    jugador de df_pos con los centroides guardados respecto del ajuste.
+    """
+    if len(df_pos) == 0:
+        return 0.0
+    X_scaled = artefactos['scaler'].transform(df_pos[artefactos['features']].fillna(0))
+    inercia = -artefactos['kmeans'].score(X_scaled)
+    return float((inercia / len(df_pos)) / (artefactos['inercia'] / artefactos['filas']) - 1)
+
+
+def modelo_kmeans(k: int, n_filas: int):
+    """KMeans completo para cohortes chicas; MiniBatchKMeans desde UMBRAL_MINIBATCH filas."""
+    if n_filas >= UMBRAL_MINIBATCH:
+        return MiniBatchKMeans(n_clusters=k, batch_size=4096, n_init=3, random_state=42)
+    return KMeans(n_clusters=k, random_state=42, n_init=20)
+
+
+def evaluar_k(X_muestra: np.ndarray, k: int) -> float:
+    """Silhouette de un KMeans barato (n_init=3) ajustado solo sobre la muestra."""
+    etiquetas = KMeans(n_clusters=k, random_state=42, n_init=3).fit_predict(X_muestra)
+    # Indefinida si la muestra cae entera en un cluster (silhouette_score levanta ValueError)
+    if len(np.unique(etiquetas)) < 2:
+        return -1.0
+    try:
+        return float(silhouette_score(X_muestra, etiquetas))
+    except ValueError:
+        return -1.0
+
+
+def seleccionar_k(X_scaled: np.ndarray) -> dict:
+    """
+    Elige k de RANGO_K_ARQUETIPOS por silhouette con ajustes baratos sobre
+    una muestra fija de hasta MUESTRA_SILHOUETTE filas, evaluados en hilos
+    (KMeans y silhouette liberan el GIL; la posición ya es una tarea del
+    pool de procesos). Empate: el k menor. Solo ese k se reajusta sobre
+    toda la cohorte.
+    """
+    rng = np.random.default_rng(42)
+    muestra = np.sort(rng.choice(len(X_scaled), size=min(MUESTRA_SILHOUETTE, len(X_scaled)), replace=False))
+    ks = [k for k in RANGO_K_ARQUETIPOS if k < len(muestra)]
+    
+    X_muestra = X_scaled[muestra]
+    
+    with ThreadPoolExecutor(max_workers=len(ks)) as pool:
+        silhouettes = dict(zip(ks, pool.map(lambda k: evaluar_k(X_muestra, k), ks)))
+    
+    mejor = max(ks, key=lambda k: (silhouettes[k], -k))
+    return {'kmeans': modelo_kmeans(mejor, len(X_scaled)).fit(X_scaled), 'silhouettes': silhouettes}
+
+
+def ajustar_arquetipos(posicion: str, df_pos: pd.DataFrame, temporada: int) -> dict:
+    """KMeans (k por silhouette) + nombres de arquetipo sobre los titulares de la temporada actual."""
+    config = FEATURE_SETS[posicion]
+    inicio = time.perf_counter()
+    
+    # Clustering
+    X = df_pos[config['primary']].fillna(0)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    
+    seleccion = seleccionar_k(X_scaled)
+    kmeans = seleccion['kmeans']
+    df_pos = df_pos.assign(cluster_local=kmeans.predict(X_scaled))
+    
+    return {
+        'scaler': scaler,
+        'kmeans': kmeans,
+        'nombres': nombrar_arquetipos(posicion, df_pos, config),
+        'features': list(config['primary']),
+        'temporada_ajuste': int(temporada),
+        'filas': len(df_pos),
+        'inercia': float(-kmeans.score(X_scaled)),
+        'silhouettes': seleccion['silhouettes'],
+        'segundos_ajuste': time.perf_counter() - inicio,
+    }
+
+
+def tarea_arquetipos(posicion: str, df_pos: pd.DataFrame, df_historico: pd.DataFrame,
+                     temporada: int, anteriores: dict = None, reajustar: bool = False) -> dict:
+    """
+    Tarea (un proceso): reutiliza o reajusta el KMeans de la posición y
+    asigna arquetipo a todas las temporadas (df_historico) con predict.
+    """
+    config = FEATURE_SETS[posicion]
+    log = [f"\n📍 Clustering para: {posicion}"]
+    
+    if reajustar:
+        motivo = "reajuste pedido"
+    elif anteriores is None:
+        motivo = "sin centroides guardados"
+    elif anteriores['features'] != list(config['primary']):
+        motivo = "cambiaron las features"
+    elif (drift := drift_arquetipos(anteriores, df_pos)) > UMBRAL_DRIFT_ARQUETIPOS:
+        motivo = f"deriva de inercia {drift:+.3f} > {UMBRAL_DRIFT_ARQUETIPOS}"
+    else:
+        motivo = None
+    
+    if motivo:
         if len(df_pos) < 15:
-            print(f"   ⚠️ Datos insuficientes ({len(df_pos)})")
+            log.append(f"   ⚠️ Datos insuficientes ({len(df_pos)})")
+            return {'log': log, 'arquetipos': None, 'n_clusters': 0, 'artefactos': None, 'reajustado': False}
+        log.append(f"   ✓ {len(df_pos)} jugadores | 🔄 Reajuste ({motivo})")
+        artefactos = ajustar_arquetipos(posicion, df_pos, temporada)
+        silhouettes = artefactos['silhouettes']
+        k = artefactos['kmeans'].n_clusters
+        log.append(f"   ⏱️  {type(artefactos['kmeans']).__name__} k={k} (silhouette {silhouettes[k]:.3f}) "
+                   f"en {artefactos['segundos_ajuste']:.2f}s | "
+                   + " ".join(f"k{c}:{v:.3f}" for c, v in silhouettes.items()))
+    else:
+        log.append(f"   ✓ {len(df_pos)} jugadores | Centroides vigentes de {anteriores['temporada_ajuste']} "
+                   f"(deriva {drift:+.3f})")
+        artefactos = anteriores
+    
+    # Asignación a todas las temporadas: distancia a los centroides
+    X_scaled = artefactos['scaler'].transform(df_historico[artefactos['features']].fillna(0))
+    df_historico = df_historico.assign(cluster_local=artefactos['kmeans'].predict(X_scaled))
+    df_historico['arquetipo_nombre'] = df_historico['cluster_local'].map(artefactos['nombres'])
+    
+    n_clusters = artefactos['kmeans'].n_clusters
+    log.append(f"   ✓ {n_clusters} arquetipos | {len(df_historico)} jugadores-temporada asignados "
+               f"({df_historico['temporada_anio'].nunique()} temporadas)")
+    return {
+        'log': log,
+        'arquetipos': df_historico,
+        'n_clusters': n_clusters,
+        'artefactos': artefactos,
+        'reajustado': bool(motivo),
+    }
+
+
+def tareas_arquetipos(snapshot: SnapshotDatamart, anteriores: dict = None, reajustar: bool = False) -> dict:
+    """Una tarea por posición con los centroides guardados de esa posición."""
+    anteriores = anteriores or {}
+    return {
+        f"arquetipos/{posicion}": (tarea_arquetipos, (
+            posicion,
+            subconjunto_arquetipos(snapshot, posicion, config),
+            subconjunto_arquetipos(snapshot, posicion, config, todas_las_temporadas=True),
+            snapshot.temporada_actual,
+            anteriores.get(posicion),
+            reajustar,
+        ))
+        for posicion, config in FEATURE_SETS.items()
+    }
+
+
+def ensamblar_arquetipos(resultados: dict) -> pd.DataFrame:
+    """Junta los clusters por posición con ids globales consecutivos."""
+    print("\n" + "="*70)
+    print("🎨 MODELO 3: CLUSTERING DE ARQUETIPOS POR POSICIÓN")
+    print("="*70)
+    
+    all_arquetipos = []
+    cluster_global_id = 0
+    
+    for posicion in FEATURE_SETS:
+        resultado = resultados[f"arquetipos/{posicion}"]
+        print("\n".join(resultado['log']))
+        if resultado['arquetipos'] is None:
             continue
         
-        print(f"   ✓ {len(df_pos)} jugadores")
-        
-        # Determinar número de clusters
-        n_clusters = min(5, max(3, len(df_pos) // 30))
-        
-        # Clustering
-        X = df_pos[config['primary']].fillna(0)
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=20)
-        df_pos['cluster_local'] = kmeans.fit_predict(X_scaled)
+        df_pos = resultado['arquetipos']
         df_pos['cluster_global'] = df_pos['cluster_local'] + cluster_global_id
-        
-        # Nombrar arquetipos según posición
-        for cluster_id in sorted(df_pos['cluster_local'].unique()):
-            mask = df_pos['cluster_local'] == cluster_id
-            stats = df_pos.loc[mask, config['primary']].mean()
-            
-            # Lógica de nombres por posición
-            if posicion == 'Arquero':
-                if stats['saves_pct'] > 70:
-                    nombre = "🧤 Muro Infranqueable"
-                elif stats['sweeper_p90'] > 1.5:
-                    nombre = "🏃 Arquero Líbero"
-                else:
-                    nombre = "✋ Guardameta Sólido"
-            
-            elif posicion == 'Defensor':
-                # ✅ Lógica mejorada con nuevas features
-                if stats['aerial_won_p90'] > 3.0 and stats['clearances_p90'] > 4.0:
-                    nombre = "🗼 Coloso Aéreo"
-                elif stats['tackles_p90'] > 3.0 and stats['interceptions_p90'] > 2.0:
-                    nombre = "🔒 Marcador Férreo"
-                elif stats['blocks_p90'] > 1.5:
-                    nombre = "🛡️ Muro Defensivo"
-                else:
-                    nombre = "🧱 Defensor Completo"
-            
-            elif posicion == 'Mediocampista':
-                if stats['key_passes_p90'] > 2.0:
-                    nombre = "🎨 Creador Puro"
-                elif stats['recoveries_p90'] > 7.0 and stats['tackles_p90'] > 2.5:
-                    nombre = "🎩 Pivote Recuperador"
-                else:
-                    nombre = "🔄 Box-to-Box"
-            
-            else:  # Delantero
-                if stats['xG_p90'] > 0.6:
-                    nombre = "🎯 Goleador Nato"
-                elif stats['dribbles_p90'] > 3.0:
-                    nombre = "⚡ Extremo Eléctrico"
-                else:
-                    nombre = "🦅 Ariete Completo"
-            
-            df_pos.loc[mask, 'arquetipo_nombre'] = nombre
-        
         all_arquetipos.append(df_pos)
-        cluster_global_id += n_clusters
-        print(f"   ✓ {n_clusters} arquetipos creados")
+        cluster_global_id += resultado['n_clusters']
     
     df_arquetipos = pd.concat(all_arquetipos, ignore_index=True)
     
     df_resultado = df_arquetipos[[
-        'player_id', 'player', 'posicion', 'equipo_principal',
+        'player_id', 'player', 'temporada_anio', 'posicion', 'equipo_principal',
         'cluster_global', 'arquetipo_nombre', 'rating_promedio', 'valor_mercado'
     ]].copy()
     
-    df_resultado['player_id'] = df_resultado['player_id'].astype(str)
+    df_resultado['player_id'] = df_resultado['player_id'].astype('int64')
+    df_resultado['temporada_anio'] = df_resultado['temporada_anio'].astype('int64')
     df_resultado.rename(columns={'cluster_global': 'cluster'}, inplace=True)
     
-    print(f"\n✅ {len(df_resultado)} jugadores clasificados en arquetipos")
+    print(f"\n✅ {len(df_resultado)} jugadores-temporada clasificados en arquetipos "
+          f"({df_resultado['temporada_anio'].nunique()} temporadas)")
     
     return df_resultado
 
+
+def generar_arquetipos_por_posicion(snapshot: SnapshotDatamart, workers: int = 1,
+                                    anteriores: dict = None, reajustar: bool = False) -> pd.DataFrame:
+    """MODELO 3: Clustering de Arquetipos POR POSICIÓN"""
+    return ensamblar_arquetipos(ejecutar_tareas(tareas_arquetipos(snapshot, anteriores, reajustar), workers))
+
 # ============================================================================
 # PIPELINE COMPLETO
 # ============================================================================
 
-def upload_to_bigquery(client: bigquery.Client, df: pd.DataFrame, dest_table: str, schema: list):
-    """Sube DataFrame a BigQuery"""
-    job_config = bigquery.LoadJobConfig(schema=schema, write_disposition="WRITE_TRUNCATE")
-    job = client.load_table_from_dataframe(df, dest_table, job_config=job_config)
-    job.result()
+def upload_to_bigquery(backend, df: pd.DataFrame, dest_table: str, schema: list):
+    """Sube DataFrame al backend (BigQuery o Parquet local). Particionado/clustering: table_specs.py"""
+    backend.cargar_dataframe(df, dest_table, schema=schema)
     print(f"✅ Tabla actualizada: {dest_table}")
 
-def run_all_models():
-    """Pipeline completo incluyendo arqueros"""
+
+def merge_similitud(backend, df_parche: pd.DataFrame, claves_reemplazo, schema: list):
+    """
+    Aplica el parche incremental a DEST_SIMILITUD sin reescribir la tabla:
+    MERGE por (origen, temporada, rank) desde una tabla staging. Los orígenes
+    a reemplazar que no tienen fila nueva para un rank llevan _borrar = TRUE.
+    En local se reescribe el Parquet con las filas reemplazadas.
+    """
+    columnas = [campo.name for campo in schema]
+    claves_merge = ['jugador_origen_id', 'temporada_origen', 'rank_similitud']
     
-    print("\n" + "🚀"*35)
-    print("   PIPELINE ML COMPLETO - TODAS LAS POSICIONES")
-    print("   ✅ VERSION ACTUALIZADA: Con percentiles defensivos")
-    print("🚀"*35)
+    if backend.nombre == 'local':
+        actual = backend.query_df(f"SELECT * FROM `{DEST_SIMILITUD}`")
+        origenes = claves_jugador(actual, 'jugador_origen_id', 'temporada_origen')
+        conservar = actual[~np.isin(origenes, claves_reemplazo)]
+        nuevo = pd.concat([conservar, df_parche[columnas]], ignore_index=True) if len(df_parche) else conservar
+        backend.cargar_dataframe(nuevo, DEST_SIMILITUD, schema=schema)
+        print(f"✅ Tabla parcheada: {DEST_SIMILITUD} ({len(df_parche):,} filas nuevas)")
+        return
     
-    client = bigquery.Client(project=PROJECT_ID)
+    # Lápidas: (origen, rank) a borrar que no tienen reemplazo en el parche
+    ids, temporadas = np.array([c.split('|') for c in claves_reemplazo], dtype=np.int64).reshape(-1, 2).T
+    lapidas = pd.DataFrame({
+        'jugador_origen_id': np.repeat(ids, 5),
+        'temporada_origen': np.repeat(temporadas, 5),
+        'rank_similitud': np.tile(np.arange(1, 6), len(ids)),
+    })
+    if len(df_parche):
+        lapidas = lapidas.merge(
+            df_parche[claves_merge],
+            how='left', indicator=True,
+        ).query("_merge == 'left_only'").drop(columns='_merge')
+    staging = pd.concat(
+        [df_parche.assign(_borrar=False), lapidas.assign(_borrar=True)], ignore_index=True
+    ).reindex(columns=columnas + ['_borrar'])
     
-    # MODELO 1: SIMILITUD
-    df_similitudes = calcular_similitudes_por_posicion(client)
+    backend.cargar_dataframe(staging, STAGING_SIMILITUD, schema=schema + [bigquery.SchemaField("_borrar", "BOOLEAN")])
+    
+    merge = f"""
+        MERGE `{DEST_SIMILITUD}` T
+        USING `{STAGING_SIMILITUD}` S
+        ON T.jugador_origen_id = S.jugador_origen_id
+           AND T.temporada_origen = S.temporada_origen
+           AND T.rank_similitud = S.rank_similitud
+        WHEN MATCHED AND S._borrar THEN
+            DELETE
+        WHEN MATCHED THEN
+            UPDATE SET {", ".join(f"{c} = S.{c}" for c in columnas if c not in claves_merge)}
+        WHEN NOT MATCHED BY TARGET AND NOT S._borrar THEN
+            INSERT ({", ".join(columnas)}) VALUES ({", ".join(f"S.{c}" for c in columnas)})
+    """
+    try:
+        job = backend.query(merge)
+        job.result()
+        print(f"✅ MERGE en {DEST_SIMILITUD}: {job.num_dml_affected_rows:,} filas afectadas")
+    finally:
+        backend.client.delete_table(STAGING_SIMILITUD, not_found_ok=True)
+
+
+def uri_estado_similitud(backend) -> str:
+    """El estado vive junto a las tablas locales o en el bucket del pipeline."""
+    if backend.nombre == 'local':
+        return os.path.join(backend.directorio, '_estado_similitud.json')
+    return ESTADO_SIMILITUD_URI
+
+
+def uri_registro(backend) -> str:
+    """El registro de modelos vive junto a las tablas locales o en el bucket."""
+    if backend.nombre == 'local':
+        return os.path.join(backend.directorio, '_modelos')
+    return REGISTRO_URI
+
+
+def contexto_registro(backend, snapshot: SnapshotDatamart, raiz: str = None) -> dict:
+    """Una versión por corrida, compartida por los modelos y trazable al snapshot."""
+    huella = hash_dataframe(snapshot.df)
+    return {
+        'raiz': raiz or uri_registro(backend),
+        'version': nueva_version(huella),
+        'snapshot': {'hash': huella, 'filas': len(snapshot.df), 'temporada_actual': snapshot.temporada_actual},
+    }
+
+
+def registrar(registro: dict, modelo: str, objetos: dict, metadata: dict):
+    """Guarda los objetos entrenados de un modelo como la versión de la corrida."""
+    if registro is None:
+        return
+    metadata = guardar_artefactos(
+        registro['raiz'], modelo, registro['version'], objetos,
+        {**metadata, 'snapshot': registro['snapshot']}, PROJECT_ID,
+    )
+    print(f"📦 Registro: {modelo} {registro['version']} ({metadata['bytes_artefactos'] / 1024:,.0f} KB)")
+
+
+def registrar_similitud(registro: dict, resultados: dict, indice: str, modo: str):
+    """
+    Scaler + índice KNN por posición. En modo incremental las posiciones sin
+    índice nuevo conservan los artefactos de la versión anterior.
+    """
+    if registro is None:
+        return
+    objetos = {
+        posicion: resultados[f"similitud/{posicion}"]['artefactos']
+        for posicion in FEATURE_SETS
+        if resultados[f"similitud/{posicion}"]['artefactos'] is not None
+    }
+    if modo == 'incremental' and len(objetos) < len(FEATURE_SETS):
+        anteriores, _ = cargar_artefactos(registro['raiz'], 'similitud', project=PROJECT_ID)
+        if not objetos:
+            print("⏭️  Registro: similitud sin cambios, sigue vigente la versión anterior")
+            return
+        for posicion, artefactos in (anteriores or {}).items():
+            if posicion not in objetos and resultados[f"similitud/{posicion}"]['estado'] is not None:
+                objetos[posicion] = artefactos
     
+    registrar(registro, 'similitud', objetos, {
+        'indice': indice,
+        'modo': modo,
+        'features': {p: a['features'] for p, a in objetos.items()},
+        'pesos': {p: a['pesos'] for p, a in objetos.items()},
+        'filas_entrenamiento': {p: len(a['claves']) for p, a in objetos.items()},
+        'metricas': {p: {'distancia_media_top5': a['distancia_media_top5']} for p, a in objetos.items()},
+    })
+
+
+def preparar_similitud(backend, snapshot: SnapshotDatamart, indice: str = INDICE_SIMILITUD,
+                       modo: str = 'completo', estado_uri: str = None) -> tuple:
+    """
+    Modelo 1: decide el modo y arma las tareas por posición.
+    modo: completo (WRITE_TRUNCATE) | incremental (MERGE del parche) |
+    auto (incremental si hay estado guardado y tabla destino).
+    
+    Returns:
+        (tareas, contexto para finalizar_similitud)
+    """
+    estado_uri = estado_uri or uri_estado_similitud(backend)
+    estado = leer_manifiesto(estado_uri, PROJECT_ID).get('posiciones', {})
+    
+    if modo != 'completo' and not (estado and backend.existe(DEST_SIMILITUD)):
+        if modo == 'incremental':
+            print("⚠️  Sin estado previo o sin tabla destino: similitud en modo completo")
+        modo = 'completo'
+    elif modo == 'auto':
+        modo = 'incremental'
+    
+    contexto = {'modo': modo, 'estado': estado, 'estado_uri': estado_uri, 'indice': indice}
+    if modo == 'completo':
+        return tareas_similitud(snapshot, indice), contexto
+    
+    actuales = backend.query_df(f"""
+        SELECT jugador_origen_id, temporada_origen, jugador_similar_id, temporada_similar,
+               posicion, distancia_euclidiana
+        FROM `{DEST_SIMILITUD}`
+    """)
+    return tareas_similitud_incremental(snapshot, actuales, estado, indice), contexto
+
+
+def finalizar_similitud(backend, resultados: dict, contexto: dict, registro: dict = None) -> pd.DataFrame:
+    """Modelo 1: ensambla, sube (o parchea) las similitudes, registra los índices y guarda el estado."""
     schema_similitud = [
         bigquery.SchemaField("jugador_origen", "STRING"),
-        bigquery.SchemaField("jugador_origen_id", "STRING"),
+        bigquery.SchemaField("jugador_origen_id", "INTEGER"),
         bigquery.SchemaField("temporada_origen", "INTEGER"),
         bigquery.SchemaField("jugador_similar", "STRING"),
-        bigquery.SchemaField("jugador_similar_id", "STRING"),
+        bigquery.SchemaField("jugador_similar_id", "INTEGER"),
         bigquery.SchemaField("temporada_similar", "INTEGER"),
         bigquery.SchemaField("posicion", "STRING"),
         bigquery.SchemaField("rank_similitud", "INTEGER"),
@@ -476,13 +1350,37 @@ def run_all_models():
         bigquery.SchemaField("equipo_similar", "STRING"),
     ]
     
-    upload_to_bigquery(client, df_similitudes, DEST_SIMILITUD, schema_similitud)
+    estado = contexto['estado']
+    if contexto['modo'] == 'completo':
+        estado = {}
+        df_similitudes = ensamblar_similitudes(resultados, estado)
+        upload_to_bigquery(backend, df_similitudes, DEST_SIMILITUD, schema_similitud)
+    else:
+        df_similitudes, claves_reemplazo = ensamblar_similitudes_incremental(resultados, estado)
+        if len(claves_reemplazo):
+            merge_similitud(backend, df_similitudes, claves_reemplazo, schema_similitud)
+        else:
+            print(f"⏭️  {DEST_SIMILITUD}: sin cambios")
     
-    # MODELO 2: PROYECCIÓN
-    df_proyecciones, _, _ = entrenar_modelo_valor(client)
+    registrar_similitud(registro, resultados, contexto['indice'], contexto['modo'])
+    guardar_manifiesto(contexto['estado_uri'], {'posiciones': estado}, PROJECT_ID)
+    return df_similitudes
+
+
+def correr_similitud(backend, snapshot: SnapshotDatamart, indice: str = INDICE_SIMILITUD,
+                     modo: str = 'completo', estado_uri: str = None, workers: int = 1,
+                     registro: dict = None) -> pd.DataFrame:
+    """Modelo 1: calcula y sube las similitudes KNN"""
+    tareas, contexto = preparar_similitud(backend, snapshot, indice, modo, estado_uri)
+    return finalizar_similitud(backend, ejecutar_tareas(tareas, workers), contexto, registro)
+
+
+def finalizar_valor(backend, resultados: dict, registro: dict = None) -> pd.DataFrame:
+    """Modelo 2: sube las proyecciones y registra el modelo entrenado"""
+    df_proyecciones, modelo, scaler = ensamblar_valor(resultados)
     
     schema_proyecciones = [
-        bigquery.SchemaField("player_id", "STRING"),
+        bigquery.SchemaField("player_id", "INTEGER"),
         bigquery.SchemaField("player", "STRING"),
         bigquery.SchemaField("posicion", "STRING"),
         bigquery.SchemaField("temporada_anio", "INTEGER"),
@@ -493,14 +1391,34 @@ def run_all_models():
         bigquery.SchemaField("delta_proyectado_pct", "FLOAT"),
     ]
     
-    upload_to_bigquery(client, df_proyecciones, DEST_PROYECCIONES, schema_proyecciones)
+    upload_to_bigquery(backend, df_proyecciones, DEST_PROYECCIONES, schema_proyecciones)
     
-    # MODELO 3: ARQUETIPOS
-    df_arquetipos = generar_arquetipos_por_posicion(client)
+    resultado = resultados['valor']
+    registrar(registro, 'valor', {'modelo': modelo, 'scaler': scaler, 'features': FEATURES_VALOR}, {
+        'regresor': resultado['regresor'],
+        'features': FEATURES_VALOR,
+        'target': 'delta_valor_pct',
+        'filas_entrenamiento': resultado['filas'],
+        'metricas': resultado['metricas'],
+        'parametros': modelo.get_params(),
+    })
+    return df_proyecciones
+
+
+def correr_valor(backend, snapshot: SnapshotDatamart, registro: dict = None,
+                 regresor: str = REGRESOR_VALOR) -> pd.DataFrame:
+    """Modelo 2: entrena la proyección de valor y sube las proyecciones"""
+    return finalizar_valor(backend, ejecutar_tareas(tareas_valor(snapshot, regresor), workers=1), registro)
+
+
+def finalizar_arquetipos(backend, resultados: dict, registro: dict = None) -> pd.DataFrame:
+    """Modelo 3: ensambla y sube los arquetipos y registra los KMeans por posición"""
+    df_arquetipos = ensamblar_arquetipos(resultados)
     
     schema_arquetipos = [
-        bigquery.SchemaField("player_id", "STRING"),
+        bigquery.SchemaField("player_id", "INTEGER"),
         bigquery.SchemaField("player", "STRING"),
+        bigquery.SchemaField("temporada_anio", "INTEGER"),
         bigquery.SchemaField("posicion", "STRING"),
         bigquery.SchemaField("equipo_principal", "STRING"),
         bigquery.SchemaField("cluster", "INTEGER"),
@@ -509,22 +1427,145 @@ def run_all_models():
         bigquery.SchemaField("valor_mercado", "FLOAT"),
     ]
     
-    upload_to_bigquery(client, df_arquetipos, DEST_ARQUETIPOS, schema_arquetipos)
+    upload_to_bigquery(backend, df_arquetipos, DEST_ARQUETIPOS, schema_arquetipos)
+    
+    objetos = {
+        posicion: resultados[f"arquetipos/{posicion}"]['artefactos']
+        for posicion in FEATURE_SETS
+        if resultados[f"arquetipos/{posicion}"]['artefactos'] is not None
+    }
+    if not any(resultados[f"arquetipos/{posicion}"]['reajustado'] for posicion in FEATURE_SETS):
+        print("⏭️  Registro: arquetipos sin reajuste, siguen vigentes los centroides anteriores")
+        return df_arquetipos
+    registrar(registro, 'arquetipos', objetos, {
+        'temporada_ajuste': {p: a['temporada_ajuste'] for p, a in objetos.items()},
+        'features': {p: a['features'] for p, a in objetos.items()},
+        'filas_entrenamiento': {p: a['filas'] for p, a in objetos.items()},
+        'metricas': {
+            p: {
+                'n_clusters': a['kmeans'].n_clusters,
+                'motor': type(a['kmeans']).__name__,
+                'inercia': a['inercia'],
+                'silhouette': a.get('silhouettes', {}).get(a['kmeans'].n_clusters),
+                'segundos_ajuste': a.get('segundos_ajuste'),
+            }
+            for p, a in objetos.items()
+        },
+        'nombres': {p: a['nombres'] for p, a in objetos.items()},
+    })
+    return df_arquetipos
+
+
+def centroides_vigentes(registro: dict) -> dict:
+    """Scaler + KMeans por posición de la última versión registrada ({} si no hay)."""
+    if registro is None:
+        return {}
+    anteriores, _ = cargar_artefactos(registro['raiz'], 'arquetipos', project=PROJECT_ID)
+    # Versiones previas al reajuste por deriva no guardaban la temporada del ajuste
+    return {p: a for p, a in (anteriores or {}).items() if 'temporada_ajuste' in a}
+
+
+def correr_arquetipos(backend, snapshot: SnapshotDatamart, workers: int = 1, registro: dict = None,
+                      reajustar: bool = False) -> pd.DataFrame:
+    """Modelo 3: clustering de arquetipos"""
+    tareas = tareas_arquetipos(snapshot, centroides_vigentes(registro), reajustar)
+    return finalizar_arquetipos(backend, ejecutar_tareas(tareas, workers), registro)
+
+
+def run_all_models(modelos=MODELOS, snapshot_path=None, guardar_snapshot=None, indice=INDICE_SIMILITUD,
+                   modo_similitud='auto', workers=MAX_WORKERS_MODELOS, registro_uri=None,
+                   regresor_valor=REGRESOR_VALOR, comparar_valor=False, backtest=None,
+                   reajustar_arquetipos=False):
+    """
+    Pipeline completo incluyendo arqueros. modelos limita qué modelos se corren.
+    snapshot_path: Parquet a usar en lugar de consultar el datamart.
+    guardar_snapshot: exporta el snapshot leído (para correr los modelos offline).
+    indice: índice KNN del modelo de similitud (ver ann_index.py).
+    modo_similitud: completo | incremental | auto (ver preparar_similitud).
+    workers: procesos del pool donde corren juntas todas las tareas
+    (KNN y KMeans por posición + modelo de valor).
+    registro_uri: raíz del registro de modelos (default: uri_registro).
+    regresor_valor: 'gbr' | 'hist' (ver crear_regresor_valor).
+    comparar_valor: solo imprime el reporte gbr vs hist, sin escribir tablas.
+    backtest: CSV donde guardar el backtest por temporada del modelo de
+    valor; si se pasa, solo se corre el backtest.
+    reajustar_arquetipos: reajusta los KMeans aunque no haya deriva.
+    """
+    
+    print("\n" + "🚀"*35)
+    print("   PIPELINE ML COMPLETO - TODAS LAS POSICIONES")
+    print("   ✅ VERSION ACTUALIZADA: Con percentiles defensivos")
+    print("🚀"*35)
+    
+    backend = crear_backend()
+    
+    # Una sola lectura del datamart para los tres modelos
+    inicio = time.perf_counter()
+    snapshot = cargar_snapshot(backend, snapshot_path)
+    origen = snapshot_path or SOURCE_TABLE
+    print(f"\n📥 Snapshot: {len(snapshot.df):,} filas x {snapshot.df.shape[1]} columnas "
+          f"desde {origen} ({time.perf_counter() - inicio:.2f}s)")
+    if guardar_snapshot:
+        snapshot.df.to_parquet(guardar_snapshot, index=False)
+        print(f"💾 Snapshot guardado en {guardar_snapshot}")
+    
+    if comparar_valor:
+        comparar_regresores_valor(snapshot)
+        return
+    
+    if backtest:
+        backtest_valor(snapshot, regresor_valor, workers).to_csv(backtest)
+        print(f"💾 Backtest guardado en {backtest}")
+        return
+    
+    registro = contexto_registro(backend, snapshot, registro_uri)
+    
+    # Todas las tareas de los modelos pedidos van al mismo pool
+    tareas = {}
+    if 'similitud' in modelos:
+        tareas_sim, contexto_similitud = preparar_similitud(backend, snapshot, indice, modo_similitud)
+        tareas.update(tareas_sim)
+    if 'valor' in modelos:
+        tareas.update(tareas_valor(snapshot, regresor_valor))
+    if 'arquetipos' in modelos:
+        tareas.update(tareas_arquetipos(snapshot, centroides_vigentes(registro), reajustar_arquetipos))
+    
+    salidas = ejecutar_tareas(tareas, workers)
+    
+    resultados = {}
+    
+    # MODELO 1: SIMILITUD
+    if 'similitud' in modelos:
+        resultados['similitud'] = finalizar_similitud(backend, salidas, contexto_similitud, registro)
+    
+    # MODELO 2: PROYECCIÓN
+    if 'valor' in modelos:
+        resultados['valor'] = finalizar_valor(backend, salidas, registro)
+    
+    # MODELO 3: ARQUETIPOS
+    if 'arquetipos' in modelos:
+        resultados['arquetipos'] = finalizar_arquetipos(backend, salidas, registro)
     
     # RESUMEN
     print("\n" + "✅"*35)
     print("      PIPELINE COMPLETADO")
     print("✅"*35)
     print(f"\n📊 Resultados:")
-    print(f"   • Similitudes:   {len(df_similitudes):,} relaciones")
-    print(f"   • Proyecciones:  {len(df_proyecciones):,} jugadores")
-    print(f"   • Arquetipos:    {len(df_arquetipos):,} jugadores")
+    if 'similitud' in resultados:
+        print(f"   • Similitudes:   {len(resultados['similitud']):,} relaciones")
+    if 'valor' in resultados:
+        print(f"   • Proyecciones:  {len(resultados['valor']):,} jugadores")
+    if 'arquetipos' in resultados:
+        print(f"   • Arquetipos:    {len(resultados['arquetipos']):,} jugadores-temporada")
     
     # Desglose por posición
-    print(f"\n📍 Desglose Similitudes:")
-    for pos in FEATURE_SETS.keys():
-        count = len(df_similitudes[df_similitudes['posicion'] == pos])
-        print(f"   {pos}: {count:,}")
+    if 'similitud' in resultados:
+        df_similitudes = resultados['similitud']
+        # En modo incremental sin cambios el parche viene vacío (sin columnas)
+        conteos = df_similitudes['posicion'].value_counts() if len(df_similitudes) else {}
+        print(f"\n📍 Desglose Similitudes:")
+        for pos in FEATURE_SETS.keys():
+            print(f"   {pos}: {conteos.get(pos, 0):,}")
     
     print(f"\n✨ Mejoras en esta versión:")
     print(f"   • Defensores: Ahora incluye tackles, interceptions, clearances, blocks")
@@ -532,5 +1573,69 @@ def run_all_models():
     print(f"   • Proyección valor: Usa percentiles defensivos como features")
     print(f"   • Arquetipos: Lógica mejorada con '🛡️ Muro Defensivo' para blockers")
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Modelos de scouting: similitud, valor y arquetipos")
+    parser.add_argument(
+        '--modelo', choices=MODELOS + ['todos'], default='todos',
+        help="Corre un solo modelo o todos (default; src/pipeline.py los corre juntos para compartir el snapshot)."
+    )
+    parser.add_argument(
+        '--indice', choices=INDICES, default=INDICE_SIMILITUD,
+        help="Índice KNN de similitud: exacto (default) o aproximado ivf/lsh para 100k+ filas por posición."
+    )
+    parser.add_argument(
+        '--modo-similitud', choices=['auto', 'completo', 'incremental'], default='auto',
+        help="auto: incremental si hay estado de la corrida anterior (default). "
+             "completo: recalcula todas las relaciones y reescribe la tabla."
+    )
+    parser.add_argument(
+        '--workers', type=int, default=MAX_WORKERS_MODELOS,
+        help=f"Procesos para las tareas por posición y modelo (default {MAX_WORKERS_MODELOS}; 1 = en serie)."
+    )
+    parser.add_argument(
+        '--regresor-valor', choices=REGRESORES_VALOR, default=REGRESOR_VALOR,
+        help="gbr: GradientBoosting de 200 árboles (default). hist: HistGradientBoosting con early stopping."
+    )
+    parser.add_argument(
+        '--comparar-valor', action='store_true',
+        help="Solo compara gbr vs hist (tiempo de entrenamiento, R², MAE) sin escribir tablas."
+    )
+    parser.add_argument(
+        '--backtest', metavar='CSV',
+        help="Solo corre el backtest por temporada del modelo de valor (entrena ≤ t, evalúa t+1) y lo guarda en CSV."
+    )
+    parser.add_argument(
+        '--reajustar-arquetipos', action='store_true',
+        help=f"Reajusta los KMeans de arquetipos aunque la deriva no supere {UMBRAL_DRIFT_ARQUETIPOS}."
+    )
+    parser.add_argument(
+        '--registro', metavar='URI',
+        help="Raíz del registro de modelos (gs:// o directorio). Default: junto a las tablas locales o en el bucket."
+    )
+    parser.add_argument(
+        '--snapshot', metavar='PARQUET',
+        help="Lee el datamart desde un Parquet en lugar de consultar la tabla (modelos offline)."
+    )
+    parser.add_argument(
+        '--guardar-snapshot', metavar='PARQUET',
+        help="Exporta el snapshot leído del datamart a un Parquet."
+    )
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    run_all_models()
\ No newline at end of file
+    args = parse_args()
+    run_all_models(
+        MODELOS if args.modelo == 'todos' else [args.modelo],
+        snapshot_path=args.snapshot,
+        guardar_snapshot=args.guardar_snapshot,
+        indice=args.indice,
+        modo_similitud=args.modo_similitud,
+        workers=args.workers,
+        registro_uri=args.registro,
+        regresor_valor=args.regresor_valor,
+        comparar_valor=args.comparar_valor,
+        backtest=args.backtest,
+        reajustar_arquetipos=args.reajustar_arquetipos,
+    )
\ No newline at end of file
@@ -1,18 +1,71 @@
 """
-VISTA UNIFICADA PARA DASHBOARD - VERSION COMPLETA
-Consolida: Stats Base + Similitudes + Proyecciones + Arquetipos
+TABLA UNIFICADA PARA DASHBOARD - VERSION COMPLETA
+Consolida: Stats Base + Forma reciente + Similitudes + Proyecciones + Arquetipos
 CORREGIDO: Incluye TODOS los percentiles disponibles
+
+Se materializa en dashboard_scouting_completo (particionada por temporada_anio,
+clustering player_id/posicion) después de cada corrida de modelos: el dashboard
+lee una tabla plana en vez de re-ejecutar los CTEs, el ARRAY_AGG y los JOINs
+en cada consulta. v_dashboard_scouting_completo queda como vista fina sobre
+la tabla para los consumidores externos (Looker/Tableau).
+
+El DAG (pipeline.py) siempre reescribe la tabla completa: cada corrida de
+modelos regenera las proyecciones, que se unen por player_id y tocan todas
+las temporadas del jugador. --temporadas es para retoques manuales (p.ej.
+una corrección del datamart en una temporada sin volver a correr modelos).
 """
 
+import argparse
+import sys
+
 from google.cloud import bigquery
 
+from backend import crear_backend
+
 PROJECT_ID = "proyecto-scouting-futbol"
 DM_DATASET = "dm_scouting"
-CLIENT = bigquery.Client(project=PROJECT_ID)
+DASHBOARD_TABLE = f"{PROJECT_ID}.{DM_DATASET}.dashboard_scouting_completo"
+VIEW_ID = f"{PROJECT_ID}.{DM_DATASET}.v_dashboard_scouting_completo"
+BACKEND = crear_backend()
 
-sql_view = f"""
-CREATE OR REPLACE VIEW `{PROJECT_ID}.{DM_DATASET}.v_dashboard_scouting_completo` AS
+# Top 5 similares como array de structs. DuckDB no admite LIMIT dentro de
+# ARRAY_AGG: se agrega ordenado y se corta la lista.
+SQL_SIMILARES_TOP5 = {
+    'bigquery': """
+        ARRAY_AGG(
+            STRUCT(
+                jugador_similar_id,
+                jugador_similar as nombre,
+                equipo_similar as equipo,
+                score_similitud,
+                valor_mercado_similar / 1000000 as valor_millones,
+                edad_similar as edad,
+                rank_similitud
+            )
+            ORDER BY rank_similitud
+            LIMIT 5
+        )""",
+    'local': """
+        list(
+            struct_pack(
+                jugador_similar_id := jugador_similar_id,
+                nombre := jugador_similar,
+                equipo := equipo_similar,
+                score_similitud := score_similitud,
+                valor_millones := valor_mercado_similar / 1000000,
+                edad := edad_similar,
+                rank_similitud := rank_similitud
+            )
+            ORDER BY rank_similitud
+        )[1:5]""",
+}
 
+def sql_dashboard(filtro=""):
+    """
+    SELECT consolidado del dashboard. filtro es un WHERE sobre BaseStats
+    (p.ej. para reescribir solo algunas temporadas).
+    """
+    return f"""
 WITH BaseStats AS (
     -- Stats principales de cada jugador
     SELECT
@@ -84,6 +137,7 @@ WITH BaseStats AS (
         pct_sweeper
         
     FROM `{PROJECT_ID}.{DM_DATASET}.stats_jugador_temporada_pro`
+    {filtro}
 ),
 
 Similitudes AS (
@@ -92,19 +146,7 @@ Similitudes AS (
         jugador_origen_id,
         temporada_origen,
         
-        ARRAY_AGG(
-            STRUCT(
-                jugador_similar_id,
-                jugador_similar as nombre,
-                equipo_similar as equipo,
-                score_similitud,
-                valor_mercado_similar / 1000000 as valor_millones,
-                edad_similar as edad,
-                rank_similitud
-            )
-            ORDER BY rank_similitud
-            LIMIT 5
-        ) as similares_top5
+        {SQL_SIMILARES_TOP5[BACKEND.nombre]} as similares_top5
         
     FROM `{PROJECT_ID}.{DM_DATASET}.scouting_similitud_pro_v2`
     GROUP BY jugador_origen_id, temporada_origen
@@ -119,10 +161,26 @@ Proyecciones AS (
     FROM `{PROJECT_ID}.{DM_DATASET}.proyecciones_valor`
 ),
 
+Forma AS (
+    -- Forma reciente (últimos 5 / 10 partidos de la temporada)
+    SELECT
+        player_id,
+        temporada_anio,
+        ultimo_partido,
+        forma5_partidos, forma5_minutos, forma5_rating,
+        forma5_goals_p90, forma5_xG_p90, forma5_xA_p90, forma5_tackles_p90, forma5_saves_p90,
+        forma10_partidos, forma10_minutos, forma10_rating,
+        forma10_goals_p90, forma10_xG_p90, forma10_xA_p90, forma10_tackles_p90, forma10_saves_p90,
+        pct_forma5_rating, pct_forma5_xG, pct_forma5_xA, pct_forma5_tackles, pct_forma5_saves,
+        pct_forma10_rating, pct_forma10_xG, pct_forma10_xA, pct_forma10_tackles, pct_forma10_saves
+    FROM `{PROJECT_ID}.{DM_DATASET}.forma_jugador_pro`
+),
+
 Arquetipos AS (
     -- Cluster y arquetipo
     SELECT
         player_id,
+        temporada_anio,
         cluster as arquetipo_id,
         arquetipo_nombre
     FROM `{PROJECT_ID}.{DM_DATASET}.arquetipos_jugadores`
@@ -187,6 +245,39 @@ SELECT
     bs.pct_clearances,
     bs.pct_blocks,
     
+    -- =========================================
+    -- FORMA RECIENTE (últimos 5 / 10 partidos)
+    -- =========================================
+    fo.ultimo_partido,
+    fo.forma5_partidos,
+    fo.forma5_minutos,
+    fo.forma5_rating,
+    fo.forma5_goals_p90,
+    fo.forma5_xG_p90,
+    fo.forma5_xA_p90,
+    fo.forma5_tackles_p90,
+    fo.forma5_saves_p90,
+    fo.forma10_partidos,
+    fo.forma10_minutos,
+    fo.forma10_rating,
+    fo.forma10_goals_p90,
+    fo.forma10_xG_p90,
+    fo.forma10_xA_p90,
+    fo.forma10_tackles_p90,
+    fo.forma10_saves_p90,
+    
+    -- Percentiles de forma (mismo bloque temporada/posición)
+    fo.pct_forma5_rating,
+    fo.pct_forma5_xG,
+    fo.pct_forma5_xA,
+    fo.pct_forma5_tackles,
+    fo.pct_forma5_saves,
+    fo.pct_forma10_rating,
+    fo.pct_forma10_xG,
+    fo.pct_forma10_xA,
+    fo.pct_forma10_tackles,
+    fo.pct_forma10_saves,
+    
     -- =========================================
     -- ARQUETIPO
     -- =========================================
@@ -225,23 +316,67 @@ SELECT
     bs.pct_sweeper
 
 FROM BaseStats bs
+LEFT JOIN Forma fo
+    ON bs.player_id = fo.player_id
+    AND bs.temporada_anio = fo.temporada_anio
 LEFT JOIN Arquetipos arq 
-    ON CAST(bs.player_id AS STRING) = arq.player_id
+    ON bs.player_id = arq.player_id
+    AND bs.temporada_anio = arq.temporada_anio
 LEFT JOIN Proyecciones proy
-    ON CAST(bs.player_id AS STRING) = proy.player_id
+    ON bs.player_id = proy.player_id
 LEFT JOIN Similitudes sim
-    ON CAST(bs.player_id AS STRING) = sim.jugador_origen_id
+    ON bs.player_id = sim.jugador_origen_id
     AND bs.temporada_anio = sim.temporada_origen
 """
 
-def crear_vista():
-    """Crea vista consolidada para el dashboard"""
-    print("🔨 Creando Vista Consolidada para Dashboard (VERSION COMPLETA)")
+def materializar_dashboard(backend):
+    """Reescribe la tabla del dashboard completa (WRITE_TRUNCATE, layout de table_specs.py)."""
+    backend.crear_tabla_desde_query(sql_dashboard(), DASHBOARD_TABLE)
+    print(f"✓ Tabla '{DASHBOARD_TABLE}' materializada. Filas: {backend.num_filas(DASHBOARD_TABLE):,}")
+    print(f"  - Particionada por: temporada_anio")
+    print(f"  - Clustering: player_id, posicion")
+
+
+def actualizar_temporadas_dashboard(backend, temporadas):
+    """
+    Reescribe solo las particiones de las temporadas indicadas
+    (DELETE + INSERT en una transacción). En local se reescribe todo.
+    Solo es correcto si las tablas de modelos no cambiaron desde la
+    última materialización completa.
+    """
+    if backend.nombre == 'local':
+        materializar_dashboard(backend)
+        return
+    
+    script = f"""
+        BEGIN TRANSACTION;
+
+        DELETE FROM `{DASHBOARD_TABLE}`
+        WHERE temporada_anio IN UNNEST(@temporadas);
+
+        INSERT INTO `{DASHBOARD_TABLE}`
+        {sql_dashboard("WHERE temporada_anio IN UNNEST(@temporadas)")};
+
+        COMMIT TRANSACTION;
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("temporadas", "INT64", temporadas)]
+    )
+    backend.query(script, job_config=job_config).result()
+    print(f"✓ Tabla '{DASHBOARD_TABLE}' actualizada: temporadas {', '.join(map(str, temporadas))}")
+
+
+def crear_vista(temporadas=None):
+    """Materializa la tabla del dashboard y recrea la vista sobre ella. Devuelve True si terminó bien."""
+    print("🔨 Materializando Tabla Consolidada para Dashboard (VERSION COMPLETA)")
     print("=" * 70)
     
     try:
-        job = CLIENT.query(sql_view)
-        job.result()
+        if temporadas:
+            actualizar_temporadas_dashboard(BACKEND, temporadas)
+        else:
+            materializar_dashboard(BACKEND)
+        BACKEND.crear_vista(VIEW_ID, f"SELECT * FROM `{DASHBOARD_TABLE}`")
         
         # Verificar resultados
         test_query = f"""
@@ -258,17 +393,17 @@ def crear_vista():
             COUNT(pct_clearances) as jugadores_con_pct_clearances,
             COUNT(pct_blocks) as jugadores_con_pct_blocks
             
-        FROM `{PROJECT_ID}.{DM_DATASET}.v_dashboard_scouting_completo`
+        FROM `{DASHBOARD_TABLE}`
         WHERE temporada_anio = (
             SELECT MAX(temporada_anio) 
             FROM `{PROJECT_ID}.{DM_DATASET}.stats_jugador_temporada_pro`
         )
         """
         
-        result = CLIENT.query(test_query).result()
+        result = BACKEND.query(test_query).result()
         stats = list(result)[0]
         
-        print("✅ Vista creada exitosamente\n")
+        print("✅ Tabla y vista creadas exitosamente\n")
         print(f"📊 Estadísticas (última temporada):")
         print(f"   • Total jugadores:         {stats.total_jugadores:,}")
         print(f"   • Arquetipos únicos:       {stats.arquetipos_unicos}")
@@ -311,7 +446,7 @@ SELECT
     
     arquetipo_nombre
     
-FROM `{PROJECT_ID}.{DM_DATASET}.v_dashboard_scouting_completo`
+FROM `{DASHBOARD_TABLE}`
 WHERE temporada_anio = 2024
   AND posicion = 'Defensor'
   AND total_minutos >= 1000
@@ -352,9 +487,23 @@ ARQUEROS (solo posicion = 'Arquero'):
         print(f"\n" + "="*70)
         print("✨ Vista lista para conectar con Streamlit/Looker/Tableau")
         print("="*70)
+        return True
         
     except Exception as e:
         print(f"❌ Error: {e}")
+        return False
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tabla y vista del dashboard de scouting")
+    parser.add_argument(
+        '--temporadas', nargs='+', type=int, metavar='ANIO',
+        help="Reescribe solo estas temporadas (uso manual, sin cambios en los modelos) en vez de materializar toda la tabla."
+    )
+    return parser.parse_args()
+
 
 if __name__ == '__main__':
-    crear_vista()
\ No newline at end of file
+    args = parse_args()
+    # El DAG (pipeline.py) marca la etapa como ok solo con exit code 0
+    if not crear_vista(args.temporadas):
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,352 @@
+"""
+ÍNDICES DE VECINOS CERCANOS (EXACTO / IVF / LSH)
+El modelo de similitud busca el top-K de cada jugador-temporada dentro de su
+posición. Con una liga alcanza el ball_tree exacto; con varias competiciones
+(100k+ filas por posición) se puede cambiar por un índice aproximado:
+
+  - exacto: NearestNeighbors(ball_tree) de scikit-learn (default).
+  - ivf:    inverted file. KMeans parte el espacio en n_listas celdas y cada
+            consulta busca exacto solo en las n_probe celdas más cercanas.
+  - lsh:    hiperplanos aleatorios. Cada tabla hashea los puntos a un bucket
+            de n_bits; los candidatos son los que comparten bucket en alguna
+            tabla y se re-rankean con la distancia euclidiana exacta.
+
+Todos exponen fit(X) y kneighbors(X, n_neighbors) -> (distances, indices)
+con la misma forma que scikit-learn, así el modelo no cambia según el índice.
+Si un método aproximado no junta n_neighbors candidatos para una consulta,
+esa consulta se resuelve por fuerza bruta.
+
+Benchmark (recall@5 contra el exacto + tiempos de build y query):
+    python src/ann_index.py --n 100000
+    python src/ann_index.py --snapshot snapshot.parquet --posicion Defensor
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import NearestNeighbors
+
+INDICES = ['exacto', 'ivf', 'lsh']
+
+# Tamaño de bloque para la fuerza bruta (filas de consulta por iteración)
+BLOQUE_CONSULTAS = 2048
+
+
+def crear_indice(tipo='exacto', **params):
+    """Crea un índice por nombre ('exacto' | 'ivf' | 'lsh')."""
+    if tipo == 'exacto':
+        return IndiceExacto(**params)
+    if tipo == 'ivf':
+        return IndiceIVF(**params)
+    if tipo == 'lsh':
+        return IndiceLSH(**params)
+    raise ValueError(f"Índice desconocido: {tipo!r} (usar {', '.join(INDICES)})")
+
+
+# ============================================================================
+# UTILIDADES
+# ============================================================================
+
+def _distancias(consultas, puntos, normas_puntos=None):
+    """Matriz de distancias euclidianas (consultas x puntos)."""
+    if normas_puntos is None:
+        normas_puntos = np.einsum('ij,ij->i', puntos, puntos)
+    d2 = np.einsum('ij,ij->i', consultas, consultas)[:, None] - 2 * consultas @ puntos.T + normas_puntos
+    return np.sqrt(np.maximum(d2, 0))
+
+
+def _fusionar_topk(mejores_d, mejores_i, filas, d_cand, i_cand, k):
+    """
+    Fusiona candidatos nuevos en el top-k de las filas indicadas. Un mismo
+    punto puede llegar desde varias celdas/tablas: los duplicados se descartan.
+    """
+    d = np.concatenate([mejores_d[filas], d_cand], axis=1)
+    i = np.concatenate([mejores_i[filas], i_cand], axis=1)
+
+    # Orden por (distancia, índice): los duplicados quedan contiguos
+    orden = _lexsort_filas(d, i)
+    d = np.take_along_axis(d, orden, axis=1)
+    i = np.take_along_axis(i, orden, axis=1)
+    duplicado = np.zeros(i.shape, dtype=bool)
+    duplicado[:, 1:] = (i[:, 1:] == i[:, :-1]) & (i[:, 1:] >= 0)
+    d[duplicado] = np.inf
+
+    orden = np.argsort(d, axis=1, kind='stable')[:, :k]
+    mejores_d[filas] = np.take_along_axis(d, orden, axis=1)
+    mejores_i[filas] = np.take_along_axis(np.where(duplicado, -1, i), orden, axis=1)
+
+
+def _lexsort_filas(d, i):
+    """argsort por fila con clave primaria d y secundaria i."""
+    orden = np.argsort(i, axis=1, kind='stable')
+    d_ordenado = np.take_along_axis(d, orden, axis=1)
+    return np.take_along_axis(orden, np.argsort(d_ordenado, axis=1, kind='stable'), axis=1)
+
+
+def _fuerza_bruta(consultas, puntos, k):
+    """Top-k exacto por bloques de consultas (sin índice)."""
+    normas = np.einsum('ij,ij->i', puntos, puntos)
+    distancias = np.empty((len(consultas), k))
+    indices = np.empty((len(consultas), k), dtype=np.int64)
+    for inicio in range(0, len(consultas), BLOQUE_CONSULTAS):
+        bloque = slice(inicio, inicio + BLOQUE_CONSULTAS)
+        d = _distancias(consultas[bloque], puntos, normas)
+        top = np.argpartition(d, k - 1, axis=1)[:, :k] if k < d.shape[1] else np.tile(np.arange(d.shape[1]), (len(d), 1))
+        d_top = np.take_along_axis(d, top, axis=1)
+        orden = np.argsort(d_top, axis=1, kind='stable')
+        distancias[bloque] = np.take_along_axis(d_top, orden, axis=1)
+        indices[bloque] = np.take_along_axis(top, orden, axis=1)
+    return distancias, indices
+
+
+def _completar_faltantes(consultas, puntos, distancias, indices, k):
+    """Consultas con menos de k candidatos: se resuelven por fuerza bruta."""
+    faltantes = np.flatnonzero((indices < 0).any(axis=1))
+    if len(faltantes):
+        distancias[faltantes], indices[faltantes] = _fuerza_bruta(consultas[faltantes], puntos, k)
+    return distancias, indices
+
+
+# ============================================================================
+# ÍNDICES
+# ============================================================================
+
+class IndiceExacto:
+    """KNN exacto de scikit-learn (comportamiento histórico del modelo)."""
+
+    nombre = 'exacto'
+
+    def __init__(self, algorithm='ball_tree'):
+        self.algorithm = algorithm
+
+    def fit(self, X):
+        self._knn = NearestNeighbors(algorithm=self.algorithm).fit(X)
+        return self
+
+    def kneighbors(self, X, n_neighbors):
+        return self._knn.kneighbors(X, n_neighbors=n_neighbors)
+
+
+class IndiceIVF:
+    """
+    Inverted file: n_listas celdas KMeans (default ~sqrt(n)); cada consulta
+    busca exacto en las n_probe celdas cuyo centroide está más cerca.
+    """
+
+    nombre = 'ivf'
+
+    def __init__(self, n_listas=None, n_probe=8, random_state=42):
+        self.n_listas = n_listas
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        self._X_original = X
+        n_listas = self.n_listas or int(np.sqrt(len(X)))
+        n_listas = max(1, min(n_listas, len(X)))
+        kmeans = MiniBatchKMeans(
+            n_clusters=n_listas, batch_size=4096, n_init=3, random_state=self.random_state
+        ).fit(X)
+        self.centroides = kmeans.cluster_centers_
+
+        # Puntos agrupados por celda: cada lista es un slice contiguo
+        etiquetas = kmeans.labels_
+        self._orden = np.argsort(etiquetas, kind='stable')
+        self._X = X[self._orden]
+        self._normas = np.einsum('ij,ij->i', self._X, self._X)
+        self._limites = np.searchsorted(etiquetas[self._orden], np.arange(n_listas + 1))
+        return self
+
+    def kneighbors(self, X, n_neighbors):
+        X = np.asarray(X, dtype=np.float64)
+        k = n_neighbors
+        n_probe = min(self.n_probe, len(self.centroides))
+
+        # Celdas a visitar por consulta
+        d_centroides = _distancias(X, self.centroides)
+        sondas = np.argpartition(d_centroides, n_probe - 1, axis=1)[:, :n_probe] \
+            if n_probe < len(self.centroides) else np.tile(np.arange(len(self.centroides)), (len(X), 1))
+
+        mejores_d = np.full((len(X), k), np.inf)
+        mejores_i = np.full((len(X), k), -1, dtype=np.int64)
+
+        # Una iteración por celda: todas sus consultas contra todos sus puntos
+        consultas_por_celda = np.argsort(sondas.ravel(), kind='stable')
+        celdas = sondas.ravel()[consultas_por_celda]
+        filas = consultas_por_celda // n_probe
+        cortes = np.searchsorted(celdas, np.arange(len(self.centroides) + 1))
+        for celda in range(len(self.centroides)):
+            q = filas[cortes[celda]:cortes[celda + 1]]
+            a, b = self._limites[celda], self._limites[celda + 1]
+            if len(q) == 0 or a == b:
+                continue
+            d = _distancias(X[q], self._X[a:b], self._normas[a:b])
+            i = np.broadcast_to(self._orden[a:b], d.shape)
+            if d.shape[1] > k:
+                top = np.argpartition(d, k - 1, axis=1)[:, :k]
+                d, i = np.take_along_axis(d, top, axis=1), np.take_along_axis(i, top, axis=1)
+            _fusionar_topk(mejores_d, mejores_i, q, d, i, k)
+
+        return _completar_faltantes(X, self._X_original, mejores_d, mejores_i, k)
+
+
+class IndiceLSH:
+    """
+    LSH por hiperplanos aleatorios: n_tablas tablas de n_bits bits. Candidatos
+    = puntos en el mismo bucket que la consulta en alguna tabla.
+    """
+
+    nombre = 'lsh'
+
+    def __init__(self, n_tablas=8, n_bits=None, random_state=42):
+        self.n_tablas = n_tablas
+        self.n_bits = n_bits
+        self.random_state = random_state
+
+    def _codigos(self, X):
+        """Código entero del bucket de cada fila en cada tabla (n x n_tablas)."""
+        signos = np.einsum('nd,tbd->ntb', X - self._centro, self._planos) > 0
+        return signos @ (1 << np.arange(self._n_bits, dtype=np.int64))
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        # ~8-16 puntos por bucket en promedio
+        self._n_bits = self.n_bits or int(np.clip(np.log2(max(len(X), 2) / 8), 1, 20))
+        rng = np.random.default_rng(self.random_state)
+        self._planos = rng.standard_normal((self.n_tablas, self._n_bits, X.shape[1]))
+        self._centro = X.mean(axis=0)
+        self._X = X
+        self._normas = np.einsum('ij,ij->i', X, X)
+
+        codigos = self._codigos(X)
+        self._tablas = []
+        for t in range(self.n_tablas):
+            orden = np.argsort(codigos[:, t], kind='stable')
+            self._tablas.append((orden, codigos[orden, t]))
+        return self
+
+    def kneighbors(self, X, n_neighbors):
+        X = np.asarray(X, dtype=np.float64)
+        k = n_neighbors
+        mejores_d = np.full((len(X), k), np.inf)
+        mejores_i = np.full((len(X), k), -1, dtype=np.int64)
+
+        codigos = self._codigos(X)
+        for t, (orden, codigos_tabla) in enumerate(self._tablas):
+            # Consultas agrupadas por bucket: una iteración por bucket distinto
+            buckets, inversa = np.unique(codigos[:, t], return_inverse=True)
+            por_bucket = np.argsort(inversa, kind='stable')
+            cortes = np.searchsorted(inversa[por_bucket], np.arange(len(buckets) + 1))
+            inicios = np.searchsorted(codigos_tabla, buckets, side='left')
+            finales = np.searchsorted(codigos_tabla, buckets, side='right')
+            for b in range(len(buckets)):
+                a, z = inicios[b], finales[b]
+                if a == z:
+                    continue
+                q = por_bucket[cortes[b]:cortes[b + 1]]
+                puntos = orden[a:z]
+                d = _distancias(X[q], self._X[puntos], self._normas[puntos])
+                i = np.broadcast_to(puntos, d.shape)
+                if d.shape[1] > k:
+                    top = np.argpartition(d, k - 1, axis=1)[:, :k]
+                    d, i = np.take_along_axis(d, top, axis=1), np.take_along_axis(i, top, axis=1)
+                _fusionar_topk(mejores_d, mejores_i, q, d, i, k)
+
+        return _completar_faltantes(X, self._X, mejores_d, mejores_i, k)
+
+
+# ============================================================================
+# EVALUACIÓN
+# ============================================================================
+
+def recall_at_k(indices_aprox, indices_exactos, k=5):
+    """
+    Fracción de los k vecinos exactos (sin contar el propio jugador, columna 0)
+    que también devuelve el índice aproximado.
+    """
+    aprox = indices_aprox[:, 1:k + 1]
+    exacto = indices_exactos[:, 1:k + 1]
+    aciertos = (aprox[:, :, None] == exacto[:, None, :]).any(axis=2).sum()
+    return aciertos / exacto.size
+
+
+def evaluar_indice(tipo, X, k=5, params=None, exacto=None):
+    """
+    Construye el índice, consulta todo X y mide recall@k contra el exacto.
+
+    Returns:
+        dict con tipo, build_s, query_s, recall y los (distances, indices).
+    """
+    inicio = time.perf_counter()
+    indice = crear_indice(tipo, **(params or {})).fit(X)
+    build_s = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    distancias, indices = indice.kneighbors(X, k + 1)
+    query_s = time.perf_counter() - inicio
+
+    recall = recall_at_k(indices, exacto, k) if exacto is not None else 1.0
+    return {'tipo': tipo, 'build_s': build_s, 'query_s': query_s, 'recall': recall,
+            'distances': distancias, 'indices': indices}
+
+
+def recall_muestra(X, indices, k=5, muestra=1000, random_state=42):
+    """recall@k de un índice ya consultado, contra fuerza bruta sobre una muestra de filas."""
+    rng = np.random.default_rng(random_state)
+    filas = rng.choice(len(X), size=min(muestra, len(X)), replace=False)
+    _, exactos = _fuerza_bruta(np.asarray(X, dtype=np.float64)[filas], np.asarray(X, dtype=np.float64), k + 1)
+    return recall_at_k(indices[filas], exactos, k)
+
+
+def datos_sinteticos(n, dim, n_grupos=50, random_state=42):
+    """Mezcla de gaussianas (perfiles de jugador agrupados) para el benchmark."""
+    rng = np.random.default_rng(random_state)
+    centros = rng.standard_normal((n_grupos, dim)) * 3
+    grupos = rng.integers(0, n_grupos, n)
+    return centros[grupos] + rng.standard_normal((n, dim))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de índices de vecinos: recall@k y tiempos")
+    parser.add_argument('--n', type=int, default=100000, help="Filas sintéticas (default 100000).")
+    parser.add_argument('--dim', type=int, default=9, help="Dimensiones sintéticas (default 9, como Arquero).")
+    parser.add_argument('--k', type=int, default=5, help="Vecinos a evaluar (default 5, el top-5 del modelo).")
+    parser.add_argument('--snapshot', metavar='PARQUET', help="Usa un snapshot del datamart en vez de datos sintéticos.")
+    parser.add_argument('--posicion', default='Defensor', help="Posición del snapshot a evaluar.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.snapshot:
+        import pandas as pd
+        from sklearn.preprocessing import StandardScaler
+        import importlib
+        modelo = importlib.import_module('4_run_scouting_model_final')
+        config = modelo.FEATURE_SETS[args.posicion]
+        df = pd.read_parquet(args.snapshot)
+        df = df[(df['posicion'] == args.posicion) & df[config['primary']].notna().all(axis=1)]
+        X = StandardScaler().fit_transform(df[config['primary']].astype(float))
+        origen = f"{args.snapshot} ({args.posicion})"
+    else:
+        X = datos_sinteticos(args.n, args.dim)
+        origen = "sintético"
+
+    print("="*70)
+    print(f"📐 BENCHMARK ÍNDICES KNN | {origen} | {X.shape[0]:,} filas x {X.shape[1]} dims | k={args.k}")
+    print("="*70)
+
+    exacto = evaluar_indice('exacto', X, args.k)
+    resultados = [exacto] + [
+        evaluar_indice(tipo, X, args.k, exacto=exacto['indices']) for tipo in INDICES if tipo != 'exacto'
+    ]
+
+    print(f"\n  {'Índice':<8} {'Build':>9} {'Query':>9} {'Total':>9} {f'Recall@{args.k}':>10}")
+    print(f"  {'-'*8} {'-'*9} {'-'*9} {'-'*9} {'-'*10}")
+    for r in resultados:
+        total = r['build_s'] + r['query_s']
+        print(f"  {r['tipo']:<8} {r['build_s']:>8.2f}s {r['query_s']:>8.2f}s {total:>8.2f}s {r['recall']:>10.3f}")
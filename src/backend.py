@@ -0,0 +1,318 @@
+"""
+BACKENDS DE EJECUCIÓN
+Permite correr el pipeline 0→5 contra BigQuery (producción) o contra un
+motor SQL embebido (DuckDB) sobre archivos Parquet locales.
+
+Selección por variables de entorno:
+    SCOUTING_BACKEND=bigquery|local   (default: bigquery)
+    SCOUTING_LOCAL_DIR=data_local     (directorio de las tablas locales)
+
+El particionado y clustering de cada tabla salen de table_specs.py.
+
+En modo local cada tabla vive en <dir>/<dataset>/<tabla>.parquet y cada
+vista en <dir>/<dataset>/<vista>.view.sql. El SQL de las etapas se escribe
+en dialecto BigQuery; LocalBackend traduce lo mínimo para DuckDB
+(identificadores con backticks, r'...', SAFE_DIVIDE, * EXCEPT, orden de NULLs,
+UNNEST(...) AS alias y arr[OFFSET(n)]).
+
+Ambos backends exponen query(sql).result() / .to_dataframe() como el
+cliente de BigQuery, así el código de consulta no cambia entre uno y otro.
+"""
+
+import os
+import re
+from collections import namedtuple
+from pathlib import Path
+
+try:
+    from table_specs import columnas_orden, ddl_layout, layout_coincide, opciones_bigquery
+except ImportError:  # importado como src.backend (dashboard)
+    from .table_specs import columnas_orden, ddl_layout, layout_coincide, opciones_bigquery
+
+PROJECT_ID = "proyecto-scouting-futbol"
+BACKEND = os.environ.get("SCOUTING_BACKEND", "bigquery")
+LOCAL_DIR = os.environ.get("SCOUTING_LOCAL_DIR", "data_local")
+
+
+def crear_backend(nombre=None, project=PROJECT_ID, directorio=None):
+    """
+    Crea el backend configurado (argumento > variable de entorno > bigquery).
+    """
+    nombre = nombre or BACKEND
+    if nombre == "local":
+        return LocalBackend(directorio or LOCAL_DIR)
+    if nombre == "bigquery":
+        return BigQueryBackend(project)
+    raise ValueError(f"Backend desconocido: {nombre!r} (usar 'bigquery' o 'local')")
+
+
+def _separar_table_id(table_id):
+    """'proyecto.dataset.tabla' o 'dataset.tabla' -> (dataset, tabla)"""
+    partes = table_id.strip("`").split(".")
+    return partes[-2], partes[-1]
+
+
+# ============================================================================
+# BIGQUERY
+# ============================================================================
+
+class BigQueryBackend:
+    """Backend de producción: delega en google.cloud.bigquery."""
+
+    nombre = "bigquery"
+
+    def __init__(self, project=PROJECT_ID, client=None):
+        from google.cloud import bigquery
+        self._bq = bigquery
+        self.project = project
+        self.client = client or bigquery.Client(project=project)
+
+    def query(self, sql, job_config=None):
+        return self.client.query(sql, job_config=job_config)
+
+    def query_df(self, sql):
+        return self.client.query(sql).to_dataframe()
+
+    def existe(self, table_id):
+        from google.cloud.exceptions import NotFound
+        try:
+            self.client.get_table(table_id)
+            return True
+        except NotFound:
+            return False
+
+    def num_filas(self, table_id):
+        return self.client.get_table(table_id).num_rows
+
+    def firma(self, table_id):
+        """Firma de la versión actual de la tabla (None si no existe)."""
+        from google.cloud.exceptions import NotFound
+        try:
+            table = self.client.get_table(table_id)
+        except NotFound:
+            return None
+        return f"{table.modified.isoformat()}|{table.num_rows}|{table.num_bytes}"
+
+    def crear_dataset(self, dataset, location):
+        dataset_ref = self._bq.Dataset(f"{self.project}.{dataset}")
+        dataset_ref.location = location
+        self.client.create_dataset(dataset_ref, exists_ok=True, timeout=30)
+
+    def layout_desactualizado(self, table_id):
+        """True si la tabla existe con un particionado/clustering distinto al de su spec."""
+        from google.cloud.exceptions import NotFound
+        try:
+            table = self.client.get_table(table_id)
+        except NotFound:
+            return False
+        return not layout_coincide(table, table_id)
+
+    def _reemplazar_con_layout(self, sql, table_id):
+        """
+        WRITE_TRUNCATE no puede cambiar el particionado. CREATE OR REPLACE sí,
+        y es atómico: si el SELECT falla la tabla anterior queda intacta.
+        """
+        print(f"⚠️  '{table_id}' tiene otro particionado/clustering: se recrea según table_specs")
+        self.client.query(f"CREATE OR REPLACE TABLE `{table_id}`\n{ddl_layout(table_id)}\nAS {sql}").result()
+
+    def crear_tabla_desde_query(self, sql, table_id):
+        """Materializa un SELECT en table_id (WRITE_TRUNCATE) con el layout de su spec."""
+        if self.layout_desactualizado(table_id):
+            self._reemplazar_con_layout(sql, table_id)
+            return
+        job_config = self._bq.QueryJobConfig(
+            destination=table_id,
+            write_disposition='WRITE_TRUNCATE',
+            **opciones_bigquery(table_id),
+        )
+        self.client.query(sql, job_config=job_config).result()
+
+    def cargar_dataframe(self, df, table_id, schema=None):
+        """Sube un DataFrame a table_id (WRITE_TRUNCATE) con el layout de su spec."""
+        if self.layout_desactualizado(table_id):
+            # Se carga a una tabla staging y se reemplaza recién cuando la carga terminó bien
+            staging_id = f"{table_id}_carga"
+            job_config = self._bq.LoadJobConfig(schema=schema, write_disposition="WRITE_TRUNCATE")
+            try:
+                self.client.load_table_from_dataframe(df, staging_id, job_config=job_config).result()
+                self._reemplazar_con_layout(f"SELECT * FROM `{staging_id}`", table_id)
+            finally:
+                self.client.delete_table(staging_id, not_found_ok=True)
+            return
+        job_config = self._bq.LoadJobConfig(
+            schema=schema,
+            write_disposition="WRITE_TRUNCATE",
+            **opciones_bigquery(table_id),
+        )
+        self.client.load_table_from_dataframe(df, table_id, job_config=job_config).result()
+
+    def crear_vista(self, view_id, sql):
+        self.client.query(f"CREATE OR REPLACE VIEW `{view_id}` AS\n{sql}").result()
+
+
+# ============================================================================
+# LOCAL (DuckDB sobre Parquet)
+# ============================================================================
+
+class _ResultadoLocal:
+    """Imita lo que el código usa de un QueryJob de BigQuery."""
+
+    def __init__(self, df):
+        self._df = df
+
+    def result(self):
+        Fila = namedtuple("Fila", self._df.columns, rename=True)
+        return [Fila(*valores) for valores in self._df.itertuples(index=False, name=None)]
+
+    def to_dataframe(self):
+        return self._df
+
+
+class LocalBackend:
+    """Backend local: DuckDB en memoria con las tablas Parquet de un directorio."""
+
+    nombre = "local"
+
+    def __init__(self, directorio=LOCAL_DIR):
+        import duckdb
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.con = duckdb.connect()
+        self._preparar_dialecto()
+        self._registrar_tablas()
+
+    # --- Dialecto ---
+
+    def _preparar_dialecto(self):
+        # BigQuery: NULLS FIRST en ASC y NULLS LAST en DESC (afecta PERCENT_RANK)
+        self.con.execute("SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+        self.con.execute("CREATE TYPE FLOAT64 AS DOUBLE")
+        self.con.execute("CREATE MACRO SAFE_DIVIDE(a, b) AS CASE WHEN b = 0 THEN NULL ELSE a / b END")
+        # BigQuery devuelve NULL si no hay match; DuckDB devuelve ''
+        self.con.execute("CREATE MACRO REGEXP_EXTRACT_BQ(s, p) AS NULLIF(regexp_extract(s, p), '')")
+
+    @staticmethod
+    def traducir(sql):
+        """Traduce las construcciones BigQuery que usa el pipeline a DuckDB."""
+        # `proyecto.dataset.tabla` / `dataset.tabla` -> dataset.tabla
+        sql = re.sub(r"`(?:[\w-]+\.)?(\w+)\.(\w+)`", r"\1.\2", sql)
+        # r'...' -> '...'
+        sql = re.sub(r"\br'", "'", sql)
+        sql = re.sub(r"\bREGEXP_EXTRACT\(", "REGEXP_EXTRACT_BQ(", sql, flags=re.IGNORECASE)
+        sql = re.sub(r"\*\s+EXCEPT\s*\(", "* EXCLUDE (", sql, flags=re.IGNORECASE)
+        # FROM t, UNNEST(arr) AS x -> unnest(arr) AS _unnest_x(x) (x queda como columna struct)
+        sql = re.sub(r"\bUNNEST\(([^()]+)\)\s+AS\s+(\w+)\b(?!\s*\()", r"unnest(\1) AS _unnest_\2(\2)",
+                     sql, flags=re.IGNORECASE)
+        # arr[OFFSET(n)] / arr[SAFE_OFFSET(n)] -> arr[n+1] (DuckDB indexa desde 1 y da NULL fuera de rango)
+        sql = re.sub(r"\[\s*(?:SAFE_)?OFFSET\((\d+)\)\s*\]", lambda m: f"[{int(m.group(1)) + 1}]",
+                     sql, flags=re.IGNORECASE)
+        return sql
+
+    # --- Catálogo ---
+
+    def _ruta_tabla(self, table_id):
+        dataset, tabla = _separar_table_id(table_id)
+        return self.directorio / dataset / f"{tabla}.parquet"
+
+    def _ruta_vista(self, view_id):
+        dataset, vista = _separar_table_id(view_id)
+        return self.directorio / dataset / f"{vista}.view.sql"
+
+    def _registrar_tabla(self, dataset, tabla, ruta):
+        self.con.execute(f"CREATE SCHEMA IF NOT EXISTS {dataset}")
+        self.con.execute(
+            f"CREATE OR REPLACE VIEW {dataset}.{tabla} AS SELECT * FROM read_parquet('{ruta.as_posix()}')"
+        )
+
+    def _registrar_tablas(self):
+        """Expone cada Parquet como dataset.tabla y recrea las vistas guardadas."""
+        for ruta in sorted(self.directorio.glob("*/*.parquet")):
+            self._registrar_tabla(ruta.parent.name, ruta.stem, ruta)
+
+        # Las vistas pueden depender de otras vistas: se reintenta hasta que no haya avance
+        pendientes = sorted(self.directorio.glob("*/*.view.sql"))
+        while pendientes:
+            fallidas = []
+            for ruta in pendientes:
+                self.con.execute(f"CREATE SCHEMA IF NOT EXISTS {ruta.parent.name}")
+                try:
+                    self.con.execute(ruta.read_text(encoding="utf-8"))
+                except Exception:
+                    fallidas.append(ruta)
+            if len(fallidas) == len(pendientes):
+                break
+            pendientes = fallidas
+
+    # --- API común ---
+
+    def query(self, sql, job_config=None):
+        return _ResultadoLocal(self.con.execute(self.traducir(sql)).df(date_as_object=True))
+
+    def query_df(self, sql):
+        return self.con.execute(self.traducir(sql)).df(date_as_object=True)
+
+    def existe(self, table_id):
+        return self._ruta_tabla(table_id).exists() or self._ruta_vista(table_id).exists()
+
+    def num_filas(self, table_id):
+        dataset, tabla = _separar_table_id(table_id)
+        return self.con.execute(f"SELECT COUNT(*) FROM {dataset}.{tabla}").fetchone()[0]
+
+    def firma(self, table_id):
+        """Firma de la versión actual de la tabla (None si no existe)."""
+        for ruta in (self._ruta_tabla(table_id), self._ruta_vista(table_id)):
+            if ruta.exists():
+                stat = ruta.stat()
+                return f"{stat.st_mtime_ns}|{stat.st_size}"
+        return None
+
+    def layout_desactualizado(self, table_id):
+        """En local no hay particiones: el orden del Parquet se fija al escribir."""
+        return False
+
+    def crear_dataset(self, dataset, location=None):
+        (self.directorio / dataset).mkdir(parents=True, exist_ok=True)
+        self.con.execute(f"CREATE SCHEMA IF NOT EXISTS {dataset}")
+
+    def _escribir_parquet(self, select_sql, table_id):
+        """
+        COPY a un temporal y reemplazo atómico del Parquet de la tabla. Se
+        ordena por las columnas de partición/clustering de su spec para que
+        las estadísticas por row group permitan saltear bloques al filtrar
+        (solo las que trae el SELECT: las tablas con formato anterior no las tienen).
+        """
+        ruta = self._ruta_tabla(table_id)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(".parquet.tmp")
+        columnas = {fila[0] for fila in self.con.execute(f"DESCRIBE {select_sql}").fetchall()}
+        orden = [c for c in columnas_orden(table_id) if c in columnas]
+        if orden:
+            select_sql = f"SELECT * FROM ({select_sql}) ORDER BY {', '.join(orden)}"
+        self.con.execute(f"COPY ({select_sql}) TO '{tmp.as_posix()}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+        os.replace(tmp, ruta)
+        dataset, tabla = _separar_table_id(table_id)
+        self._registrar_tabla(dataset, tabla, ruta)
+
+    def crear_tabla_desde_query(self, sql, table_id):
+        """Materializa un SELECT en table_id."""
+        self._escribir_parquet(self.traducir(sql), table_id)
+
+    def cargar_dataframe(self, df, table_id, schema=None):
+        self.con.register("_df_carga", df)
+        try:
+            self._escribir_parquet("SELECT * FROM _df_carga", table_id)
+        finally:
+            self.con.unregister("_df_carga")
+
+    def cargar_parquet(self, parquet_path, table_id):
+        """Reemplaza table_id con el contenido de un Parquet ya generado."""
+        self._escribir_parquet(f"SELECT * FROM read_parquet('{Path(parquet_path).as_posix()}')", table_id)
+
+    def crear_vista(self, view_id, sql):
+        dataset, vista = _separar_table_id(view_id)
+        ddl = f"CREATE OR REPLACE VIEW {dataset}.{vista} AS\n{self.traducir(sql)}"
+        self.con.execute(f"CREATE SCHEMA IF NOT EXISTS {dataset}")
+        self.con.execute(ddl)
+        ruta = self._ruta_vista(view_id)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_text(ddl, encoding="utf-8")
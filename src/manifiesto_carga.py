@@ -0,0 +1,190 @@
+"""
+MANIFIESTO DE CARGA
+Registra la huella (tamaño, generación, hash de contenido) de cada archivo
+fuente junto con la última fecha cargada. Si la fuente no cambió desde la
+última carga exitosa, el loader corta en milisegundos sin tocar BigQuery.
+
+El manifiesto es un JSON que puede vivir en GCS (gs://bucket/ruta.json)
+o en el filesystem local (útil para pruebas).
+"""
+
+import base64
+import hashlib
+import json
+import os
+from datetime import datetime
+
+CHUNK_HASH = 8 * 1024 * 1024
+
+
+def _es_gcs(uri):
+    return uri.startswith("gs://")
+
+
+def _separar_uri_gcs(uri):
+    bucket_name, _, blob_name = uri[len("gs://"):].partition("/")
+    return bucket_name, blob_name
+
+
+def _blob(uri, project=None):
+    from google.cloud import storage
+    bucket_name, blob_name = _separar_uri_gcs(uri)
+    return storage.Client(project=project).bucket(bucket_name).blob(blob_name)
+
+
+# ============================================================================
+# HUELLAS DE ARCHIVOS FUENTE
+# ============================================================================
+
+def huella_blob_gcs(uri, project=None):
+    """
+    Huella de un blob de GCS a partir de su metadata (sin descargarlo).
+    Usa el MD5 del objeto y, si no existe (objetos compuestos), el CRC32C.
+
+    Returns:
+        dict con uri, size, generation y hash, o None si el blob no existe.
+    """
+    blob = _blob(uri, project)
+    if not blob.exists():
+        return None
+    blob.reload()
+    return huella_desde_blob(blob)
+
+
+def huella_desde_blob(blob):
+    """
+    Huella a partir de un Blob que ya trae su metadata (p.ej. de list_blobs),
+    sin requests adicionales.
+    """
+    return {
+        'uri': f"gs://{blob.bucket.name}/{blob.name}",
+        'size': int(blob.size),
+        'generation': str(blob.generation),
+        'hash': f"md5:{blob.md5_hash}" if blob.md5_hash else f"crc32c:{blob.crc32c}",
+    }
+
+
+def huella_archivo_local(path):
+    """
+    Huella de un archivo local. El MD5 se calcula por bloques y en base64,
+    igual que el md5_hash de GCS, para que ambas huellas sean comparables.
+    Solo depende del contenido: la generación es el mismo hash (no el mtime),
+    así un touch o una copia del archivo no disparan una recarga.
+    """
+    if not os.path.exists(path):
+        return None
+
+    md5 = hashlib.md5()
+    with open(path, 'rb') as fh:
+        for bloque in iter(lambda: fh.read(CHUNK_HASH), b""):
+            md5.update(bloque)
+
+    hash_contenido = f"md5:{base64.b64encode(md5.digest()).decode()}"
+    return {
+        'uri': os.path.abspath(path),
+        'size': os.path.getsize(path),
+        'generation': hash_contenido,
+        'hash': hash_contenido,
+    }
+
+
+def huella_fuente(uri, project=None):
+    """Huella de una fuente GCS o local según el prefijo de la URI."""
+    if _es_gcs(uri):
+        return huella_blob_gcs(uri, project)
+    return huella_archivo_local(uri)
+
+
+# ============================================================================
+# LECTURA / ESCRITURA DEL MANIFIESTO
+# ============================================================================
+
+def leer_manifiesto(destino, project=None):
+    """
+    Lee el manifiesto desde GCS o disco. Si no existe devuelve uno vacío.
+    """
+    if _es_gcs(destino):
+        blob = _blob(destino, project)
+        if not blob.exists():
+            return {'fuentes': {}}
+        return json.loads(blob.download_as_text())
+
+    if not os.path.exists(destino):
+        return {'fuentes': {}}
+    with open(destino, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def guardar_manifiesto(destino, manifiesto, project=None):
+    """
+    Persiste el manifiesto. En disco se escribe a un temporal y se renombra
+    para no dejar un JSON a medio escribir si el proceso se corta.
+    """
+    contenido = json.dumps(manifiesto, indent=2, sort_keys=True, default=str)
+
+    if _es_gcs(destino):
+        _blob(destino, project).upload_from_string(contenido, content_type='application/json')
+        return
+
+    directorio = os.path.dirname(os.path.abspath(destino))
+    os.makedirs(directorio, exist_ok=True)
+    tmp_path = f"{destino}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        fh.write(contenido)
+    os.replace(tmp_path, destino)
+
+
+def fuente_sin_cambios(manifiesto, huella):
+    """
+    True si la huella coincide con la registrada en la última carga exitosa.
+    """
+    registro = manifiesto.get('fuentes', {}).get(huella['uri'])
+    if not registro:
+        return False
+    return all(registro.get(k) == huella[k] for k in ('size', 'generation', 'hash'))
+
+
+def registrar_carga(manifiesto, huella, ultima_fecha):
+    """
+    Registra en el manifiesto (en memoria) una carga exitosa de la fuente.
+    """
+    manifiesto.setdefault('fuentes', {})[huella['uri']] = {
+        **huella,
+        'ultima_fecha': str(ultima_fecha) if ultima_fecha else None,
+        'cargado_en': datetime.now().isoformat(timespec='seconds'),
+    }
+    return manifiesto
+
+
+# ============================================================================
+# FECHAS PENDIENTES POR ETAPA
+# Cada etapa aguas abajo (dwh, datamart, ...) tiene una cola con las fechas
+# que el paso anterior tocó. 'completo' indica que hay que reconstruir todo
+# (p.ej. tras una carga completa o una carga CSV sin delta conocido).
+# ============================================================================
+
+def encolar_fechas(manifiesto, etapa, fechas, completo=False):
+    """
+    Agrega fechas a la cola de una etapa (en memoria).
+    """
+    cola = manifiesto.setdefault('pendientes', {}).setdefault(etapa, {'fechas': [], 'completo': False})
+    cola['fechas'] = sorted(set(cola['fechas']) | {str(f) for f in fechas})
+    cola['completo'] = cola['completo'] or completo
+    return manifiesto
+
+
+def fechas_pendientes(manifiesto, etapa):
+    """
+    Returns:
+        (lista de fechas ISO pendientes, True si hay que reconstruir completo)
+    """
+    cola = manifiesto.get('pendientes', {}).get(etapa) or {'fechas': [], 'completo': False}
+    return list(cola['fechas']), bool(cola['completo'])
+
+
+def vaciar_pendientes(manifiesto, etapa):
+    """
+    Marca como procesada la cola de una etapa (en memoria).
+    """
+    manifiesto.setdefault('pendientes', {})[etapa] = {'fechas': [], 'completo': False}
+    return manifiesto
@@ -0,0 +1,109 @@
+"""
+MIGRACIÓN ÚNICA - CLAVES STRING → INT64
+Las tablas de modelos se escribían con player_id / jugador_*_id como STRING y
+la vista del dashboard los unía con CAST(... AS STRING), lo que anula el
+clustering y el pruning. Desde esta versión el script 4 escribe INT64; este
+script convierte las tablas existentes sin esperar a la próxima corrida de
+modelos y les aplica el particionado/clustering de table_specs.py.
+
+Es idempotente: las tablas que ya tienen las claves en INT64 se omiten.
+Las tablas con el formato anterior a table_specs.py (p.ej. arquetipos de una
+sola temporada, sin temporada_anio) se migran sin particionar: la próxima
+corrida del script 4 las recrea con el layout.
+CREATE OR REPLACE es atómico: si algún valor no es numérico el CAST falla y
+la tabla queda como estaba.
+
+Uso:
+    python src/migrar_claves_int64.py            # migra
+    python src/migrar_claves_int64.py --dry-run  # solo muestra el SQL
+"""
+
+import argparse
+
+from backend import crear_backend
+from table_specs import columnas_orden, ddl_layout
+
+# --- CONFIGURACIÓN ---
+PROJECT_ID = "proyecto-scouting-futbol"
+DM_DATASET = "dm_scouting"
+
+# tabla -> claves a convertir
+TABLAS = {
+    f"{PROJECT_ID}.{DM_DATASET}.scouting_similitud_pro_v2": ['jugador_origen_id', 'jugador_similar_id'],
+    f"{PROJECT_ID}.{DM_DATASET}.proyecciones_valor": ['player_id'],
+    f"{PROJECT_ID}.{DM_DATASET}.arquetipos_jugadores": ['player_id'],
+}
+
+
+def tipos_columnas(backend, table_id):
+    """Columna -> tipo de la tabla existente."""
+    if backend.nombre == 'local':
+        columnas = backend.query_df(f"DESCRIBE SELECT * FROM `{table_id}`")
+        return dict(zip(columnas['column_name'], columnas['column_type']))
+
+    table = backend.client.get_table(table_id)
+    return {f.name: f.field_type for f in table.schema}
+
+
+def claves_string(tipos, claves):
+    """Claves de la tabla que todavía son texto."""
+    return [c for c in claves if tipos.get(c) in ('STRING', 'VARCHAR')]
+
+
+def migrar_tabla(backend, table_id, claves, dry_run=False):
+    nombre = table_id.split('.')[-1]
+    if not backend.existe(table_id):
+        print(f"⏭️  {nombre}: no existe, la crea el script 4 con INT64")
+        return
+
+    tipos = tipos_columnas(backend, table_id)
+    pendientes = claves_string(tipos, claves)
+    if not pendientes:
+        print(f"✓ {nombre}: claves ya en INT64")
+        return
+
+    reemplazos = ", ".join(f"CAST({c} AS INT64) AS {c}" for c in pendientes)
+    select = f"SELECT * REPLACE ({reemplazos}) FROM `{table_id}`"
+
+    # Formato anterior sin las columnas de partición/clustering: se migra sin layout
+    faltantes = [c for c in columnas_orden(table_id) if c not in tipos]
+    if faltantes:
+        print(f"⚠️  {nombre}: sin {', '.join(faltantes)} (formato anterior), se migra sin particionar")
+
+    if backend.nombre == 'local':
+        sql = select
+    else:
+        layout = "" if faltantes else f"\n{ddl_layout(table_id)}"
+        sql = f"CREATE OR REPLACE TABLE `{table_id}`{layout}\nAS {select}"
+
+    print(f"🔧 {nombre}: {', '.join(pendientes)} → INT64")
+    if dry_run:
+        print(f"   {sql}")
+        return
+
+    if backend.nombre == 'local':
+        backend.crear_tabla_desde_query(sql, table_id)
+    else:
+        backend.query(sql).result()
+    print(f"   ✅ Migrada. Filas: {backend.num_filas(table_id):,}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migra las claves de las tablas de modelos a INT64")
+    parser.add_argument('--dry-run', action='store_true', help="Muestra el SQL sin ejecutarlo.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    backend = crear_backend()
+
+    print("="*70)
+    print("  MIGRACIÓN DE CLAVES STRING → INT64")
+    print("="*70)
+    for table_id, claves in TABLAS.items():
+        migrar_tabla(backend, table_id, claves, dry_run=args.dry_run)
+
+    if not args.dry_run:
+        print("\n💡 Re-materializar el dashboard para que use los JOINs sin CAST:")
+        print("   python src/5_create_reporting_view.py")
@@ -0,0 +1,155 @@
+"""
+MOTOR DE PERCENTILES (PERCENT_RANK VECTORIZADO)
+Los 15 percentiles del datamart se definen una sola vez en SPEC_PERCENTILES.
+De la misma definición salen:
+  - sql_percentiles(): las 15 ventanas PERCENT_RANK() para BigQuery/DuckDB.
+  - calcular_percentiles(): el equivalente en NumPy, que rankea todas las
+    métricas de un bloque (temporada, posición) con un único argsort.
+
+Semántica idéntica a PERCENT_RANK() OVER (PARTITION BY ... ORDER BY m ASC):
+  - pct = (rank - 1) / (n - 1), 0 si el bloque tiene una sola fila.
+  - Empates: todos reciben el rank de la primera fila del grupo.
+  - NULLs: van primero en ASC (rank 1 → pct 0) y cuentan en n.
+  - Reglas de arqueros: pct_xG es NULL para arqueros; pct_saves,
+    pct_saves_pct, pct_clean_sheets y pct_sweeper solo existen para arqueros.
+NaN se trata como NULL (en BigQuery las métricas nulas llegan como NaN).
+
+No depende de BigQuery: se usa desde el backend local y los scripts.
+"""
+
+import numpy as np
+import pandas as pd
+
+PARTICION = ('temporada_anio', 'posicion')
+
+# (columna percentil, métrica, regla) en el orden de las columnas del datamart
+# regla: 'todas' | 'sin_arquero' | 'solo_arquero'
+SPEC_PERCENTILES = [
+    # GENERALES (todas las posiciones)
+    ('pct_rating', 'rating_promedio', 'todas'),
+    ('pct_xA', 'xA_p90', 'todas'),
+    ('pct_prog_passes', 'prog_passes_p90', 'todas'),
+    ('pct_dribbles', 'dribbles_p90', 'todas'),
+    ('pct_recoveries', 'recoveries_p90', 'todas'),
+    ('pct_aerial', 'aerial_won_p90', 'todas'),
+    # OFENSIVOS (excluir arqueros - puede ser NULL)
+    ('pct_xG', 'xG_p90', 'sin_arquero'),
+    # DEFENSIVOS (todas las posiciones)
+    ('pct_tackles', 'tackles_p90', 'todas'),
+    ('pct_interceptions', 'interceptions_p90', 'todas'),
+    ('pct_clearances', 'clearances_p90', 'todas'),
+    ('pct_blocks', 'blocks_p90', 'todas'),
+    # ARQUEROS (solo posicion = 'Arquero')
+    ('pct_saves', 'saves_p90', 'solo_arquero'),
+    ('pct_saves_pct', 'saves_pct', 'solo_arquero'),
+    ('pct_clean_sheets', 'clean_sheets_pct', 'solo_arquero'),
+    ('pct_sweeper', 'sweeper_p90', 'solo_arquero'),
+]
+
+COLUMNAS_PERCENTIL = [columna for columna, _, _ in SPEC_PERCENTILES]
+
+# Forma reciente: ventanas de últimos N partidos (forma_jugador_pro)
+VENTANAS_FORMA = (5, 10)
+SPEC_PERCENTILES_FORMA = [
+    (f'pct_forma{n}_{nombre}', f'forma{n}_{metrica}', regla)
+    for n in VENTANAS_FORMA
+    for nombre, metrica, regla in [
+        ('rating', 'rating', 'todas'),
+        ('xG', 'xG_p90', 'sin_arquero'),
+        ('xA', 'xA_p90', 'todas'),
+        ('tackles', 'tackles_p90', 'todas'),
+        ('saves', 'saves_p90', 'solo_arquero'),
+    ]
+]
+COLUMNAS_PERCENTIL_FORMA = [columna for columna, _, _ in SPEC_PERCENTILES_FORMA]
+
+
+# ============================================================================
+# SQL
+# ============================================================================
+
+def sql_percentiles(particion=PARTICION, spec=SPEC_PERCENTILES):
+    """Las ventanas PERCENT_RANK() de spec, listas para un SELECT."""
+    partition_by = ", ".join(particion)
+    expresiones = []
+    for columna, metrica, regla in spec:
+        ventana = f"PERCENT_RANK() OVER (PARTITION BY {partition_by} ORDER BY {metrica})"
+        if regla == 'sin_arquero':
+            ventana = f"CASE WHEN posicion != 'Arquero' THEN {ventana} END"
+        elif regla == 'solo_arquero':
+            ventana = f"CASE WHEN posicion = 'Arquero' THEN {ventana} END"
+        expresiones.append(f"{ventana} as {columna}")
+    return ",\n    ".join(expresiones)
+
+
+# ============================================================================
+# NUMPY
+# ============================================================================
+
+def percent_rank_bloque(valores):
+    """
+    PERCENT_RANK de cada columna de una matriz (n filas x k métricas) en una
+    sola pasada: un argsort por eje 0 y detección de empates vectorizada.
+
+    Returns:
+        Matriz float64 (n x k) con percentiles en [0, 1].
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    n = valores.shape[0]
+    if n <= 1:
+        return np.zeros_like(valores)
+
+    nulos = np.isnan(valores)
+    # NaN queda al final del argsort: las posiciones 0..n-nulos-1 son no nulas
+    orden = np.argsort(valores, axis=0, kind='stable')
+    ordenados = np.take_along_axis(valores, orden, axis=0)
+
+    # Índice (en el orden) de la primera fila de cada grupo de empates
+    inicio_grupo = np.ones(valores.shape, dtype=bool)
+    inicio_grupo[1:] = ordenados[1:] != ordenados[:-1]
+    posiciones = np.arange(n)[:, None]
+    primero = np.maximum.accumulate(np.where(inicio_grupo, posiciones, 0), axis=0)
+
+    # rank - 1 = NULLs (van primero) + valores estrictamente menores
+    rank0_ordenado = primero + nulos.sum(axis=0)
+    rank0 = np.empty_like(rank0_ordenado)
+    np.put_along_axis(rank0, orden, rank0_ordenado, axis=0)
+    rank0[nulos] = 0
+
+    return rank0 / (n - 1)
+
+
+def calcular_percentiles(df, particion=PARTICION, spec=SPEC_PERCENTILES):
+    """
+    Percentiles por bloque de particion para las métricas de spec presentes en df.
+
+    Returns:
+        DataFrame con las columnas pct_* (mismo índice que df).
+    """
+    spec = [s for s in spec if s[1] in df.columns]
+    columnas = [c for c, _, _ in spec]
+    metricas = [m for _, m, _ in spec]
+    resultado = np.full((len(df), len(spec)), np.nan)
+
+    valores = df[metricas].to_numpy(dtype=np.float64, na_value=np.nan)
+    if particion:
+        for filas in df.groupby(list(particion), sort=False, dropna=False).indices.values():
+            resultado[filas] = percent_rank_bloque(valores[filas])
+    elif len(df):
+        resultado[:] = percent_rank_bloque(valores)
+
+    es_arquero = (df['posicion'] == 'Arquero').to_numpy() if 'posicion' in df.columns else None
+    for j, (_, _, regla) in enumerate(spec):
+        if regla == 'sin_arquero' and es_arquero is not None:
+            resultado[es_arquero, j] = np.nan
+        elif regla == 'solo_arquero' and es_arquero is not None:
+            resultado[~es_arquero, j] = np.nan
+
+    return pd.DataFrame(resultado, index=df.index, columns=columnas)
+
+
+def agregar_percentiles(df, particion=PARTICION, spec=SPEC_PERCENTILES):
+    """Copia de df con las columnas pct_* (re)calculadas."""
+    percentiles = calcular_percentiles(df, particion, spec)
+    resultado = df.drop(columns=[c for c in percentiles.columns if c in df.columns])
+    return pd.concat([resultado, percentiles], axis=1)
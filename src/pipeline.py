@@ -0,0 +1,294 @@
+"""
+PIPELINE DAG - ORQUESTADOR DE LAS ETAPAS 0→5
+Corre los scripts numerados respetando sus dependencias:
+
+    datasets → carga → dwh → datamart → modelos → dashboard
+
+- Detección de cambios: cada etapa guarda la firma de sus tablas de entrada
+  (última modificación + filas + bytes) y el hash de su script. Si nada
+  cambió desde la última corrida exitosa y sus salidas existen, se omite.
+- Paralelismo: las etapas cuyas dependencias ya terminaron corren a la vez
+  (los tres modelos del script 4 corren en un solo proceso que lee el
+  datamart una vez y los paraleliza con su propio pool de --workers-modelos
+  procesos, así el DAG no lanza más procesos que CPUs).
+- Tiempos: se registra el wall time de cada etapa y el total de la corrida.
+
+Uso:
+    python src/pipeline.py                       # corre lo que cambió
+    python src/pipeline.py --forzar              # corre todo
+    python src/pipeline.py --solo datamart dashboard
+    SCOUTING_BACKEND=local python src/pipeline.py --csv data/stats.csv
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from backend import crear_backend
+from manifiesto_carga import huella_fuente, leer_manifiesto, guardar_manifiesto
+
+# --- CONFIGURACIÓN ---
+PROJECT_ID = "proyecto-scouting-futbol"
+BUCKET_NAME = "bucket-scouting-futbol-raw-data"
+SRC_DIR = Path(__file__).resolve().parent
+
+FUENTE_URI = f"gs://{BUCKET_NAME}/data/futbol_argentino_2021_2025_COMPLETO_BQ.csv"
+ESTADO_URI = f"gs://{BUCKET_NAME}/data/_estado_pipeline.json"
+MAX_WORKERS = 4
+# Procesos del pool de la etapa de modelos (script 4 --workers)
+WORKERS_MODELOS = os.cpu_count() or 1
+
+RAW_TABLE = f"{PROJECT_ID}.raw_scouting.jugadores_stats_raw"
+DWH_TABLE = f"{PROJECT_ID}.dwh_scouting.partidos_procesados_pro"
+DM_TABLE = f"{PROJECT_ID}.dm_scouting.stats_jugador_temporada_pro"
+FORMA_TABLE = f"{PROJECT_ID}.dm_scouting.forma_jugador_pro"
+SIMILITUD_TABLE = f"{PROJECT_ID}.dm_scouting.scouting_similitud_pro_v2"
+PROYECCIONES_TABLE = f"{PROJECT_ID}.dm_scouting.proyecciones_valor"
+ARQUETIPOS_TABLE = f"{PROJECT_ID}.dm_scouting.arquetipos_jugadores"
+DASHBOARD_TABLE = f"{PROJECT_ID}.dm_scouting.dashboard_scouting_completo"
+VISTA_DASHBOARD = f"{PROJECT_ID}.dm_scouting.v_dashboard_scouting_completo"
+
+# ============================================================================
+# DEFINICIÓN DEL DAG
+# deps:      etapas que tienen que terminar antes
+# entradas:  tablas cuya firma decide si la etapa tiene que volver a correr
+# salidas:   tablas/vistas que produce (si falta alguna, la etapa corre)
+# ============================================================================
+
+ETAPAS = {
+    'datasets': {
+        'script': '0_datasets.py', 'args': [],
+        'deps': [], 'entradas': [], 'salidas': [],
+    },
+    'carga': {
+        'script': '1_load_data_pro.py', 'args': [],
+        'deps': ['datasets'], 'entradas': [], 'salidas': [RAW_TABLE],
+    },
+    'dwh': {
+        'script': '2_build_dwh.py', 'args': [],
+        'deps': ['carga'], 'entradas': [RAW_TABLE], 'salidas': [DWH_TABLE],
+    },
+    'datamart': {
+        'script': '3_create_datamarts.py', 'args': [],
+        'deps': ['dwh'], 'entradas': [DWH_TABLE], 'salidas': [DM_TABLE, FORMA_TABLE],
+    },
+    # Los tres modelos en un solo proceso: comparten una lectura del datamart
+    'modelos': {
+        'script': '4_run_scouting_model_final.py', 'args': ['--modelo', 'todos'],
+        'deps': ['datamart'], 'entradas': [DM_TABLE],
+        'salidas': [SIMILITUD_TABLE, PROYECCIONES_TABLE, ARQUETIPOS_TABLE],
+    },
+    # Tabla materializada del dashboard: se reescribe completa después de cada corrida de modelos
+    'dashboard': {
+        'script': '5_create_reporting_view.py', 'args': [],
+        'deps': ['datamart', 'modelos'],
+        'entradas': [DM_TABLE, FORMA_TABLE, SIMILITUD_TABLE, PROYECCIONES_TABLE, ARQUETIPOS_TABLE],
+        'salidas': [DASHBOARD_TABLE, VISTA_DASHBOARD],
+    },
+}
+
+
+def hash_script(script):
+    """MD5 del script de la etapa: si cambia el código, la etapa vuelve a correr."""
+    return hashlib.md5((SRC_DIR / script).read_bytes()).hexdigest()
+
+
+def firmas_entrada(nombre, backend, fuente):
+    """Firmas actuales de las entradas de la etapa (la carga usa la huella del archivo fuente)."""
+    if nombre == 'carga':
+        huella = huella_fuente(fuente, PROJECT_ID) if fuente else None
+        return {fuente: huella and f"{huella['size']}|{huella['generation']}|{huella['hash']}"}
+    return {tabla: backend.firma(tabla) for tabla in ETAPAS[nombre]['entradas']}
+
+
+def motivo_ejecucion(nombre, backend, registro, firmas, forzar):
+    """
+    Returns:
+        Por qué la etapa tiene que correr, o None si se puede omitir.
+    """
+    etapa = ETAPAS[nombre]
+    if forzar:
+        return "forzada"
+    if not registro:
+        return "primera corrida"
+    if registro.get('codigo') != hash_script(etapa['script']):
+        return "código modificado"
+    for tabla in etapa['salidas']:
+        if backend.firma(tabla) is None:
+            return f"falta {tabla.split('.')[-1]}"
+    for entrada, firma in firmas.items():
+        if registro.get('entradas', {}).get(entrada) != firma:
+            return f"cambió {str(entrada).split('.')[-1]}"
+    return None
+
+
+def correr_etapa(nombre, args_extra):
+    """Corre el script de la etapa en un proceso aparte. Returns: (código, salida, segundos)"""
+    etapa = ETAPAS[nombre]
+    comando = [sys.executable, str(SRC_DIR / etapa['script']), *etapa['args'], *args_extra]
+    inicio = time.perf_counter()
+    proceso = subprocess.run(comando, capture_output=True, text=True, env=os.environ.copy())
+    return proceso.returncode, proceso.stdout + proceso.stderr, time.perf_counter() - inicio
+
+
+def imprimir_salida(nombre, salida, segundos, ok):
+    icono = "✅" if ok else "❌"
+    print(f"\n{icono} ── {nombre} ({segundos:.1f}s) " + "─"*40)
+    for linea in salida.rstrip().splitlines():
+        print(f"   │ {linea}")
+
+
+def ejecutar_dag(backend, estado, estado_uri, seleccion, forzar=False, workers=MAX_WORKERS, fuente=None, args_etapas=None):
+    """
+    Recorre el DAG lanzando en paralelo las etapas listas. El estado se guarda
+    después de cada etapa exitosa para no repetir trabajo si la corrida se corta.
+    args_etapas: argumentos extra por etapa (fuente de la carga, workers de los modelos).
+
+    Returns:
+        dict etapa -> {'estado', 'segundos', 'motivo'}
+    """
+    registros = estado.setdefault('etapas', {})
+    args_etapas = args_etapas or {}
+    resultado = {n: {'estado': 'fuera de selección', 'segundos': 0.0, 'motivo': ''}
+                 for n in ETAPAS if n not in seleccion}
+    pendientes = [n for n in ETAPAS if n in seleccion]
+    en_curso = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while pendientes or en_curso:
+            antes = len(pendientes)
+            for nombre in list(pendientes):
+                deps = ETAPAS[nombre]['deps']
+                if any(resultado.get(d, {}).get('estado') in ('fallida', 'bloqueada') for d in deps):
+                    pendientes.remove(nombre)
+                    resultado[nombre] = {'estado': 'bloqueada', 'segundos': 0.0, 'motivo': 'falló una dependencia'}
+                    print(f"⛔ {nombre}: bloqueada (falló una dependencia)")
+                    continue
+                if not all(d in resultado for d in deps):
+                    continue
+
+                pendientes.remove(nombre)
+                if nombre == 'carga' and not fuente:
+                    resultado[nombre] = {'estado': 'omitida', 'segundos': 0.0, 'motivo': 'sin fuente (--csv)'}
+                    print(f"⏭️  {nombre}: omitida (backend local sin --csv)")
+                    continue
+
+                firmas = firmas_entrada(nombre, backend, fuente)
+                motivo = motivo_ejecucion(nombre, backend, registros.get(nombre), firmas, forzar)
+                if motivo is None:
+                    resultado[nombre] = {'estado': 'omitida', 'segundos': 0.0, 'motivo': 'sin cambios'}
+                    print(f"⏭️  {nombre}: sin cambios en sus entradas - omitida")
+                    continue
+
+                print(f"▶️  {nombre}: {motivo}")
+                args_extra = list(args_etapas.get(nombre, []))
+                en_curso[pool.submit(correr_etapa, nombre, args_extra)] = (nombre, firmas, motivo)
+
+            if not en_curso:
+                if len(pendientes) == antes:
+                    raise RuntimeError(f"DAG sin avance, etapas trabadas: {pendientes}")
+                continue
+
+            terminados, _ = concurrent.futures.wait(en_curso, return_when=concurrent.futures.FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre, firmas, motivo = en_curso.pop(futuro)
+                codigo, salida, segundos = futuro.result()
+                ok = codigo == 0
+                imprimir_salida(nombre, salida, segundos, ok)
+                resultado[nombre] = {'estado': 'ok' if ok else 'fallida', 'segundos': segundos, 'motivo': motivo}
+                if ok:
+                    registros[nombre] = {
+                        'entradas': firmas,
+                        'codigo': hash_script(ETAPAS[nombre]['script']),
+                        'segundos': round(segundos, 2),
+                        'fin': datetime.now().isoformat(timespec='seconds'),
+                    }
+                    guardar_manifiesto(estado_uri, estado, PROJECT_ID)
+
+    return resultado
+
+
+def imprimir_resumen(resultado, segundos_total):
+    print("\n" + "="*70)
+    print("  RESUMEN DEL PIPELINE")
+    print("="*70)
+    print(f"  {'Etapa':<12} {'Estado':<20} {'Tiempo':>9}  Motivo")
+    print(f"  {'-'*12} {'-'*20} {'-'*9}  {'-'*20}")
+    for nombre in ETAPAS:
+        r = resultado[nombre]
+        print(f"  {nombre:<12} {r['estado']:<20} {r['segundos']:>8.1f}s  {r['motivo']}")
+
+    suma = sum(r['segundos'] for r in resultado.values())
+    print(f"\n⏱️  Wall time total:        {segundos_total:.1f}s")
+    print(f"⏱️  Suma de etapas:         {suma:.1f}s")
+    if segundos_total > 0 and suma > segundos_total:
+        print(f"⚡ Ahorro por paralelismo: {suma - segundos_total:.1f}s ({suma / segundos_total:.2f}x)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Orquestador DAG del pipeline de scouting (etapas 0→5)")
+    parser.add_argument('--forzar', action='store_true', help="Corre todas las etapas aunque no haya cambios.")
+    parser.add_argument(
+        '--solo', nargs='+', choices=list(ETAPAS), metavar='ETAPA',
+        help=f"Limita la corrida a estas etapas ({', '.join(ETAPAS)})."
+    )
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help=f"Etapas en paralelo (default {MAX_WORKERS}).")
+    parser.add_argument(
+        '--workers-modelos', type=int, default=WORKERS_MODELOS,
+        help=f"Procesos que usa la etapa de modelos (default {WORKERS_MODELOS}, uno por CPU)."
+    )
+    parser.add_argument('--csv', help="Backend local: CSV fuente de la etapa de carga.")
+    parser.add_argument(
+        '--estado',
+        help="JSON con las firmas de la última corrida (default: GCS en BigQuery, <dir local>/_estado_pipeline.json en local)."
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    backend = crear_backend()
+
+    if backend.nombre == 'local':
+        estado_uri = args.estado or str(backend.directorio / "_estado_pipeline.json")
+        fuente = os.path.abspath(args.csv) if args.csv else None
+        args_etapas = {'carga': ['--local', fuente] if fuente else []}
+    else:
+        estado_uri = args.estado or ESTADO_URI
+        fuente = FUENTE_URI
+        args_etapas = {}
+    args_etapas['modelos'] = ['--workers', str(args.workers_modelos)]
+
+    print("="*70)
+    print(f"  PIPELINE DAG - backend {backend.nombre}")
+    print("="*70)
+
+    estado = leer_manifiesto(estado_uri, PROJECT_ID)
+
+    inicio = time.perf_counter()
+    resultado = ejecutar_dag(
+        backend, estado, estado_uri, args.solo or list(ETAPAS),
+        forzar=args.forzar, workers=args.workers, fuente=fuente, args_etapas=args_etapas,
+    )
+    segundos_total = time.perf_counter() - inicio
+
+    estado['ultima_corrida'] = {
+        'fin': datetime.now().isoformat(timespec='seconds'),
+        'segundos_total': round(segundos_total, 2),
+        'etapas': {n: {'estado': r['estado'], 'segundos': round(r['segundos'], 2)} for n, r in resultado.items()},
+    }
+    guardar_manifiesto(estado_uri, estado, PROJECT_ID)
+    imprimir_resumen(resultado, segundos_total)
+
+    if any(r['estado'] in ('fallida', 'bloqueada') for r in resultado.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+REGISTRO DE MODELOS
+Cada corrida del script 4 guarda los objetos entrenados (scalers, índices
+KNN, GradientBoosting, KMeans) como una versión inmutable:
+
+    <raiz>/<modelo>/<version>/artefactos.joblib
+    <raiz>/<modelo>/<version>/metadata.json
+    <raiz>/<modelo>/ultima.json        -> {"version": "..."}
+
+metadata.json lleva features, filas de entrenamiento, métricas, parámetros,
+el hash del snapshot del datamart y las versiones de las librerías. Scoring,
+dashboard y backfills cargan un modelo con cargar_artefactos() en
+milisegundos en lugar de reentrenarlo.
+
+La raíz puede vivir en GCS (gs://bucket/ruta) o en disco, igual que los
+manifiestos (manifiesto_carga.py).
+
+Uso:
+    python src/registro_modelos.py --raiz data_local/_modelos
+    python src/registro_modelos.py --raiz data_local/_modelos --modelo valor --cargar
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+from manifiesto_carga import guardar_manifiesto, leer_manifiesto
+
+ARCHIVO_ARTEFACTOS = "artefactos.joblib"
+ARCHIVO_METADATA = "metadata.json"
+ARCHIVO_ULTIMA = "ultima.json"
+
+
+def _es_gcs(uri):
+    return uri.startswith("gs://")
+
+
+def _bucket_y_prefijo(uri, project=None):
+    from google.cloud import storage
+    bucket_name, _, prefijo = uri[len("gs://"):].partition("/")
+    return storage.Client(project=project).bucket(bucket_name), prefijo
+
+
+def _ruta(raiz, *partes):
+    return "/".join([raiz.rstrip("/"), *partes]) if _es_gcs(raiz) else os.path.join(raiz, *partes)
+
+
+def _escribir_bytes(destino, contenido, project=None):
+    if _es_gcs(destino):
+        bucket, blob_name = _bucket_y_prefijo(destino, project)
+        bucket.blob(blob_name).upload_from_string(contenido, content_type='application/octet-stream')
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    tmp_path = f"{destino}.tmp"
+    with open(tmp_path, 'wb') as fh:
+        fh.write(contenido)
+    os.replace(tmp_path, destino)
+
+
+def _leer_bytes(origen, project=None):
+    if _es_gcs(origen):
+        bucket, blob_name = _bucket_y_prefijo(origen, project)
+        return bucket.blob(blob_name).download_as_bytes()
+    with open(origen, 'rb') as fh:
+        return fh.read()
+
+
+# ============================================================================
+# VERSIONES
+# ============================================================================
+
+def hash_dataframe(df):
+    """Hash estable del contenido de un DataFrame (filas y columnas, sin índice)."""
+    filas = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digest = hashlib.sha256(filas.tobytes())
+    digest.update("|".join(map(str, df.columns)).encode())
+    return f"sha256:{digest.hexdigest()}"
+
+
+def nueva_version(hash_snapshot):
+    """Versión ordenable por fecha y trazable al snapshot: 20250101T120000-1a2b3c4d."""
+    return f"{datetime.now():%Y%m%dT%H%M%S}-{hash_snapshot.partition(':')[2][:8]}"
+
+
+def versiones_librerias():
+    return {'scikit-learn': sklearn.__version__, 'numpy': np.__version__, 'pandas': pd.__version__}
+
+
+def version_actual(raiz, modelo, project=None):
+    """Última versión registrada del modelo (None si no hay ninguna)."""
+    return leer_manifiesto(_ruta(raiz, modelo, ARCHIVO_ULTIMA), project).get('version')
+
+
+def listar_versiones(raiz, modelo, project=None):
+    """Versiones registradas del modelo, de la más vieja a la más nueva."""
+    if _es_gcs(raiz):
+        bucket, prefijo = _bucket_y_prefijo(_ruta(raiz, modelo), project)
+        blobs = bucket.client.list_blobs(bucket, prefix=f"{prefijo}/")
+        versiones = {b.name[len(prefijo) + 1:].split("/")[0] for b in blobs if b.name.endswith(ARCHIVO_METADATA)}
+    else:
+        directorio = _ruta(raiz, modelo)
+        versiones = {
+            v for v in (os.listdir(directorio) if os.path.isdir(directorio) else [])
+            if os.path.exists(os.path.join(directorio, v, ARCHIVO_METADATA))
+        }
+    return sorted(versiones)
+
+
+# ============================================================================
+# GUARDAR / CARGAR
+# ============================================================================
+
+def guardar_artefactos(raiz, modelo, version, objetos, metadata, project=None):
+    """
+    Registra una versión: los objetos con joblib y la metadata en JSON.
+    ultima.json se actualiza al final, así una escritura cortada no deja
+    apuntando a una versión incompleta.
+    """
+    buffer = io.BytesIO()
+    joblib.dump(objetos, buffer, compress=3)
+    contenido = buffer.getvalue()
+    _escribir_bytes(_ruta(raiz, modelo, version, ARCHIVO_ARTEFACTOS), contenido, project)
+
+    metadata = {
+        **metadata,
+        'modelo': modelo,
+        'version': version,
+        'creado_en': datetime.now().isoformat(timespec='seconds'),
+        'bytes_artefactos': len(contenido),
+        'librerias': versiones_librerias(),
+    }
+    guardar_manifiesto(_ruta(raiz, modelo, version, ARCHIVO_METADATA), metadata, project)
+    guardar_manifiesto(_ruta(raiz, modelo, ARCHIVO_ULTIMA), {'version': version}, project)
+    return metadata
+
+
+def cargar_metadata(raiz, modelo, version=None, project=None):
+    version = version or version_actual(raiz, modelo, project)
+    if version is None:
+        return None
+    return leer_manifiesto(_ruta(raiz, modelo, version, ARCHIVO_METADATA), project)
+
+
+def cargar_artefactos(raiz, modelo, version=None, project=None):
+    """
+    Carga una versión (default: la última) sin reentrenar.
+
+    Returns:
+        (objetos, metadata), o (None, None) si el modelo no tiene versiones.
+    """
+    version = version or version_actual(raiz, modelo, project)
+    if version is None:
+        return None, None
+    objetos = joblib.load(io.BytesIO(_leer_bytes(_ruta(raiz, modelo, version, ARCHIVO_ARTEFACTOS), project)))
+    return objetos, cargar_metadata(raiz, modelo, version, project)
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lista y carga las versiones del registro de modelos")
+    parser.add_argument('--raiz', required=True, help="Raíz del registro (gs://bucket/ruta o directorio local).")
+    parser.add_argument('--modelo', action='append', help="Modelo a listar (repetible; default: todos).")
+    parser.add_argument('--cargar', action='store_true', help="Carga la última versión y mide el tiempo.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    for modelo in args.modelo or ['similitud', 'valor', 'arquetipos']:
+        versiones = listar_versiones(args.raiz, modelo)
+        actual = version_actual(args.raiz, modelo)
+        print(f"\n📦 {modelo}: {len(versiones)} versión(es)")
+        for version in versiones:
+            metadata = cargar_metadata(args.raiz, modelo, version)
+            marca = "→" if version == actual else " "
+            print(f"  {marca} {version}  filas={metadata.get('filas_entrenamiento')}  "
+                  f"métricas={metadata.get('metricas', {})}")
+
+        if args.cargar and actual:
+            inicio = time.perf_counter()
+            objetos, _ = cargar_artefactos(args.raiz, modelo)
+            print(f"   ⏱️  {actual} cargada en {(time.perf_counter() - inicio) * 1000:.1f} ms "
+                  f"({', '.join(objetos)})")
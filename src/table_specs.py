@@ -0,0 +1,132 @@
+"""
+ESPECIFICACIONES DE TABLAS (PARTICIONADO + CLUSTERING)
+Única fuente de verdad del layout físico de las tablas que escribe el
+pipeline. Los backends la aplican al materializar un SELECT
+(crear_tabla_desde_query) y al subir un DataFrame (cargar_dataframe), así
+el writer SQL y el uploader de modelos no repiten la configuración.
+
+El dashboard filtra siempre por temporada, posición y jugador: las tablas
+por temporada se particionan con RANGE_BUCKET sobre el año y se clusterizan
+por esas columnas.
+"""
+
+# Una partición por temporada
+TEMPORADA_MIN = 2000
+TEMPORADA_MAX = 2100
+
+# particion: ('fecha', <columna DATE>) | ('temporada', <columna INT64>) | None
+ESPECIFICACIONES = {
+    'partidos_procesados_pro': {
+        'particion': ('fecha', 'fecha'),
+        'clustering': ['posicion_agrupada', 'team'],
+    },
+    'stats_jugador_temporada_pro': {
+        'particion': ('temporada', 'temporada_anio'),
+        'clustering': ['posicion', 'player_id'],
+    },
+    'forma_jugador_pro': {
+        'particion': ('temporada', 'temporada_anio'),
+        'clustering': ['posicion', 'player_id'],
+    },
+    'scouting_similitud_pro_v2': {
+        'particion': ('temporada', 'temporada_origen'),
+        'clustering': ['jugador_origen_id', 'posicion'],
+    },
+    'proyecciones_valor': {
+        'particion': ('temporada', 'temporada_anio'),
+        'clustering': ['player_id', 'posicion'],
+    },
+    'arquetipos_jugadores': {
+        'particion': ('temporada', 'temporada_anio'),
+        'clustering': ['player_id', 'posicion'],
+    },
+    'dashboard_scouting_completo': {
+        'particion': ('temporada', 'temporada_anio'),
+        'clustering': ['player_id', 'posicion'],
+    },
+}
+
+
+def spec_de(table_id):
+    """Spec de la tabla por su nombre (último componente del id), o None."""
+    return ESPECIFICACIONES.get(table_id.strip("`").split(".")[-1])
+
+
+def columnas_orden(table_id):
+    """Columnas de partición + clustering, en orden (para ordenar el Parquet local)."""
+    spec = spec_de(table_id)
+    if not spec:
+        return []
+    particion = [spec['particion'][1]] if spec['particion'] else []
+    return particion + [c for c in spec['clustering'] if c not in particion]
+
+
+def opciones_bigquery(table_id):
+    """
+    kwargs de particionado/clustering para QueryJobConfig o LoadJobConfig.
+    """
+    from google.cloud import bigquery
+
+    spec = spec_de(table_id)
+    if not spec:
+        return {}
+
+    opciones = {'clustering_fields': spec['clustering'] or None}
+    if spec['particion']:
+        tipo, columna = spec['particion']
+        if tipo == 'fecha':
+            opciones['time_partitioning'] = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY, field=columna
+            )
+        else:
+            opciones['range_partitioning'] = bigquery.RangePartitioning(
+                field=columna,
+                range_=bigquery.PartitionRange(start=TEMPORADA_MIN, end=TEMPORADA_MAX, interval=1),
+            )
+    return opciones
+
+
+def ddl_layout(table_id):
+    """Cláusulas PARTITION BY / CLUSTER BY para un CREATE TABLE ... AS."""
+    spec = spec_de(table_id)
+    if not spec:
+        return ""
+
+    clausulas = []
+    if spec['particion']:
+        tipo, columna = spec['particion']
+        if tipo == 'fecha':
+            clausulas.append(f"PARTITION BY {columna}")
+        else:
+            clausulas.append(
+                f"PARTITION BY RANGE_BUCKET({columna}, GENERATE_ARRAY({TEMPORADA_MIN}, {TEMPORADA_MAX}, 1))"
+            )
+    if spec['clustering']:
+        clausulas.append(f"CLUSTER BY {', '.join(spec['clustering'])}")
+    return "\n".join(clausulas)
+
+
+def layout_coincide(table, table_id):
+    """
+    True si una tabla existente de BigQuery ya tiene el layout de su spec.
+    BigQuery no permite reemplazar una tabla con otro particionado vía
+    WRITE_TRUNCATE: si no coincide hay que borrarla antes de escribir.
+    """
+    spec = spec_de(table_id)
+    if not spec:
+        return True
+
+    if list(table.clustering_fields or []) != list(spec['clustering']):
+        return False
+
+    tp, rp = table.time_partitioning, table.range_partitioning
+    if not spec['particion']:
+        return tp is None and rp is None
+
+    tipo, columna = spec['particion']
+    if tipo == 'fecha':
+        return rp is None and tp is not None and tp.field == columna
+    return (
+        tp is None and rp is not None and rp.field == columna
+        and rp.range_.start == TEMPORADA_MIN and rp.range_.end == TEMPORADA_MAX and rp.range_.interval == 1
+    )
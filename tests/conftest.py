@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Los scripts de src/ se importan entre sí sin paquete (from backend import ...)
+for ruta in (RAIZ, RAIZ / "src"):
+    if str(ruta) not in sys.path:
+        sys.path.insert(0, str(ruta))
@@ -0,0 +1,56 @@
+"""Selección de k y nombres de los arquetipos (modelo 3 del script 4)."""
+
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import RAIZ
+
+spec = importlib.util.spec_from_file_location("modelos", RAIZ / "src" / "4_run_scouting_model_final.py")
+modelos = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(modelos)
+
+
+def blobs(centros, n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.vstack([rng.normal(c, 0.5, (n, 4)) for c in centros])
+
+
+def test_elige_k_por_silhouette():
+    seleccion = modelos.seleccionar_k(blobs([0, 6, 12]))
+
+    assert seleccion['kmeans'].n_clusters == 3
+    assert list(seleccion['silhouettes']) == list(modelos.RANGO_K_ARQUETIPOS)
+
+
+def test_empate_elige_k_menor(monkeypatch):
+    monkeypatch.setattr(modelos, 'evaluar_k', lambda X, k: 0.5)
+
+    seleccion = modelos.seleccionar_k(blobs([0, 6, 12]))
+
+    assert seleccion['kmeans'].n_clusters == min(modelos.RANGO_K_ARQUETIPOS)
+
+
+@pytest.mark.filterwarnings("ignore::sklearn.exceptions.ConvergenceWarning")
+def test_silhouette_indefinida_con_un_solo_cluster():
+    assert modelos.evaluar_k(np.zeros((50, 3)), 3) == -1.0
+
+
+def test_nombres_repetidos_se_numeran():
+    df = pd.DataFrame({
+        'cluster_local': [0, 1, 2, 3],
+        'saves_pct': [50, 55, 60, 80],
+        'sweeper_p90': [0.1, 0.2, 0.3, 0.1],
+    })
+
+    nombres = modelos.nombrar_arquetipos('Arquero', df, {'primary': ['saves_pct', 'sweeper_p90']})
+
+    assert nombres == {
+        0: "✋ Guardameta Sólido",
+        1: "✋ Guardameta Sólido 2",
+        2: "✋ Guardameta Sólido 3",
+        3: "🧤 Muro Infranqueable",
+    }
+    assert len(set(nombres.values())) == len(nombres)
@@ -0,0 +1,79 @@
+"""Traducción BigQuery → DuckDB de LocalBackend sobre la tabla del dashboard."""
+
+import pytest
+
+from backend import LocalBackend, crear_backend
+
+DASHBOARD = "proyecto-scouting-futbol.dm_scouting.dashboard_scouting_completo"
+
+SIMILAR = (
+    "{{'jugador_similar_id': {id}, 'nombre': '{nombre}', 'equipo': 'E', 'score_similitud': {score}, "
+    "'valor_millones': 1.0, 'edad': 22.0, 'rank_similitud': {rank}}}"
+)
+
+
+def fila(player_id, nombre, similares):
+    top5 = ", ".join(SIMILAR.format(id=i, nombre=n, score=1 - r / 10, rank=r) for r, (i, n) in enumerate(similares, 1))
+    return f"""
+    SELECT {player_id} AS player_id, '{nombre}' AS nombre_jugador, 2024 AS temporada_anio,
+           'Delantero' AS posicion, 'E' AS equipo_principal, 21.0 AS edad_promedio,
+           5.0 AS valor_millones, 8.0 AS valor_proyectado_millones, 60.0 AS delta_proyectado_pct,
+           7.2 AS rating_promedio, 0.5 AS xG_p90, 0.2 AS xA_p90, 3.0 AS prog_passes_p90,
+           4.0 AS recoveries_p90, 0.9 AS pct_xG, 0.8 AS pct_xA, 0.7 AS pct_prog_passes,
+           0.9 AS pct_rating, '🎯 Goleador Nato' AS arquetipo_nombre, 20 AS partidos_jugados,
+           1500 AS total_minutos, [{top5}] AS similares_top5"""
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = crear_backend("local", directorio=tmp_path)
+    backend.crear_tabla_desde_query(
+        fila(1, 'A', [(2, 'B'), (3, 'C')]) + " UNION ALL " + fila(2, 'B', [(1, 'A')]) + " UNION ALL " + fila(3, 'C', []),
+        DASHBOARD,
+    )
+    return backend
+
+
+def test_traduce_unnest_con_alias():
+    sql = LocalBackend.traducir("FROM Base, UNNEST(similares_top5) AS sim LEFT JOIN x")
+    assert "unnest(similares_top5) AS _unnest_sim(sim)" in sql
+    # IN UNNEST(@param) no tiene alias y queda igual
+    assert LocalBackend.traducir("WHERE fecha IN UNNEST(@fechas)") == "WHERE fecha IN UNNEST(@fechas)"
+
+
+def test_traduce_offset():
+    sql = LocalBackend.traducir("SELECT arr[OFFSET(0)].nombre, arr[SAFE_OFFSET(2)] FROM t")
+    assert sql == "SELECT arr[1].nombre, arr[3] FROM t"
+
+
+def test_unnest_y_offset_sobre_el_dashboard(backend):
+    df = backend.query(f"""
+        SELECT b.nombre_jugador, sim.nombre, sim.rank_similitud, det.rating_promedio
+        FROM `{DASHBOARD}` b,
+        UNNEST(b.similares_top5) as sim
+        LEFT JOIN `{DASHBOARD}` det ON det.player_id = sim.jugador_similar_id
+        WHERE b.player_id = 1
+        ORDER BY sim.rank_similitud
+    """).to_dataframe()
+    assert df['nombre'].tolist() == ['B', 'C']
+    assert df['rating_promedio'].notna().all()
+
+    df = backend.query(f"""
+        SELECT player_id, similares_top5[OFFSET(0)].nombre AS similar_1
+        FROM `{DASHBOARD}` ORDER BY player_id
+    """).to_dataframe()
+    # Sin similares: NULL, como SAFE_OFFSET
+    assert df['similar_1'].tolist()[:2] == ['B', 'A']
+    assert df['similar_1'].isna().tolist()[2]
+
+
+def test_advanced_analytics_local(backend):
+    pytest.importorskip("streamlit")
+    from utils import advanced_analytics
+
+    df = advanced_analytics.obtener_similares_expandidos(1, 2024, _client=backend)
+    assert df['jugador_similar'].tolist() == ['B', 'C']
+    assert df['arquetipo_nombre'].notna().all()
+
+    df = advanced_analytics.busqueda_multi_criterio('Delantero', 2024, _client=backend)
+    assert set(df['similar_1'].dropna()) == {'A', 'B'}
@@ -0,0 +1,79 @@
+"""Migración de claves STRING → INT64 sobre tablas con el formato anterior."""
+
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from backend import crear_backend
+from migrar_claves_int64 import TABLAS, migrar_tabla
+
+ARQUETIPOS = next(t for t in TABLAS if t.endswith("arquetipos_jugadores"))
+
+# Salida de una sola temporada previa a table_specs.py: sin temporada_anio
+ARQUETIPOS_LEGADO = pd.DataFrame({
+    'player_id': ['10', '20', '30'],
+    'player': ['A', 'B', 'C'],
+    'posicion': ['Delantero', 'Defensor', 'Delantero'],
+    'cluster': [0, 1, 0],
+    'arquetipo_nombre': ['🎯 Goleador Nato', '🧱 Defensor Completo', '🎯 Goleador Nato'],
+})
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return crear_backend("local", directorio=tmp_path)
+
+
+def test_migra_tabla_legada_local(backend):
+    backend.cargar_dataframe(ARQUETIPOS_LEGADO, ARQUETIPOS)
+
+    migrar_tabla(backend, ARQUETIPOS, TABLAS[ARQUETIPOS])
+
+    tipos = backend.query_df(f"DESCRIBE SELECT * FROM `{ARQUETIPOS}`")
+    assert dict(zip(tipos['column_name'], tipos['column_type']))['player_id'] == 'BIGINT'
+    df = backend.query_df(f"SELECT * FROM `{ARQUETIPOS}` ORDER BY player_id")
+    assert df['player_id'].tolist() == [10, 20, 30]
+    assert df['arquetipo_nombre'].tolist() == ARQUETIPOS_LEGADO['arquetipo_nombre'].tolist()
+
+
+def test_migracion_idempotente(backend):
+    backend.cargar_dataframe(ARQUETIPOS_LEGADO, ARQUETIPOS)
+    migrar_tabla(backend, ARQUETIPOS, TABLAS[ARQUETIPOS])
+    firma = backend.firma(ARQUETIPOS)
+
+    migrar_tabla(backend, ARQUETIPOS, TABLAS[ARQUETIPOS])
+
+    assert backend.firma(ARQUETIPOS) == firma
+
+
+def backend_bigquery(columnas):
+    """BigQueryBackend mínimo para el dry-run: solo existe() y el schema de la tabla."""
+    schema = [SimpleNamespace(name=nombre, field_type=tipo) for nombre, tipo in columnas.items()]
+    tabla = SimpleNamespace(schema=schema)
+    return SimpleNamespace(
+        nombre='bigquery',
+        existe=lambda table_id: True,
+        client=SimpleNamespace(get_table=lambda table_id: tabla),
+    )
+
+
+def test_bigquery_legada_sin_particionar(capsys):
+    backend = backend_bigquery({'player_id': 'STRING', 'posicion': 'STRING', 'cluster': 'INTEGER'})
+
+    migrar_tabla(backend, ARQUETIPOS, TABLAS[ARQUETIPOS], dry_run=True)
+
+    salida = capsys.readouterr().out
+    assert "CREATE OR REPLACE TABLE" in salida
+    assert "CAST(player_id AS INT64)" in salida
+    assert "PARTITION BY" not in salida
+
+
+def test_bigquery_actual_con_layout(capsys):
+    backend = backend_bigquery({'player_id': 'STRING', 'temporada_anio': 'INTEGER', 'posicion': 'STRING'})
+
+    migrar_tabla(backend, ARQUETIPOS, TABLAS[ARQUETIPOS], dry_run=True)
+
+    salida = capsys.readouterr().out
+    assert "PARTITION BY RANGE_BUCKET(temporada_anio" in salida
+    assert "CLUSTER BY player_id, posicion" in salida
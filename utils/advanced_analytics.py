@@ -1,6 +1,6 @@
 """
 Módulo de Análisis Avanzado
-Aprovecha TODAS las columnas de v_dashboard_scouting_completo
+Aprovecha TODAS las columnas de dashboard_scouting_completo
 """
 
 import streamlit as st
@@ -14,6 +14,8 @@ logger = setup_logger(__name__)
 
 PROJECT_ID = "proyecto-scouting-futbol"
 DATASET = "dm_scouting"
+# Tabla materializada (particionada por temporada, clustering player_id/posicion)
+DASHBOARD_TABLE = "dashboard_scouting_completo"
 
 
 # ========== 1. BÚSQUEDA CON ARQUETIPOS ==========
@@ -46,7 +48,7 @@ def buscar_por_arquetipo(
         recoveries_p90,
         partidos_jugados,
         total_minutos
-    FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+    FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
     WHERE temporada_anio = {temporada}
       AND arquetipo_nombre LIKE '%{arquetipo}%'
       AND rating_promedio >= {min_rating}
@@ -94,7 +96,7 @@ def top_proyecciones_valor(
         xA_p90,
         arquetipo_nombre,
         partidos_jugados
-    FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+    FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
     WHERE temporada_anio = {temporada}
       AND delta_proyectado_pct >= {min_delta_pct}
       AND valor_millones IS NOT NULL
@@ -116,7 +118,7 @@ def top_proyecciones_valor(
 # ========== 3. ANÁLISIS DE SIMILARES CON DETALLES ==========
 @st.cache_data(ttl=3600)
 def obtener_similares_expandidos(
-    player_id: str,
+    player_id: int,
     temporada: int,
     _client: bigquery.Client = None
 ) -> pd.DataFrame:
@@ -132,20 +134,20 @@ def obtener_similares_expandidos(
             nombre_jugador as jugador_origen,
             posicion,
             similares_top5
-        FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
-        WHERE CAST(player_id AS STRING) = '{player_id}'
+        FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
+        WHERE player_id = {int(player_id)}
           AND temporada_anio = {temporada}
     )
     
     SELECT 
-        jugador_origen,
-        posicion,
-        similar.nombre as jugador_similar,
-        similar.equipo as equipo_similar,
-        similar.edad as edad_similar,
-        similar.valor_millones as valor_similar,
-        similar.score_similitud,
-        similar.rank_similitud,
+        Base.jugador_origen,
+        Base.posicion,
+        sim.nombre as jugador_similar,
+        sim.equipo as equipo_similar,
+        sim.edad as edad_similar,
+        sim.valor_millones as valor_similar,
+        sim.score_similitud,
+        sim.rank_similitud,
         
         -- Unir con detalles completos del similar
         det.rating_promedio,
@@ -157,13 +159,13 @@ def obtener_similares_expandidos(
         det.delta_proyectado_pct
         
     FROM Base,
-    UNNEST(similares_top5) as similar
+    UNNEST(similares_top5) as sim  -- 'similar' es palabra reservada en DuckDB
     
-    LEFT JOIN `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo` det
-      ON CAST(det.player_id AS STRING) = similar.jugador_similar_id
+    LEFT JOIN `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}` det
+      ON det.player_id = sim.jugador_similar_id
       AND det.temporada_anio = {temporada}
     
-    ORDER BY similar.rank_similitud
+    ORDER BY sim.rank_similitud
     """
     
     df = _client.query(sql).to_dataframe()
@@ -217,7 +219,7 @@ def busqueda_multi_criterio(
         similares_top5[OFFSET(0)].nombre as similar_1,
         similares_top5[OFFSET(0)].score_similitud as score_1
         
-    FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+    FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
     WHERE temporada_anio = {temporada}
       AND posicion = '{posicion}'
       AND edad_promedio <= {edad_max}
@@ -279,7 +281,7 @@ def top_oportunidades_por_arquetipo(
                     END
                 ORDER BY rating_promedio DESC, delta_proyectado_pct DESC
             ) as rank
-        FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+        FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
         WHERE temporada_anio = {temporada}
           AND arquetipo_nombre IS NOT NULL
           AND valor_millones IS NOT NULL
@@ -330,7 +332,7 @@ def analisis_evolucion_con_proyeccion(
         pct_xG,
         pct_xA
         
-    FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+    FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
     WHERE player_id = {player_id}
     ORDER BY temporada_anio
     """
@@ -346,7 +348,7 @@ def analisis_evolucion_con_proyeccion(
 # ========== 7. COMPARACIÓN CON SIMILARES DIRECTOS ==========
 @st.cache_data(ttl=3600)
 def comparar_con_similares(
-    player_id: str,
+    player_id: int,
     temporada: int,
     _client: bigquery.Client = None
 ) -> Dict[str, pd.DataFrame]:
@@ -378,8 +380,8 @@ def comparar_con_similares(
         pct_prog_passes,
         pct_recoveries
         
-    FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
-    WHERE CAST(player_id AS STRING) = '{player_id}'
+    FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
+    WHERE player_id = {int(player_id)}
       AND temporada_anio = {temporada}
     """
     
@@ -404,7 +406,7 @@ if __name__ == "__main__":
     st.markdown("""
     ### 📊 Funcionalidades disponibles
     
-    Este módulo aprovecha **TODAS** las columnas de `v_dashboard_scouting_completo`:
+    Este módulo aprovecha **TODAS** las columnas de `dashboard_scouting_completo`:
     
     1. **Búsqueda por Arquetipo** 
        - `arquetipo_nombre`, `valor_millones`, `rating_promedio`
@@ -470,7 +472,7 @@ if __name__ == "__main__":
     **Scenario 4: "¿Quiénes son realmente similares a Julián Álvarez y cómo se comparan?"**
     ```python
     data = comparar_con_similares(
-        player_id='67890',
+        player_id=67890,
         temporada=2024,
         _client=client
     )
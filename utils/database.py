@@ -13,11 +13,30 @@ logger = setup_logger(__name__)
 # Configuración
 PROJECT_ID = "proyecto-scouting-futbol"
 DATASET = "dm_scouting"
+# Tabla materializada (particionada por temporada, clustering player_id/posicion)
+DASHBOARD_TABLE = "dashboard_scouting_completo"
 CACHE_DIR = Path(".streamlit_cache")
 CACHE_DIR.mkdir(exist_ok=True)
 CACHE_FILE = CACHE_DIR / "players_index.parquet"
 CACHE_EXPIRY_HOURS = 24
 
+# Columnas del índice de jugadores (expresión SQL sobre la tabla del dashboard)
+EXPRESIONES_INDICE = [
+    'player_id', 'nombre_jugador as player', 'equipo_principal', 'temporada_anio', 'posicion',
+    'rating_promedio', 'goals_p90', 'xG_p90', 'assists_p90', 'xA_p90',
+    'partidos_jugados', 'total_minutos',
+    'recoveries_p90', 'tackles_p90', 'interceptions_p90', 'aerial_won_p90',
+    'prog_passes_p90', 'dribbles_p90',
+    'saves_p90', 'saves_pct', 'clean_sheets_pct', 'sweeper_p90', 'claims_p90',
+    'punches_p90', 'sweeper_acc_pct',
+    # Forma reciente (últimos 5 / 10 partidos)
+    'forma5_rating', 'forma5_xG_p90', 'forma5_xA_p90',
+    'forma10_rating', 'forma10_xG_p90', 'forma10_xA_p90',
+    'pct_forma5_rating', 'pct_forma10_rating',
+]
+# Un caché con otras columnas (versión anterior del índice) se descarta
+COLUMNAS_INDICE = [e.split(' as ')[-1] for e in EXPRESIONES_INDICE] + ['player_normalizado']
+
 
 def get_bigquery_client() -> Optional[bigquery.Client]:
     """
@@ -27,7 +46,12 @@ def get_bigquery_client() -> Optional[bigquery.Client]:
         Cliente de BigQuery o None si falla
     """
     try:
-        if "gcp_service_account" in st.secrets:
+        if os.environ.get("SCOUTING_BACKEND") == "local":
+            # Tablas Parquet generadas por el pipeline local (misma interfaz query().to_dataframe())
+            from src.backend import crear_backend
+            logger.info("Backend local (DuckDB) inicializado")
+            return crear_backend("local")
+        elif "gcp_service_account" in st.secrets:
             key_dict = st.secrets["gcp_service_account"]
             creds = service_account.Credentials.from_service_account_info(key_dict)
             client = bigquery.Client(credentials=creds, project=key_dict["project_id"])
@@ -77,9 +101,12 @@ def get_all_players_index(_client: bigquery.Client) -> pd.DataFrame:
     if cache_is_valid():
         try:
             df = pd.read_parquet(CACHE_FILE)
-            log_cache_event(logger, "hit", "players_index")
-            st.sidebar.info("📂 Datos cargados desde caché local")
-            return df
+            faltantes = set(COLUMNAS_INDICE) - set(df.columns)
+            if not faltantes:
+                log_cache_event(logger, "hit", "players_index")
+                st.sidebar.info("📂 Datos cargados desde caché local")
+                return df
+            logger.info(f"Caché con columnas desactualizadas (faltan {len(faltantes)}) - se regenera")
         except Exception as e:
             logger.warning(f"Error leyendo caché: {e}")
             log_cache_event(logger, "miss", "players_index")
@@ -89,36 +116,9 @@ def get_all_players_index(_client: bigquery.Client) -> pd.DataFrame:
     st.sidebar.info("☁️ Descargando datos desde BigQuery...")
     
     sql_index = f"""
-        SELECT 
-            player_id,
-            nombre_jugador as player,
-            equipo_principal, 
-            temporada_anio,
-            posicion,
-            rating_promedio, 
-            goals_p90,
-            xG_p90,
-            assists_p90,
-            xA_p90,
-            partidos_jugados,
-            total_minutos,
-            
-            recoveries_p90,
-            tackles_p90,
-            interceptions_p90,
-            aerial_won_p90,
-            prog_passes_p90,
-            dribbles_p90,
-            
-            saves_p90,
-            saves_pct,
-            clean_sheets_pct,
-            sweeper_p90,
-            claims_p90,
-            punches_p90,
-            sweeper_acc_pct
-            
-        FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+        SELECT
+            {", ".join(EXPRESIONES_INDICE)}
+        FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
         WHERE total_minutos >= 300
         ORDER BY temporada_anio DESC, rating_promedio DESC
     """
@@ -162,7 +162,7 @@ def get_players_by_season(temporada: int, _df_index: pd.DataFrame) -> pd.DataFra
 
 @st.cache_data(ttl=3600)
 def obtener_similares(
-    id_origen: str, 
+    id_origen: int, 
     temp_origen: int, 
     temp_destino: Optional[int], 
     min_score: float, 
@@ -236,10 +236,10 @@ def obtener_similares(
             v.pct_sweeper as destino_pct_sweeper
             
         FROM `{PROJECT_ID}.{DATASET}.scouting_similitud_pro_v2` s
-        JOIN `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo` v
-          ON CAST(v.player_id AS STRING) = s.jugador_similar_id
+        JOIN `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}` v
+          ON v.player_id = s.jugador_similar_id
           AND v.temporada_anio = s.temporada_similar
-        WHERE s.jugador_origen_id = '{id_origen}'
+        WHERE s.jugador_origen_id = {int(id_origen)}
           AND s.temporada_origen = {temp_origen}
           {condicion_temp}
           AND s.score_similitud >= {min_score}
@@ -280,7 +280,7 @@ def obtener_evolucion_jugador(player_id: int, _client: bigquery.Client) -> pd.Da
             prog_passes_p90,
             partidos_jugados,
             total_minutos
-        FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+        FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
         WHERE player_id = {player_id}
         ORDER BY temporada_anio
     """
@@ -322,7 +322,7 @@ def obtener_datos_pca(posicion: str, temporada: int, _client: bigquery.Client) -
             pct_recoveries,
             pct_aerial,
             pct_rating
-        FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+        FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
         WHERE posicion = '{posicion}'
           AND temporada_anio = {temporada}
           AND total_minutos >= 300
@@ -388,7 +388,7 @@ def obtener_percentiles_molde(player_id: int, temporada: int, _client: bigquery.
             punches_p90,
             sweeper_acc_pct
 
-        FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+        FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
         WHERE player_id = {player_id}
           AND temporada_anio = {temporada}
         LIMIT 1
@@ -421,7 +421,7 @@ def get_system_stats(_client: bigquery.Client) -> dict:
     
     query_jugadores = f"""
         SELECT COUNT(DISTINCT player_id) as total_jugadores
-        FROM `{PROJECT_ID}.{DATASET}.v_dashboard_scouting_completo`
+        FROM `{PROJECT_ID}.{DATASET}.{DASHBOARD_TABLE}`
     """
     
     query_relaciones = f"""